@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth import get_user_model
 
-from .models import Location
+from .models import Location, MapCluster
 
 User = get_user_model()
 
@@ -25,3 +25,9 @@ class LocationAdmin(admin.ModelAdmin):
     list_filter = ("is_physio", "is_garage_sale")
     search_fields = ("name", "owner__username")
     filter_horizontal = ("consultants",)  # for ManyToMany
+
+
+@admin.register(MapCluster)
+class MapClusterAdmin(admin.ModelAdmin):
+    list_display = ("layer", "zoom", "day", "cell_x", "cell_y", "count")
+    list_filter = ("layer", "zoom")
@@ -0,0 +1,204 @@
+"""
+Server-side pin clustering for the maps.
+
+Every pin contributes to one MapCluster row per zoom level 0..CLUSTER_MAX_ZOOM-1:
+the web-mercator cell of CELL_PX x CELL_PX screen pixels it falls in at that
+zoom, holding a count and coordinate sums (centroid = sum / count). Rows are
+maintained incrementally (apply_points) by the physio and garage_sale signal
+handlers, so a zoomed-out map reads at most (screen size / CELL_PX)^2 rows
+whatever the number of pins. rebuild() recomputes everything from scratch.
+"""
+import math
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+# At this zoom and above the map gets individual pins.
+CLUSTER_MAX_ZOOM = 14
+
+# Cluster cell size in screen pixels (Leaflet tiles are 256px).
+CELL_PX = 64
+
+MAX_MERCATOR_LAT = 85.05112878
+
+# Rows per batched UPDATE / INSERT.
+BATCH_SIZE = 1000
+
+
+def cells_per_axis(zoom: int) -> int:
+    return (256 // CELL_PX) * (2 ** zoom)
+
+
+def mercator_cell(lat: float, lng: float, zoom: int):
+    n = cells_per_axis(zoom)
+    lat = max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)
+    x = (lng + 180.0) / 360.0 * n
+    rad = math.radians(lat)
+    y = (1.0 - math.log(math.tan(rad) + 1.0 / math.cos(rad)) / math.pi) / 2.0 * n
+    return min(max(int(x), 0), n - 1), min(max(int(y), 0), n - 1)
+
+
+def cluster_level(zoom):
+    """Stored level to answer a map zoom with, or None when pins should be sent instead."""
+    if zoom is None or zoom >= CLUSTER_MAX_ZOOM:
+        return None
+    return zoom
+
+
+def _model():
+    return django_apps.get_model("core", "MapCluster")
+
+
+def _fold(points, sign):
+    """Per-row deltas {(zoom, day, cell_x, cell_y): [count, lat_sum, lng_sum]} for a batch of pins."""
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for lat, lng, day in points:
+        if lat is None or lng is None:
+            continue
+        for zoom in range(CLUSTER_MAX_ZOOM):
+            cx, cy = mercator_cell(lat, lng, zoom)
+            d = deltas[(zoom, day, cx, cy)]
+            d[0] += sign
+            d[1] += sign * lat
+            d[2] += sign * lng
+    return deltas
+
+
+def _cells_q(keys):
+    """Filter covering the given (zoom, day, cell_x, cell_y) keys: one term per cell, days as a range."""
+    days_by_cell = defaultdict(set)
+    for zoom, day, cx, cy in keys:
+        days_by_cell[(zoom, cx, cy)].add(day)
+    terms = []
+    for (zoom, cx, cy), days in days_by_cell.items():
+        dated = [d for d in days if d is not None]
+        day_terms = [Q(day__range=(min(dated), max(dated)))] if dated else []
+        if None in days:
+            day_terms.append(Q(day__isnull=True))
+        terms.append(Q(zoom=zoom, cell_x=cx, cell_y=cy) & reduce(or_, day_terms))
+    return reduce(or_, terms)
+
+
+def apply_points(layer, points, sign):
+    """
+    Add (sign=+1) or remove (sign=-1) pins from a layer.
+    points: iterable of (lat, lng, day) where day is None for undated layers.
+
+    The deltas are folded per row first, then applied with one locked SELECT and
+    batched UPDATE / INSERT / DELETE statements: a long event (a pin per day at
+    every zoom, thousands of rows) costs a handful of queries, not one per row.
+    """
+    _apply(layer, _fold(points, sign))
+
+
+def _apply(layer, deltas):
+    MapCluster = _model()
+    deltas = {key: d for key, d in deltas.items() if d != [0, 0.0, 0.0]}
+    if not deltas:
+        return
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = {
+                    (row.zoom, row.day, row.cell_x, row.cell_y): row
+                    for row in MapCluster.objects.select_for_update().filter(layer=layer).filter(_cells_q(deltas))
+                }
+                changed, emptied, created = [], [], []
+                for key, (count, lat_sum, lng_sum) in deltas.items():
+                    row = existing.get(key)
+                    if row is None:
+                        if count > 0:
+                            zoom, day, cx, cy = key
+                            created.append(MapCluster(
+                                layer=layer, zoom=zoom, day=day, cell_x=cx, cell_y=cy,
+                                count=count, lat_sum=lat_sum, lng_sum=lng_sum,
+                            ))
+                        continue
+                    row.count += count
+                    row.lat_sum += lat_sum
+                    row.lng_sum += lng_sum
+                    (changed if row.count > 0 else emptied).append(row)
+
+                MapCluster.objects.bulk_update(changed, ["count", "lat_sum", "lng_sum"], batch_size=BATCH_SIZE)
+                if emptied:
+                    MapCluster.objects.filter(id__in=[row.id for row in emptied]).delete()
+                MapCluster.objects.bulk_create(created, batch_size=BATCH_SIZE)
+            return
+        except IntegrityError:
+            # Someone else created one of our new rows first; the second pass sees and locks it.
+            if attempt:
+                raise
+
+
+def move_points(layer, old_points, new_points):
+    """Apply the difference between two pin sets (no-op when unchanged)."""
+    old_points, new_points = list(old_points), list(new_points)
+    if sorted(old_points, key=repr) == sorted(new_points, key=repr):
+        return
+    deltas = _fold(old_points, -1)
+    for key, (count, lat_sum, lng_sum) in _fold(new_points, +1).items():
+        d = deltas[key]
+        d[0] += count
+        d[1] += lat_sum
+        d[2] += lng_sum
+    _apply(layer, deltas)
+
+
+def _clusters_qs(layer, zoom, bbox, day):
+    MapCluster = _model()
+    qs = MapCluster.objects.filter(layer=layer, zoom=zoom, day=day, count__gt=0)
+
+    if bbox is not None:
+        x_w, y_n = mercator_cell(bbox.north, bbox.west, zoom)
+        x_e, y_s = mercator_cell(bbox.south, bbox.east, zoom)
+        qs = qs.filter(cell_y__range=(y_n, y_s))
+        if x_w <= x_e:
+            qs = qs.filter(cell_x__range=(x_w, x_e))
+        else:
+            # antimeridian
+            qs = qs.filter(cell_x__gte=x_w) | qs.filter(cell_x__lte=x_e)
+
+    return qs.values_list("count", "lat_sum", "lng_sum")
+
+
+def _pin(count, lat_sum, lng_sum):
+    return {"lat": lat_sum / count, "lng": lng_sum / count, "count": count}
+
+
+def clusters_in_bbox(layer, zoom, bbox, day=None):
+    """
+    [{"lat", "lng", "count"}, ...] for the stored level answering `zoom`,
+    limited to bbox (core.geo.BBox) when given.
+    """
+    return [_pin(*row) for row in _clusters_qs(layer, zoom, bbox, day)]
+
+
+async def aclusters_in_bbox(layer, zoom, bbox, day=None):
+    return [_pin(*row) async for row in _clusters_qs(layer, zoom, bbox, day)]
+
+
+def rebuild(layer, points, apps=None):
+    """
+    Drop a layer and rebuild it from an iterable of (lat, lng, day) points.
+    Pass the migration `apps` registry when calling from a data migration.
+    """
+    MapCluster = (apps or django_apps).get_model("core", "MapCluster")
+    rows = [
+        MapCluster(layer=layer, zoom=zoom, day=day, cell_x=cx, cell_y=cy,
+                   count=count, lat_sum=lat_sum, lng_sum=lng_sum)
+        for (zoom, day, cx, cy), (count, lat_sum, lng_sum) in _fold(points, +1).items()
+    ]
+    with transaction.atomic():
+        MapCluster.objects.filter(layer=layer).delete()
+        MapCluster.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def prune_days_before(layer, day):
+    """Dated layers only ever get queried for today; drop rows for days that are over."""
+    return _model().objects.filter(layer=layer, day__lt=day).delete()[0]
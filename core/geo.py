@@ -0,0 +1,199 @@
+"""
+Map helpers shared by the physio and garage-sale map endpoints.
+
+Locations carry float copies of their coordinates plus a coarse grid cell
+(see Location.sync_geo); a viewport query is a range scan on the indexed
+cell columns followed by an exact lat/lng range check.
+"""
+import heapq
+import math
+from typing import NamedTuple, Optional
+
+from django.db.models import Q
+
+# ~5.5 km north-south per cell: a city-sized viewport touches a few hundred cells at most.
+GRID_CELL_DEG = 0.05
+
+MIN_ZOOM = 0
+MAX_ZOOM = 22
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+class BBox(NamedTuple):
+    west: float
+    south: float
+    east: float
+    north: float
+
+
+class Viewport(NamedTuple):
+    bbox: Optional[BBox]
+    zoom: Optional[int]
+
+
+def grid_cell(lat, lng):
+    """(cell_lat, cell_lng) for a coordinate, or (None, None) when it is missing."""
+    if lat is None or lng is None:
+        return None, None
+    return math.floor(float(lat) / GRID_CELL_DEG), math.floor(float(lng) / GRID_CELL_DEG)
+
+
+def snap_bbox(bbox: BBox) -> BBox:
+    """
+    bbox grown outward to whole grid cells, so viewports panned by a few pixels
+    share one cache entry (and one query) instead of each getting their own.
+    """
+    def down(v):
+        return round(math.floor(v / GRID_CELL_DEG) * GRID_CELL_DEG, 9)
+
+    def up(v):
+        return round(math.ceil(v / GRID_CELL_DEG) * GRID_CELL_DEG, 9)
+
+    south, north = max(down(bbox.south), -90.0), min(up(bbox.north), 90.0)
+    west, east = max(down(bbox.west), -180.0), min(up(bbox.east), 180.0)
+    if bbox.west > bbox.east and west <= east:
+        # An antimeridian-straddling box that now overlaps itself covers every longitude.
+        west, east = -180.0, 180.0
+    return BBox(west, south, east, north)
+
+
+def parse_viewport(params, snap=False) -> Viewport:
+    """
+    Read ?bbox=west,south,east,north (Leaflet's getBounds().toBBoxString()) and ?zoom=N.
+    Both are optional; snap=True grows the bbox to whole grid cells (see snap_bbox).
+    Raises ValueError on malformed input.
+    """
+    bbox = None
+    raw = (params.get("bbox") or "").strip()
+    if raw:
+        parts = [float(p) for p in raw.split(",")]
+        if len(parts) != 4:
+            raise ValueError("bbox must be west,south,east,north")
+        # float() takes "nan" and "inf", which slip past the range checks below.
+        if not all(math.isfinite(p) for p in parts):
+            raise ValueError("bbox must be finite numbers")
+        west, south, east, north = parts
+        if not (-90 <= south <= north <= 90):
+            raise ValueError("bbox latitudes out of range")
+        # Leaflet can report longitudes past +/-180 after panning around the world.
+        if east - west >= 360:
+            west, east = -180.0, 180.0
+        else:
+            west = (west + 180) % 360 - 180
+            east = (east + 180) % 360 - 180
+        bbox = BBox(west, south, east, north)
+        if snap:
+            bbox = snap_bbox(bbox)
+
+    zoom = None
+    raw = (params.get("zoom") or "").strip()
+    if raw:
+        zoom = int(raw)
+        if not (MIN_ZOOM <= zoom <= MAX_ZOOM):
+            raise ValueError("zoom out of range")
+
+    return Viewport(bbox, zoom)
+
+
+def bbox_q(bbox: BBox, prefix: str = "") -> Q:
+    """
+    Filter for Locations inside bbox. prefix lets related models reuse it,
+    e.g. bbox_q(bbox, "location__") on GarageSaleEvent.
+    """
+    cell_s, cell_w = grid_cell(bbox.south, bbox.west)
+    cell_n, cell_e = grid_cell(bbox.north, bbox.east)
+
+    lat_q = Q(**{
+        f"{prefix}geo_cell_lat__range": (cell_s, cell_n),
+        f"{prefix}geo_lat__range": (bbox.south, bbox.north),
+    })
+
+    def lng_q(w, e, cw, ce):
+        return Q(**{
+            f"{prefix}geo_cell_lng__range": (cw, ce),
+            f"{prefix}geo_lng__range": (w, e),
+        })
+
+    if bbox.west <= bbox.east:
+        return lat_q & lng_q(bbox.west, bbox.east, cell_w, cell_e)
+
+    # Viewport straddles the antimeridian: two longitude bands.
+    _, cell_max = grid_cell(0, 180)
+    _, cell_min = grid_cell(0, -180)
+    return lat_q & (
+        lng_q(bbox.west, 180.0, cell_w, cell_max)
+        | lng_q(-180.0, bbox.east, cell_min, cell_e)
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _search_box(lat, lng, half_deg):
+    """
+    Square box of half_deg around a point, and the radius (km) it is guaranteed
+    to contain entirely.
+    """
+    south, north = max(lat - half_deg, -90.0), min(lat + half_deg, 90.0)
+    if half_deg >= 180 or south == -90.0 or north == 90.0:
+        # Near a pole, or wider than the world: take every longitude.
+        west, east = -180.0, 180.0
+        lng_km = math.inf
+    else:
+        west = (lng - half_deg + 180) % 360 - 180
+        east = (lng + half_deg + 180) % 360 - 180
+        # Parallels shrink towards the poles: measure at the box's widest latitude.
+        widest = max(abs(south), abs(north))
+        lng_km = half_deg * KM_PER_DEG_LAT * math.cos(math.radians(widest))
+
+    lat_km = min(lat - south if south > -90 else math.inf, north - lat if north < 90 else math.inf) * KM_PER_DEG_LAT
+    return BBox(west, south, east, north), min(lat_km, lng_km)
+
+
+def _half_deg_covering(lat, km):
+    """Rough box half-size (degrees) whose covered radius reaches km; the search loop corrects any shortfall."""
+    deg_lat = km / KM_PER_DEG_LAT
+    widest = abs(lat) + deg_lat
+    if widest >= 89:
+        return 180.0
+    return 1.05 * deg_lat / math.cos(math.radians(widest))
+
+
+def nearest(qs, lat, lng, k, *, fields=("id",), max_km=None, prefix=""):
+    """
+    The k rows of qs closest to (lat, lng), as [(distance_km, (*fields)), ...].
+
+    Searches a box on the indexed grid columns around the point, doubling it
+    until it holds k rows within the radius it fully covers, then ranks those
+    candidates by haversine distance. Cost depends on how dense the area is,
+    not on the table size.
+    """
+    lat_f, lng_f = f"{prefix}geo_lat", f"{prefix}geo_lng"
+    qs = qs.filter(**{f"{lat_f}__isnull": False, f"{lng_f}__isnull": False})
+
+    half_deg = GRID_CELL_DEG
+    while True:
+        box, covered_km = _search_box(lat, lng, half_deg)
+        rows = qs.filter(bbox_q(box, prefix)).values_list(*fields, lat_f, lng_f)
+        ranked = [
+            (haversine_km(lat, lng, row[-2], row[-1]), row[:-2])
+            for row in rows
+        ]
+
+        limit = covered_km if max_km is None else min(covered_km, max_km)
+        hits = [r for r in ranked if r[0] <= limit]
+        if len(hits) >= k or covered_km == math.inf or (max_km is not None and covered_km >= max_km):
+            return heapq.nsmallest(k, hits, key=lambda r: r[0])
+
+        if len(ranked) >= k:
+            # The k-th candidate found so far bounds the answer: jump straight to a box covering it.
+            kth_km = heapq.nsmallest(k, ranked, key=lambda r: r[0])[-1][0]
+            half_deg = max(half_deg * 2, _half_deg_covering(lat, kth_km))
+        else:
+            half_deg *= 2
@@ -0,0 +1,32 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.module_loading import module_has_submodule
+
+from core import clusters, mapcache
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every map cluster layer from scratch (any installed app with a "
+        "maps.rebuild_map_layer) and prune dated rows for days that are over. Run "
+        "daily: dated layers only index days up to a horizon, which moves with today."
+    )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        for app_config in apps.get_app_configs():
+            if not module_has_submodule(app_config.module, "maps"):
+                continue
+            maps = import_module(f"{app_config.name}.maps")
+            if not hasattr(maps, "rebuild_map_layer"):
+                continue
+
+            rows = maps.rebuild_map_layer()
+            pruned = clusters.prune_days_before(maps.MAP_LAYER, today)
+            mapcache.bump(maps.MAP_LAYER)
+            self.stdout.write(f"{maps.MAP_LAYER}: {rows} cluster row(s), {pruned} stale row(s) pruned")
+
+        self.stdout.write(self.style.SUCCESS("Map clusters rebuilt."))
@@ -0,0 +1,313 @@
+import random
+import time as time_mod
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Location, User
+from garage_sale.models import GarageSaleEvent, Reservation, ReservationItem, SaleItem
+from physio.models import Appointment
+from physio.utils import slot_times
+
+SIX_PLACES = Decimal("0.000001")
+
+# Share of generated appointments per status; ACCEPTED ones that find no free
+# room or consultant in their slot become DECLINED.
+STATUS_WEIGHTS = (
+    (Appointment.Status.ACCEPTED, 60),
+    (Appointment.Status.PENDING, 25),
+    (Appointment.Status.DECLINED, 15),
+)
+
+RESERVATION_WEIGHTS = (
+    (Reservation.Status.DRAFT, 20),
+    (Reservation.Status.CONFIRMED, 50),
+    (Reservation.Status.FULFILLED, 20),
+    (Reservation.Status.CANCELLED, 10),
+)
+
+
+def _weighted(rng, weights, k):
+    values, w = zip(*weights)
+    return rng.choices(values, weights=w, k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset for benchmarking: users of every role, locations with "
+        "consultants, months of appointments and garage sales with items and reservations. "
+        "The same --seed on an empty database generates the same rows (dates relative to the day "
+        "it runs; created/confirmed timestamps are the time of the run). Rows are written with "
+        "bulk_create in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--prefix", default="bench", help="Username/location name prefix.")
+        parser.add_argument("--customers", type=int, default=2000)
+        parser.add_argument("--consultants", type=int, default=200)
+        parser.add_argument("--owners", type=int, default=100)
+        parser.add_argument("--locations", type=int, default=300)
+        parser.add_argument("--consultants-per-location", type=int, default=4)
+        parser.add_argument("--appointments", type=int, default=200_000)
+        parser.add_argument("--months", type=int, default=6, help="Appointment history before today.")
+        parser.add_argument("--ahead-days", type=int, default=30, help="Appointments after today.")
+        parser.add_argument("--events", type=int, default=500)
+        parser.add_argument("--items-per-event", type=int, default=10)
+        parser.add_argument("--reservations-per-event", type=int, default=6)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--skip-derived", action="store_true",
+            help="Don't rebuild slot inventory and map clusters afterwards.",
+        )
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts["seed"])
+        self.batch = opts["batch_size"]
+        self.prefix = opts["prefix"]
+        self.today = timezone.localdate()
+        self.rows = 0
+
+        if User.objects.filter(username__startswith=f"{self.prefix}-").exists():
+            raise CommandError(
+                f"Users named {self.prefix}-* already exist; pick another --prefix or start from an empty database."
+            )
+
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on: every INSERT is also logged, which roughly halves throughput.")
+        if connection.vendor == "sqlite":
+            # Index pages for a million random action_tokens don't fit the default 2 MB page cache.
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA cache_size = -262144")
+
+        started = time_mod.perf_counter()
+        with transaction.atomic():
+            users = self._stage("users", self._users, opts)
+            locations = self._stage("locations", self._locations, opts, users)
+            self._stage("appointments", self._appointments, opts, users, locations)
+            self._stage("garage sales", self._garage_sales, opts, users, locations)
+        elapsed = time_mod.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.rows:,} row(s) in {elapsed:.1f} s ({self.rows / elapsed:,.0f} rows/s)"
+        ))
+
+        if not opts["skip_derived"]:
+            t0 = time_mod.perf_counter()
+            call_command("rebuild_slot_inventory", stdout=self.stdout)
+            call_command("rebuild_map_clusters", stdout=self.stdout)
+            self.stdout.write(f"derived tables rebuilt in {time_mod.perf_counter() - t0:.1f} s")
+
+    # --- helpers ---
+
+    def _stage(self, label, fn, *args):
+        before = self.rows
+        t0 = time_mod.perf_counter()
+        result = fn(*args)
+        self.stdout.write(f"  {label}: {self.rows - before:,} row(s) in {time_mod.perf_counter() - t0:.1f} s")
+        return result
+
+    def _bulk(self, model, objs):
+        """bulk_create an iterable in --batch-size chunks; returns the created objects."""
+        created, chunk = [], []
+        for obj in objs:
+            chunk.append(obj)
+            if len(chunk) >= self.batch:
+                created += model.objects.bulk_create(chunk)
+                chunk = []
+        if chunk:
+            created += model.objects.bulk_create(chunk)
+        self.rows += len(created)
+        return created
+
+    def _bulk_write(self, model, objs):
+        """Like _bulk but drops the objects; for tables nothing else points at."""
+        chunk, n = [], 0
+        for obj in objs:
+            chunk.append(obj)
+            if len(chunk) >= self.batch:
+                model.objects.bulk_create(chunk)
+                n += len(chunk)
+                chunk = []
+        if chunk:
+            model.objects.bulk_create(chunk)
+            n += len(chunk)
+        self.rows += n
+
+    def _uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    # --- stages ---
+
+    def _users(self, opts):
+        # Hashing once keeps this stage fast; every bench user logs in with "bench".
+        password = make_password("bench")
+        spec = (
+            (User.Role.CUSTOMER, "cust", opts["customers"]),
+            (User.Role.CONSULTANT, "cons", opts["consultants"]),
+            (User.Role.LOCATION_OWNER, "owner", opts["owners"]),
+        )
+        users = {}
+        for role, tag, count in spec:
+            users[role] = self._bulk(User, (
+                User(username=f"{self.prefix}-{tag}-{i}", password=password, role=role)
+                for i in range(count)
+            ))
+        if not users[User.Role.LOCATION_OWNER] or not users[User.Role.CONSULTANT]:
+            raise CommandError("Need at least one owner and one consultant.")
+        return users
+
+    def _locations(self, opts, users):
+        rng = self.rng
+        lat0, lng0 = getattr(settings, "DEFAULT_MAP_CENTER", [-37.8136, 144.9631])
+        owners = users[User.Role.LOCATION_OWNER]
+
+        def build():
+            for i in range(opts["locations"]):
+                loc = Location(
+                    name=f"{self.prefix} location {i}",
+                    owner=rng.choice(owners),
+                    latitude=Decimal(lat0 + rng.gauss(0, 0.4)).quantize(SIX_PLACES),
+                    longitude=Decimal(lng0 + rng.gauss(0, 0.5)).quantize(SIX_PLACES),
+                    room_count=rng.randint(1, 3),
+                    is_physio=rng.random() < 0.8,
+                    is_garage_sale=rng.random() < 0.4,
+                )
+                # bulk_create skips save(), which is where these are normally derived.
+                loc.sync_geo()
+                yield loc
+
+        locations = self._bulk(Location, build())
+
+        consultants = users[User.Role.CONSULTANT]
+        per_location = min(opts["consultants_per_location"], len(consultants))
+        through = Location.consultants.through
+        self._bulk_write(through, (
+            through(location_id=loc.id, user_id=cons.id)
+            for loc in locations
+            for cons in rng.sample(consultants, per_location)
+        ))
+        self.consultants_of = {}
+        for loc_id, user_id in through.objects.filter(location__in=locations).values_list("location_id", "user_id"):
+            self.consultants_of.setdefault(loc_id, []).append(user_id)
+        return locations
+
+    def _appointments(self, opts, users, locations):
+        rng = self.rng
+        physio = [loc for loc in locations if loc.is_physio and self.consultants_of.get(loc.id)]
+        if not physio:
+            return
+        customers = users[User.Role.CUSTOMER] or [None]
+        first_day = self.today - timedelta(days=30 * opts["months"])
+        n_days = 30 * opts["months"] + opts["ahead_days"]
+        times = slot_times()
+        T = len(times)
+
+        # Integer keys instead of tuples: (id * n_days + day) * T + slot.
+        rooms_taken = {}   # location slot -> bitmask of rooms
+        busy = set()       # consultant slot
+
+        def build():
+            statuses = _weighted(rng, STATUS_WEIGHTS, opts["appointments"])
+            for status in statuses:
+                loc = rng.choice(physio)
+                day, t = rng.randrange(n_days), rng.randrange(T)
+                candidates = self.consultants_of[loc.id]
+                consultant_id = rng.choice(candidates)
+                room = None
+
+                if status == Appointment.Status.ACCEPTED:
+                    slot = (loc.id * n_days + day) * T + t
+                    mask = rooms_taken.get(slot, 0)
+                    room = next((r for r in range(1, loc.room_count + 1) if not mask & (1 << r)), None)
+                    free = [c for c in candidates if (c * n_days + day) * T + t not in busy]
+                    if room is None or not free:
+                        status, room = Appointment.Status.DECLINED, None
+                    else:
+                        consultant_id = rng.choice(free)
+                        rooms_taken[slot] = mask | (1 << room)
+                        busy.add((consultant_id * n_days + day) * T + t)
+
+                customer = rng.choice(customers)
+                yield Appointment(
+                    location_id=loc.id,
+                    location_label=loc.name,
+                    consultant_id=consultant_id,
+                    created_by=customer,
+                    customer_label=customer.username if customer else "Guest",
+                    date=first_day + timedelta(days=day),
+                    time=times[t],
+                    room_number=room,
+                    status=status,
+                    action_token=self._uuid(),
+                )
+
+        self._bulk_write(Appointment, build())
+
+    def _garage_sales(self, opts, users, locations):
+        rng = self.rng
+        garage = [loc for loc in locations if loc.is_garage_sale] or locations
+        consultants = users[User.Role.CONSULTANT]
+        customers = users[User.Role.CUSTOMER]
+        span = 30 * opts["months"] + opts["ahead_days"]
+
+        def events():
+            for i in range(opts["events"]):
+                loc = rng.choice(garage)
+                start = self.today - timedelta(days=30 * opts["months"]) + timedelta(days=rng.randrange(span))
+                yield GarageSaleEvent(
+                    location=loc,
+                    owner_id=loc.owner_id,
+                    consultant=rng.choice(consultants),
+                    title=f"{self.prefix} sale {i}",
+                    start_date=start,
+                    end_date=start + timedelta(days=rng.randint(0, 3)),
+                )
+
+        event_objs = self._bulk(GarageSaleEvent, events())
+
+        def items():
+            for ev in event_objs:
+                for n in range(opts["items_per_event"]):
+                    yield SaleItem(
+                        event=ev,
+                        title=f"Item {n}",
+                        price=Decimal(rng.randint(1, 20000)) / 100,
+                        quantity_available=rng.randint(0, 5),
+                        is_listed=rng.random() < 0.95,
+                    )
+
+        item_objs = self._bulk(SaleItem, items())
+        if not customers or not item_objs:
+            return
+        items_of = {}
+        for it in item_objs:
+            items_of.setdefault(it.event_id, []).append(it)
+
+        def reservations():
+            for ev in event_objs:
+                statuses = _weighted(rng, RESERVATION_WEIGHTS, opts["reservations_per_event"])
+                for status, customer in zip(statuses, rng.sample(customers, min(len(customers), len(statuses)))):
+                    yield Reservation(
+                        event=ev,
+                        customer=customer,
+                        status=status,
+                        assigned_consultant_id=ev.consultant_id,
+                        confirmed_at=None if status == Reservation.Status.DRAFT else timezone.now(),
+                    )
+
+        reservation_objs = self._bulk(Reservation, reservations())
+
+        def lines():
+            for r in reservation_objs:
+                stock = items_of.get(r.event_id, [])
+                for it in rng.sample(stock, min(len(stock), rng.randint(1, 4))):
+                    yield ReservationItem(reservation=r, item=it, quantity=1, price_at_time=it.price)
+
+        self._bulk_write(ReservationItem, lines())
@@ -0,0 +1,126 @@
+"""
+Cached map_data payloads.
+
+Each map layer has a data version in the cache, bumped (on commit) by the
+signal handlers whenever something drawn on that layer changes. A response is
+cached as pre-encoded JSON bytes under (layer, version, request params), and
+its ETag is derived from the same key, so:
+
+* If-None-Match hits are answered 304 without touching the payload,
+* repeat hits skip the ORM and JSON encoding,
+* a bump makes every old entry unreachable (they expire after MAP_CACHE_TTL).
+
+The map views snap their bbox to grid cells (core.geo.snap_bbox) first, so a
+viewport nudged by a few pixels reuses the same entry.
+
+Writes that bypass signals (QuerySet.update, raw SQL) must call bump() themselves.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from . import perf
+
+MAP_CACHE_TTL = 60 * 10
+
+
+def _version_key(layer):
+    return f"map:version:{layer}"
+
+
+def version(layer) -> int:
+    key = _version_key(layer)
+    v = cache.get(key)
+    if v is None:
+        # Start from the clock so a restarted process never reuses old versions.
+        cache.add(key, time.time_ns(), timeout=None)
+        v = cache.get(key)
+    return v
+
+
+async def aversion(layer) -> int:
+    key = _version_key(layer)
+    v = await cache.aget(key)
+    if v is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        v = await cache.aget(key)
+    return v
+
+
+def bump(*layers):
+    """Invalidate every cached payload of these layers once the current transaction commits."""
+    def _bump():
+        for layer in layers:
+            try:
+                cache.incr(_version_key(layer))
+            except ValueError:
+                cache.add(_version_key(layer), time.time_ns(), timeout=None)
+
+    transaction.on_commit(_bump)
+
+
+def _etag(layer, layer_version, params):
+    return hashlib.sha1(repr((layer, layer_version, params)).encode()).hexdigest()
+
+
+def _not_modified(request, etag):
+    if etag not in parse_etags(request.headers.get("If-None-Match", "")):
+        return None
+    perf.cache_hit()
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+
+def _json_response(body, etag):
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    # Let browsers keep the copy but revalidate it on every use.
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def cached_json(request, layer, params, build):
+    """
+    JSON response for build() (a callable returning the payload), cached per
+    (layer version, params). params must be hashable via repr and include
+    everything the payload depends on besides the layer's data.
+    """
+    digest = _etag(layer, version(layer), params)
+    etag = f'"{digest}"'
+    if (response := _not_modified(request, etag)) is not None:
+        return response
+
+    key = f"map:payload:{digest}"
+    body = cache.get(key)
+    if body is None:
+        perf.cache_miss()
+        body = json.dumps(build(), cls=DjangoJSONEncoder).encode()
+        cache.set(key, body, MAP_CACHE_TTL)
+    else:
+        perf.cache_hit()
+    return _json_response(body, etag)
+
+
+async def acached_json(request, layer, params, build):
+    """cached_json for async views; build is a coroutine function."""
+    digest = _etag(layer, await aversion(layer), params)
+    etag = f'"{digest}"'
+    if (response := _not_modified(request, etag)) is not None:
+        return response
+
+    key = f"map:payload:{digest}"
+    body = await cache.aget(key)
+    if body is None:
+        perf.cache_miss()
+        body = json.dumps(await build(), cls=DjangoJSONEncoder).encode()
+        await cache.aset(key, body, MAP_CACHE_TTL)
+    else:
+        perf.cache_hit()
+    return _json_response(body, etag)
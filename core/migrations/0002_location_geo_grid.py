@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+from core.geo import grid_cell
+
+
+def backfill_geo(apps, schema_editor):
+    Location = apps.get_model("core", "Location")
+    batch = []
+    for loc in Location.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True).iterator():
+        loc.geo_lat = float(loc.latitude)
+        loc.geo_lng = float(loc.longitude)
+        loc.geo_cell_lat, loc.geo_cell_lng = grid_cell(loc.geo_lat, loc.geo_lng)
+        batch.append(loc)
+    Location.objects.bulk_update(
+        batch, ["geo_lat", "geo_lng", "geo_cell_lat", "geo_cell_lng"], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geo_cell_lat',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='geo_cell_lng',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='geo_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='geo_lng',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['geo_cell_lat', 'geo_cell_lng'], name='location_geo_cell_idx'),
+        ),
+        migrations.RunPython(backfill_geo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_location_geo_grid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layer', models.CharField(max_length=20)),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('day', models.DateField(blank=True, null=True)),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('lng_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('layer', 'zoom', 'day', 'cell_x', 'cell_y'), name='uniq_map_cluster_dated'), models.UniqueConstraint(condition=models.Q(('day__isnull', True)), fields=('layer', 'zoom', 'cell_x', 'cell_y'), name='uniq_map_cluster_undated')],
+            },
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.db import models
 
+from .geo import grid_cell
+
 
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -42,5 +44,75 @@ class Location(models.Model):
     is_physio = models.BooleanField(default=True)
     is_garage_sale = models.BooleanField(default=False)
 
+    # Derived from latitude/longitude on save (see core.geo) so map queries
+    # can range-scan an index instead of converting every Decimal.
+    geo_lat = models.FloatField(null=True, blank=True, editable=False)
+    geo_lng = models.FloatField(null=True, blank=True, editable=False)
+    geo_cell_lat = models.IntegerField(null=True, blank=True, editable=False)
+    geo_cell_lng = models.IntegerField(null=True, blank=True, editable=False)
+
+    GEO_FIELDS = ("geo_lat", "geo_lng", "geo_cell_lat", "geo_cell_lng")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["geo_cell_lat", "geo_cell_lng"], name="location_geo_cell_idx"),
+        ]
+
     def __str__(self):
         return self.name
+
+    def sync_geo(self):
+        if self.latitude is None or self.longitude is None:
+            self.geo_lat = self.geo_lng = None
+        else:
+            self.geo_lat = float(self.latitude)
+            self.geo_lng = float(self.longitude)
+        self.geo_cell_lat, self.geo_cell_lng = grid_cell(self.geo_lat, self.geo_lng)
+
+    def save(self, *args, **kwargs):
+        # What the map layers looked like before this save (see physio/garage_sale signals).
+        self._geo_before = (
+            Location.objects.filter(pk=self.pk)
+            .values("geo_lat", "geo_lng", "is_physio", "is_garage_sale")
+            .first()
+            if self.pk else None
+        )
+        self.sync_geo()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | set(self.GEO_FIELDS)
+        super().save(*args, **kwargs)
+
+
+class MapCluster(models.Model):
+    """
+    Pre-aggregated map pins per (layer, zoom, day, web-mercator cell); see core.clusters.
+    day is NULL for layers that don't change by date (physio) and the pin's active
+    day for dated layers (garage-sale events).
+    """
+    layer = models.CharField(max_length=20)
+    zoom = models.PositiveSmallIntegerField()
+    day = models.DateField(null=True, blank=True)
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+
+    count = models.IntegerField(default=0)
+    lat_sum = models.FloatField(default=0)
+    lng_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["layer", "zoom", "day", "cell_x", "cell_y"],
+                name="uniq_map_cluster_dated",
+            ),
+            # NULLs are distinct in the constraint above, so undated rows need their own.
+            models.UniqueConstraint(
+                fields=["layer", "zoom", "cell_x", "cell_y"],
+                condition=models.Q(day__isnull=True),
+                name="uniq_map_cluster_undated",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.layer} z{self.zoom} ({self.cell_x},{self.cell_y}) {self.day or ''}: {self.count}"
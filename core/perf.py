@@ -0,0 +1,198 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware (first in MIDDLEWARE) measures every request:
+
+* total wall time,
+* ORM query count and time, via an execute_wrapper on each connection,
+* duplicate queries, grouped by fingerprint (SQL with literals blanked),
+* time spent rendering templates, by templates from the TimedDjangoTemplates
+  backend (TEMPLATES in settings),
+* cache hits and misses. These are reported by the cache's callers, and only
+  core.mapcache does so: sessions and any other cache use are not counted.
+
+It adds a Server-Timing header (shown in the browser devtools' network panel)
+and logs one JSON line to the "core.perf" logger for a PERF_LOG_SAMPLE_RATE
+share of requests, and always for requests slower than PERF_SLOW_MS.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger("core.perf")
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+_current = ContextVar("core_perf_request", default=None)
+
+
+def fingerprint(sql):
+    """SQL with literals blanked, so the same query for different rows compares equal."""
+    return _LITERALS.sub("?", sql)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_s", "fingerprints", "template_s", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_s = 0.0
+        self.fingerprints = Counter()
+        self.template_s = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def duplicates(self):
+        """[(fingerprint, times run), ...] for queries run more than once, most repeated first."""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n > 1]
+
+
+def cache_hit():
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += 1
+
+
+def cache_miss():
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_misses += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_s += time.perf_counter() - t0
+        stats.queries += 1
+        stats.fingerprints[fingerprint(sql)] += 1
+
+
+def _instrument(connection, **kwargs):
+    # Installed once per connection and keyed off the request contextvar, which
+    # also reaches the threads the async ORM runs queries in. First in the list:
+    # connection.execute_wrapper() blocks pop the last one on exit.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # render()/TemplateResponse call this; {% include %} and {% extends %}
+        # render engine templates below it, so nothing is counted twice.
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        t0 = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_s += time.perf_counter() - t0
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request's stats."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def install():
+    """
+    Hook the ORM; called once from CoreConfig.ready(). The hook passes straight
+    through outside a request PerformanceMiddleware measures.
+    """
+    connection_created.connect(_instrument)
+    for conn in connections.all(initialized_only=True):
+        _instrument(conn)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.sample_rate = float(getattr(settings, "PERF_LOG_SAMPLE_RATE", 0.01))
+        self.slow_ms = float(getattr(settings, "PERF_SLOW_MS", 1000))
+        self.server_timing = getattr(settings, "PERF_SERVER_TIMING", settings.DEBUG)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, t0)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, t0)
+
+    def finish(self, request, response, stats, t0):
+        total_ms = (time.perf_counter() - t0) * 1000
+        if self.server_timing:
+            response["Server-Timing"] = self.header(stats, total_ms)
+        if total_ms >= self.slow_ms or random.random() < self.sample_rate:
+            self.log(request, response, stats, total_ms)
+        return response
+
+    @staticmethod
+    def header(stats, total_ms):
+        dupes = sum(n - 1 for _, n in stats.duplicates())
+        return ", ".join([
+            f"total;dur={total_ms:.1f}",
+            f'db;dur={stats.query_s * 1000:.1f};desc="{stats.queries} queries, {dupes} duplicate"',
+            f"tpl;dur={stats.template_s * 1000:.1f}",
+            f'cache;desc="{stats.cache_hits} hit, {stats.cache_misses} miss"',
+        ])
+
+    @staticmethod
+    def log(request, response, stats, total_ms):
+        match = getattr(request, "resolver_match", None)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "db_queries": stats.queries,
+            "db_ms": round(stats.query_s * 1000, 1),
+            "duplicate_queries": [{"sql": sql, "count": n} for sql, n in stats.duplicates()[:5]],
+            "template_ms": round(stats.template_s * 1000, 1),
+            "cache_hits": stats.cache_hits,
+            "cache_misses": stats.cache_misses,
+        }))
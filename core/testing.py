@@ -0,0 +1,130 @@
+"""
+Test helpers shared by the app test suites.
+
+QueryPlanMixin runs EXPLAIN on the SQL a piece of code issues and fails when a
+hot table is read with a full scan instead of an index. Supported on SQLite
+and PostgreSQL; on Postgres sequential scans are disabled for the test so the
+planner's choice reflects what indexes exist, not how small the test tables are.
+
+QueryBudgetMixin fails a block that runs more queries than its budget and
+prints them, with repeated statements (the usual N+1 signature) flagged.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .perf import fingerprint
+
+# Pages call {% static %}; the manifest storage needs collectstatic, which tests don't run.
+plain_static_storage = override_settings(STORAGES={
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+
+_FULL_SCAN = {
+    # "SCAN physio_appointment" / "SCAN TABLE physio_appointment" (older SQLite);
+    # a covering-index scan still reads the whole index.
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(\w+)"),
+    "postgresql": re.compile(r"\bSeq Scan on (\w+)"),
+}
+
+# Django aliases tables in subqueries and repeated joins ("physio_appointment" U0,
+# ... INNER JOIN "core_user" T3), and SQLite's plan names the alias ("SCAN U0").
+_TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?')
+
+
+def query_plan(sql, params=None):
+    """EXPLAIN output for one statement, one string per plan line."""
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        if vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+        if vendor == "postgresql":
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return [row[0] for row in cursor.fetchall()]
+    raise NotImplementedError(f"EXPLAIN checks are not supported on {vendor}")
+
+
+def full_scans(plan, tables, sql=""):
+    """Plan lines that scan one of `tables`, by name or by an alias `sql` gives it."""
+    pattern = _FULL_SCAN[connection.vendor]
+    aliases = {alias: table for table, alias in _TABLE_ALIAS.findall(sql)}
+    return [
+        line for line in plan
+        if (m := pattern.search(line)) and aliases.get(m.group(1), m.group(1)) in tables
+    ]
+
+
+class QueryPlanMixin:
+    """Mix into a TestCase."""
+
+    @contextmanager
+    def assertIndexedQueries(self, *tables):
+        """
+        Every SELECT/UPDATE/DELETE run inside the block that reads one of
+        `tables` must reach it through an index, and at least one query must
+        touch them: a block that errors out before getting there proves nothing.
+
+            with self.assertIndexedQueries("physio_appointment"):
+                self.client.get(url)
+        """
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+        with CaptureQueriesContext(connection) as captured:
+            yield
+
+        table_re = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+"?(%s)"?' % "|".join(map(re.escape, tables)))
+        problems = []
+        touched = 0
+        for query in captured.captured_queries:
+            sql = query["sql"]
+            if not table_re.search(sql):
+                continue
+            touched += 1
+            if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            scans = full_scans(query_plan(sql), tables, sql)
+            if scans:
+                problems.append(f"{sql}\n    -> {'; '.join(scans)}")
+
+        if not touched:
+            self.fail(f"No query in the block touched {', '.join(tables)}")
+        if problems:
+            self.fail("Full table scan on an indexed hot path:\n" + "\n".join(problems))
+
+
+class QueryBudgetMixin:
+    """Mix into a TestCase."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label=""):
+        """
+        Fail when the block runs more than `budget` queries, listing them:
+
+            with self.assertMaxQueries(6, "owner dashboard"):
+                self.client.get(url)
+        """
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+
+        executed = len(captured)
+        if executed <= budget:
+            return
+
+        shapes = Counter(fingerprint(q["sql"]) for q in captured.captured_queries)
+        lines = []
+        for i, query in enumerate(captured.captured_queries, start=1):
+            repeats = shapes[fingerprint(query["sql"])]
+            flag = f"  [x{repeats}]" if repeats > 1 else ""
+            lines.append(f"{i}. {query['sql']}{flag}")
+        self.fail(
+            f"{label or 'block'} ran {executed} queries, budget is {budget}:\n" + "\n".join(lines)
+        )
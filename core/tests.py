@@ -1,3 +1,419 @@
-from django.test import TestCase
+import datetime
+import json
+import random
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from core import clusters, mapcache
+from core.geo import BBox, bbox_q, grid_cell, haversine_km, nearest, parse_viewport, snap_bbox
+from core.pagination import Keyset
+from core.testing import QueryBudgetMixin, QueryPlanMixin, plain_static_storage
+from physio.inventory import refresh_slots
+from physio.models import Appointment
+from physio.utils import slot_times
+from .middleware import WhiteNoiseMiddleware
+from .perf import PerformanceMiddleware, RequestStats
+from .models import Location, MapCluster, User
+
+
+@plain_static_storage
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets include the session and user lookups of logged-in requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.consultants = [
+            User.objects.create_user(f"cons{i}", password="x", role=User.Role.CONSULTANT) for i in range(5)
+        ]
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=2, is_physio=True,
+        )
+        cls.location.consultants.set(cls.consultants[:2])
+
+    def test_views(self):
+        consultants_url = f"/owner/locations/{self.location.id}/consultants/"
+        cases = [
+            ("home", None, "get", "/", {}, 0),
+            ("login form", None, "get", "/login/", {}, 0),
+            ("register form", None, "get", "/register/", {}, 0),
+            ("post-login", self.owner, "get", "/post-login/", {}, 2),
+            ("location add form", self.owner, "get", "/owner/locations/add/", {}, 2),
+            ("location consultants", self.owner, "get", consultants_url, {}, 5),
+            ("location consultants save", self.owner, "post", consultants_url,
+             {"consultant_ids": [c.id for c in self.consultants]}, 7),
+        ]
+        for label, user, method, url, data, budget in cases:
+            with self.subTest(label):
+                if user:
+                    self.client.force_login(user)
+                else:
+                    self.client.logout()
+                with self.assertMaxQueries(budget, label):
+                    response = getattr(self.client, method)(url, data)
+                self.assertLess(response.status_code, 500, label)
+
+
+@override_settings(PERF_SERVER_TIMING=True, PERF_LOG_SAMPLE_RATE=0, PERF_SLOW_MS=10_000)
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        Location.objects.create(name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, is_physio=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_counts_queries_and_cache(self):
+        url = "/physio/map-data/?bbox=144,-38,145,-37&zoom=15"
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertRegex(first["Server-Timing"], r'db;dur=[\d.]+;desc="1 queries, 0 duplicate"')
+        self.assertIn('cache;desc="1 hit, 0 miss"', second["Server-Timing"])
+        self.assertIn('desc="0 queries', second["Server-Timing"])
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_server_timing_can_be_turned_off(self):
+        self.assertNotIn("Server-Timing", self.client.get("/physio/map-data/?bbox=144,-38,145,-37&zoom=15"))
+
+    @plain_static_storage
+    def test_template_time_is_measured(self):
+        response = self.client.get("/login/")
+        self.assertRegex(response["Server-Timing"], r"tpl;dur=(?!0\.0\b)[\d.]+")
+
+    async def test_async_view_queries_are_counted(self):
+        # Under ASGI the async ORM runs queries in a worker thread; the stats must still see them.
+        location = await Location.objects.aget(name="Clinic")
+        day = datetime.date(2026, 1, 5)
+        await sync_to_async(refresh_slots)({location.id}, {(day, t) for t in slot_times()})
+        params = {"location_id": location.id, "date": day.isoformat()}
+        response = await self.async_client.get("/physio/api/timeslots/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="2 queries, 0 duplicate"', response["Server-Timing"])
+
+    @override_settings(PERF_LOG_SAMPLE_RATE=1)
+    def test_sampled_log_line(self):
+        with self.assertLogs("core.perf", "INFO") as logs:
+            self.client.get("/physio/api/nearest/", {"lat": -37.8, "lng": 144.9})
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "physio:api_nearest")
+        self.assertGreater(entry["db_queries"], 0)
+
+    def test_duplicates_in_header(self):
+        stats = RequestStats()
+        stats.queries = 3
+        stats.fingerprints.update(["SELECT 1", "SELECT 1", "SELECT 2"])
+        self.assertIn('"3 queries, 1 duplicate"', PerformanceMiddleware.header(stats, 5.0))
+
+
+@override_settings(WHITENOISE_AUTOREFRESH=True, WHITENOISE_USE_FINDERS=True)
+class StaticFilesMiddlewareTests(TestCase):
+    async def test_async_stack_serves_static_files_and_passes_the_rest(self):
+        async def view(request):
+            return "view"
+
+        middleware = WhiteNoiseMiddleware(view)
+        response = await middleware(AsyncRequestFactory().get("/static/physio/js/home_map.js"))
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertEqual(await middleware(AsyncRequestFactory().get("/")), "view")
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    def test_scan_inside_a_subquery_is_caught(self):
+        # customer_label has no index; Django aliases the subquery's table as U0.
+        by_label = Appointment.objects.filter(customer_label=OuterRef("username"))
+        with self.assertRaisesRegex(AssertionError, "SCAN U0"):
+            with self.assertIndexedQueries("physio_appointment"):
+                list(User.objects.filter(Exists(by_label)))
+        with self.assertRaisesRegex(AssertionError, "SCAN U0"):
+            with self.assertIndexedQueries("physio_appointment"):
+                list(User.objects.filter(id__in=Appointment.objects.filter(customer_label="x").values("consultant_id")))
+
+    def test_indexed_subquery_passes(self):
+        with self.assertIndexedQueries("physio_appointment"):
+            list(User.objects.filter(Exists(Appointment.objects.filter(consultant_id=OuterRef("id")))))
+
+
+class KeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        # room_count repeats, so id breaks the ties.
+        cls.rows = [
+            Location.objects.create(name=f"L{i}", owner=owner, latitude=0, longitude=0, room_count=i // 3)
+            for i in range(10)
+        ]
+        cls.keyset = Keyset("room_count", "id")
+        cls.qs = Location.objects.all()
+
+    def ids(self, page):
+        return [loc.id for loc in page.items]
+
+    def test_cursor_round_trip(self):
+        key = self.keyset.key(self.rows[4])
+        self.assertEqual(self.keyset.decode(Location, self.keyset.encode(key)), key)
+        for bad in ("1", "x_1", "1_2_3"):
+            with self.subTest(bad), self.assertRaises(ValueError):
+                self.keyset.decode(Location, bad)
+
+    def test_walks_forward_and_back(self):
+        ids = [loc.id for loc in self.rows]
+        page = self.keyset.page(self.qs, limit=4)
+        self.assertEqual(self.ids(page), ids[:4])
+        self.assertIsNone(page.older)
+
+        page = self.keyset.page(self.qs, after=page.newer, limit=4)
+        self.assertEqual(self.ids(page), ids[4:8])
+        page = self.keyset.page(self.qs, after=page.newer, limit=4)
+        self.assertEqual(self.ids(page), ids[8:])
+        self.assertIsNone(page.newer)
+
+        page = self.keyset.page(self.qs, before=page.older, limit=4)
+        self.assertEqual(self.ids(page), ids[4:8])
+
+    def test_older_newer_older_returns_the_same_rows(self):
+        latest = self.keyset.latest(self.qs, limit=4)
+        older = self.keyset.page(self.qs, before=latest.older, limit=4)
+        newer = self.keyset.page(self.qs, after=older.newer, limit=4)
+        self.assertEqual(self.ids(newer), self.ids(latest))
+        again = self.keyset.page(self.qs, before=newer.older, limit=4)
+        self.assertEqual(self.ids(again), self.ids(older))
+
+    def test_start_and_latest(self):
+        ids = [loc.id for loc in self.rows]
+        page = self.keyset.page(self.qs, start=2, limit=2)
+        self.assertEqual(self.ids(page), ids[6:8])
+        self.assertEqual(self.ids(self.keyset.page(self.qs, before=page.older, limit=10)), ids[:6])
+
+        latest = self.keyset.latest(self.qs, limit=3)
+        self.assertEqual(self.ids(latest), ids[7:])
+        self.assertIsNone(latest.newer)
+
+
+class ViewportTests(TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_viewport({}), (None, None))
+        self.assertEqual(
+            parse_viewport({"bbox": "144,-38,145,-37", "zoom": "12"}), (BBox(144.0, -38.0, 145.0, -37.0), 12),
+        )
+        # Panned past the antimeridian: wrapped back into -180..180.
+        self.assertEqual(parse_viewport({"bbox": "190,-38,200,-37"}).bbox, BBox(-170.0, -38.0, -160.0, -37.0))
+        self.assertEqual(parse_viewport({"bbox": "-200,0,200,1"}).bbox, BBox(-180.0, 0.0, 180.0, 1.0))
+
+    def test_rejects_bad_bboxes(self):
+        for raw in ("1,2,3", "a,b,c,d", "144,-37,145,-38", "144,-95,145,-37",
+                    "nan,-38,145,-37", "144,nan,145,-37", "inf,-38,145,-37", "144,-38,-inf,-37"):
+            with self.subTest(raw), self.assertRaises(ValueError):
+                parse_viewport({"bbox": raw})
+        with self.assertRaises(ValueError):
+            parse_viewport({"zoom": "23"})
+
+    def test_snap_grows_to_grid_cells(self):
+        self.assertEqual(snap_bbox(BBox(144.96, -37.83, 145.01, -37.77)), BBox(144.95, -37.85, 145.05, -37.75))
+        self.assertEqual(snap_bbox(BBox(-180.0, -90.0, 180.0, 90.0)), BBox(-180.0, -90.0, 180.0, 90.0))
+        self.assertEqual(snap_bbox(BBox(179.97, 0.01, -179.97, 0.02)), BBox(179.95, 0.0, -179.95, 0.05))
+        # Wrapped almost all the way round: snapping closes the gap.
+        self.assertEqual(snap_bbox(BBox(-179.97, 0.0, -179.98, 1.0)), BBox(-180.0, 0.0, 180.0, 1.0))
+        self.assertEqual(parse_viewport({"bbox": "144.96,-37.83,145.01,-37.77"}, snap=True).bbox,
+                         BBox(144.95, -37.85, 145.05, -37.75))
+
+    def test_map_endpoints_answer_400(self):
+        for url in ("/physio/map-data/", "/garage-sale/map-data/", "/garage-sale/api/events/"):
+            for raw in ("nan,-38,145,-37", "144,-38,inf,-37"):
+                with self.subTest(url=url, bbox=raw):
+                    self.assertEqual(self.client.get(url, {"bbox": raw, "zoom": 8}).status_code, 400)
+
+
+class GridFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        for name, lat, lng in (
+            ("Melbourne", -37.81, 144.96), ("Geelong", -38.15, 144.36),
+            ("Fiji", -17.71, 178.07), ("Samoa", -13.76, -172.10),
+        ):
+            Location.objects.create(name=name, owner=cls.owner, latitude=lat, longitude=lng, is_physio=True)
+
+    def names(self, bbox):
+        return sorted(Location.objects.filter(bbox_q(bbox)).values_list("name", flat=True))
+
+    def test_grid_cell(self):
+        self.assertEqual(grid_cell(-37.81, 144.96), (-757, 2899))
+        self.assertEqual(grid_cell("0.0", "-0.01"), (0, -1))
+        self.assertEqual(grid_cell(None, 144.96), (None, None))
+
+    def test_save_keeps_cells_in_sync(self):
+        loc = Location.objects.get(name="Melbourne")
+        self.assertEqual((loc.geo_cell_lat, loc.geo_cell_lng), grid_cell(-37.81, 144.96))
+        loc.latitude, loc.longitude = -33.87, 151.21
+        loc.save()
+        loc.refresh_from_db()
+        self.assertEqual((loc.geo_lat, loc.geo_lng), (-33.87, 151.21))
+        self.assertEqual((loc.geo_cell_lat, loc.geo_cell_lng), grid_cell(-33.87, 151.21))
+
+    def test_bbox(self):
+        self.assertEqual(self.names(BBox(144.9, -37.9, 145.0, -37.8)), ["Melbourne"])
+        # Same cells as Melbourne, outside the exact range.
+        self.assertEqual(self.names(BBox(144.96, -37.85, 144.999, -37.82)), [])
+        self.assertEqual(self.names(BBox(144.0, -39.0, 145.0, -37.0)), ["Geelong", "Melbourne"])
+
+    def test_bbox_across_the_antimeridian(self):
+        self.assertEqual(self.names(BBox(170.0, -20.0, -170.0, -10.0)), ["Fiji", "Samoa"])
+        self.assertEqual(self.names(BBox(-170.0, -20.0, 170.0, -10.0)), [])
+
+    def test_map_data_limits_to_the_viewport(self):
+        data = self.client.get("/physio/map-data/", {"bbox": "144,-39,145,-37", "zoom": 15}).json()
+        self.assertEqual(sorted(loc["name"] for loc in data["locations"]), ["Geelong", "Melbourne"])
+
+
+class NearestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        rng = random.Random(7)
+        spots = [(-37.81 + rng.uniform(-0.3, 0.3), 144.96 + rng.uniform(-0.3, 0.3)) for _ in range(40)]
+        spots += [(-17.7, 179.9), (-17.8, -179.9), (-33.87, 151.21), (89.5, 10.0), (89.6, -170.0)]
+        Location.objects.bulk_create([
+            Location(name=f"L{i}", owner=owner, latitude=round(lat, 6), longitude=round(lng, 6), is_physio=True)
+            for i, (lat, lng) in enumerate(spots)
+        ])
+        for loc in Location.objects.all():
+            loc.sync_geo()
+            Location.objects.filter(id=loc.id).update(**{f: getattr(loc, f) for f in Location.GEO_FIELDS})
+
+    def brute_force(self, lat, lng, k, max_km=None):
+        ranked = sorted(
+            (haversine_km(lat, lng, row_lat, row_lng), name)
+            for name, row_lat, row_lng in Location.objects.values_list("name", "geo_lat", "geo_lng")
+        )
+        return [name for dist, name in ranked if max_km is None or dist <= max_km][:k]
+
+    def search(self, lat, lng, k, max_km=None):
+        return [name for _, (name,) in nearest(Location.objects.all(), lat, lng, k, fields=("name",), max_km=max_km)]
+
+    def test_matches_brute_force(self):
+        for lat, lng, k in (
+            (-37.81, 144.96, 5), (-37.81, 144.96, 45), (-37.0, 146.0, 3),
+            (-17.75, 179.99, 2), (-17.75, -179.99, 1), (89.9, 100.0, 2), (0.0, 0.0, 1),
+        ):
+            with self.subTest(lat=lat, lng=lng, k=k):
+                self.assertEqual(self.search(lat, lng, k), self.brute_force(lat, lng, k))
+
+    def test_max_km(self):
+        self.assertEqual(self.search(-33.9, 151.2, 5, max_km=50), ["L42"])
+        self.assertEqual(self.search(0.0, 0.0, 5, max_km=100), [])
+
+    def test_first_box_that_holds_k_answers(self):
+        lat, lng = Location.objects.filter(name="L0").values_list("geo_lat", "geo_lng").get()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search(lat, lng, 1), ["L0"])
+        # Empty ocean: the box keeps doubling until the world is covered, a bounded number of times.
+        with self.assertNumQueries(13):
+            self.assertEqual(len(self.search(-60.0, -120.0, 45)), 45)
+
+    def test_endpoint(self):
+        response = self.client.get("/physio/api/nearest/", {"lat": -33.9, "lng": 151.2, "k": 2})
+        locations = response.json()["locations"]
+        self.assertEqual([loc["name"] for loc in locations], self.brute_force(-33.9, 151.2, 2))
+        self.assertLessEqual(locations[0]["distance_km"], locations[1]["distance_km"])
+        for params in ({"lat": "x", "lng": 1}, {"lat": 91, "lng": 0}, {"lat": 0, "lng": 0, "k": 51},
+                       {"lat": 0, "lng": 0, "max_km": -1}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get("/physio/api/nearest/", params).status_code, 400)
+
+
+class ClusterTests(QueryBudgetMixin, TestCase):
+    LAYER = "test"
+
+    def rows(self):
+        return [
+            (*key, round(lat_sum, 6), round(lng_sum, 6))
+            for *key, lat_sum, lng_sum in MapCluster.objects.filter(layer=self.LAYER)
+            .order_by("zoom", "day", "cell_x", "cell_y")
+            .values_list("zoom", "day", "cell_x", "cell_y", "count", "lat_sum", "lng_sum")
+        ]
+
+    def test_incremental_matches_rebuild(self):
+        day = datetime.date(2026, 10, 17)
+        first = [(-37.81, 144.96, None), (-37.82, 144.97, None), (-33.87, 151.21, None)]
+        second = [(-37.81, 144.96, None), (-27.47, 153.03, None), (-37.81, 144.96, day)]
+        clusters.apply_points(self.LAYER, first, +1)
+        clusters.apply_points(self.LAYER, second, +1)
+        clusters.apply_points(self.LAYER, first[1:], -1)
+        incremental = self.rows()
+
+        clusters.rebuild(self.LAYER, first[:1] + second)
+        self.assertEqual(incremental, self.rows())
+
+    def test_removing_every_pin_empties_the_layer(self):
+        points = [(-37.81, 144.96, None), (-33.87, 151.21, None)]
+        clusters.apply_points(self.LAYER, points, +1)
+        self.assertTrue(self.rows())
+        clusters.apply_points(self.LAYER, points, -1)
+        self.assertEqual(self.rows(), [])
+
+    def test_move_points(self):
+        clusters.apply_points(self.LAYER, [(-37.81, 144.96, None)], +1)
+        clusters.move_points(self.LAYER, [(-37.81, 144.96, None)], [(-33.87, 151.21, None)])
+        moved = self.rows()
+        clusters.rebuild(self.LAYER, [(-33.87, 151.21, None)])
+        self.assertEqual(moved, self.rows())
+
+        with self.assertNumQueries(0):
+            clusters.move_points(self.LAYER, [(-33.87, 151.21, None)], [(-33.87, 151.21, None)])
+
+    def test_long_event_is_applied_in_bulk(self):
+        start = datetime.date(2026, 1, 1)
+        points = [(-37.81, 144.96, start + datetime.timedelta(days=i)) for i in range(366)]
+        # ~5k rows; the inserts are batched by the backend's parameter limit.
+        with self.assertMaxQueries(50, "apply long event"):
+            clusters.apply_points(self.LAYER, points, +1)
+        self.assertEqual(MapCluster.objects.filter(layer=self.LAYER).count(), 366 * clusters.CLUSTER_MAX_ZOOM)
+        with self.assertMaxQueries(50, "remove long event"):
+            clusters.apply_points(self.LAYER, points, -1)
+        self.assertEqual(self.rows(), [])
+
+
+class MapCacheTests(TestCase):
+    URL = "/physio/map-data/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        Location.objects.create(name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, is_physio=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, bbox, **headers):
+        return self.client.get(self.URL, {"bbox": bbox, "zoom": 15}, headers=headers)
+
+    def test_etag_and_304(self):
+        first = self.get("144.9,-37.9,145.0,-37.8")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(json.loads(first.content)["locations"]), 1)
+        with self.assertNumQueries(0):
+            again = self.get("144.9,-37.9,145.0,-37.8", if_none_match=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], first["ETag"])
+
+    def test_nearby_viewports_share_an_entry(self):
+        first = self.get("144.91,-37.88,144.99,-37.81")
+        with self.assertNumQueries(0):
+            nudged = self.get("144.92,-37.87,144.98,-37.82")
+        self.assertEqual(nudged["ETag"], first["ETag"])
+        self.assertEqual(nudged.content, first.content)
+        self.assertNotEqual(self.get("145.1,-37.9,145.2,-37.8")["ETag"], first["ETag"])
+
+    def test_bump_invalidates(self):
+        first = self.get("144.9,-37.9,145.0,-37.8")
+        with self.captureOnCommitCallbacks(execute=True):
+            mapcache.bump("physio")
+        response = self.get("144.9,-37.9,145.0,-37.8", if_none_match=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
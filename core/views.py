@@ -93,7 +93,7 @@ def post_login(request):
 
     if role == User.Role.LOCATION_OWNER:
         # Owner dashboard could be per service later
-        return redirect("core:location_owner_overview")
+        return redirect("physio:location_owner_overview")
 
     if role == User.Role.CONSULTANT:
         # Consultant landing per service
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class GarageSaleConfig(AppConfig):
     name = 'garage_sale'
+
+    def ready(self):
+        from . import signals  # noqa: F401
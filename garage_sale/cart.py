@@ -0,0 +1,74 @@
+"""
+Editing a DRAFT reservation's lines.
+
+Changes are applied as a diff against the lines already there: one filtered
+DELETE for items taken out and one bulk INSERT for items put in, so the
+writes scale with the size of the change rather than the size of the cart.
+Lines that stay keep their quantity and price_at_time. In hold mode added
+items also take their stock and removed ones give it back (garage_sale.holds).
+"""
+from contextlib import nullcontext
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import holds
+from .models import ReservationItem
+
+
+def _add(reservation, items):
+    """Add lines for items; returns the items added."""
+    ttl = holds.ttl()
+    if ttl is None:
+        # ignore_conflicts: a concurrent request may have added the same item
+        # (unique on reservation + item); either way the line exists afterwards.
+        ReservationItem.objects.bulk_create(
+            [ReservationItem(reservation=reservation, item=it, quantity=1, price_at_time=it.price) for it in items],
+            ignore_conflicts=True,
+        )
+        return items
+
+    try:
+        with transaction.atomic():
+            items = holds.take(items)
+            held_until = timezone.now() + ttl
+            ReservationItem.objects.bulk_create([
+                ReservationItem(reservation=reservation, item=it, quantity=1, price_at_time=it.price, held_until=held_until)
+                for it in items
+            ])
+    except IntegrityError:
+        # Added concurrently; the rollback gave this request's holds back.
+        return []
+    return items
+
+
+def set_selection(reservation, items, wanted_ids, current_ids):
+    """
+    Make the lines match wanted_ids. items is the queryset of selectable items;
+    only those with stock are added. current_ids is the item ids already in the
+    cart. Returns (added, removed, unavailable) counts.
+    """
+    wanted_ids = {int(i) for i in wanted_ids if str(i).isdigit()}
+    current_ids = set(current_ids)
+    remove = current_ids - wanted_ids
+    add = wanted_ids - current_ids
+
+    new = list(items.filter(id__in=add, quantity_available__gt=0)) if add else []
+    removed = 0
+    # A single statement is atomic on its own; only a delete plus an insert needs a transaction.
+    with transaction.atomic() if remove and new else nullcontext():
+        if remove:
+            removed = holds.delete_lines(
+                ReservationItem.objects.filter(reservation=reservation, item_id__in=remove), expected=len(remove),
+            )
+        if new:
+            new = _add(reservation, new)
+    return len(new), removed, len(add) - len(new)
+
+
+def add_item(reservation, item) -> bool:
+    return bool(_add(reservation, [item]))
+
+
+def remove_item(reservation, item_id):
+    holds.delete_lines(ReservationItem.objects.filter(reservation=reservation, item_id=item_id), expected=1)
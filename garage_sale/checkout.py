@@ -0,0 +1,102 @@
+"""
+Confirming a DRAFT reservation: reserving its stock.
+
+Stock is taken with one conditional UPDATE per line,
+
+    UPDATE saleitem SET quantity_available = quantity_available - n
+     WHERE id = ? AND quantity_available >= n
+
+so the check and the decrement are a single statement and buyers of the
+same item only contend for the instant of that row write, not for a lock
+held across the whole request. A line that updates no rows is short; the
+transaction is rolled back and current stock is read for the message.
+Lines run in item id order so two carts can't deadlock on each other, and
+the CHECK that quantity_available's PositiveIntegerField puts on the column
+backs the WHERE clause up.
+
+Lines still holding their stock (hold mode, garage_sale.holds) skip the
+UPDATE on the item: confirming them only clears held_until.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Reservation, ReservationItem, SaleItem
+
+
+class Shortage(Exception):
+    """Not enough stock: .shortages is [(title, available, wanted), ...]."""
+
+    def __init__(self, shortages):
+        super().__init__(shortages)
+        self.shortages = shortages
+
+
+class AlreadyConfirmed(Exception):
+    """The reservation stopped being a DRAFT (e.g. a double submit)."""
+
+
+def confirm(reservation, lines):
+    """
+    Take stock for lines and mark reservation CONFIRMED, all or nothing.
+    Raises Shortage or AlreadyConfirmed; nothing is changed in either case.
+    """
+    lines = sorted(lines, key=lambda ln: ln.item_id)
+    short = []
+    try:
+        with transaction.atomic():
+            held = set()
+            if any(ln.held_until for ln in lines):
+                # Fresh and locked: a hold may have expired and been released since lines were read.
+                held = set(
+                    ReservationItem.objects.select_for_update()
+                    .filter(reservation=reservation, held_until__isnull=False)
+                    .values_list("id", flat=True)
+                )
+            for ln in lines:
+                if ln.id in held:
+                    continue
+                taken = (
+                    SaleItem.objects
+                    .filter(id=ln.item_id, quantity_available__gte=ln.quantity)
+                    .update(quantity_available=F("quantity_available") - ln.quantity)
+                )
+                if not taken:
+                    short.append(ln)
+            if short:
+                raise Shortage(short)
+
+            consultant_id = reservation.assigned_consultant_id or reservation.event.consultant_id
+            now = timezone.now()
+            updated = (
+                Reservation.objects
+                .filter(id=reservation.id, status=Reservation.Status.DRAFT)
+                .update(status=Reservation.Status.CONFIRMED, confirmed_at=now, assigned_consultant_id=consultant_id)
+            )
+            if not updated:
+                raise AlreadyConfirmed(reservation.id)
+            if held:
+                # Held stock is already out of quantity_available: the hold just becomes the sale.
+                ReservationItem.objects.filter(id__in=held).update(held_until=None)
+    except IntegrityError:
+        # The CHECK constraint caught what the WHERE clause should have.
+        stock = _stock(lines)
+        raise Shortage([_report(ln, stock) for ln in lines if stock.get(ln.item_id, 0) < ln.quantity])
+    except Shortage:
+        stock = _stock(short)
+        raise Shortage([_report(ln, stock) for ln in short])
+
+    reservation.status = Reservation.Status.CONFIRMED
+    reservation.confirmed_at = now
+    reservation.assigned_consultant_id = consultant_id
+    for ln in lines:
+        if ln.id in held:
+            ln.held_until = None
+
+
+def _stock(lines):
+    return dict(SaleItem.objects.filter(id__in=[ln.item_id for ln in lines]).values_list("id", "quantity_available"))
+
+
+def _report(ln, stock):
+    return (ln.item.title, stock.get(ln.item_id, 0), ln.quantity)
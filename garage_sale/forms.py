@@ -14,13 +14,12 @@ class GarageSaleEventForm(forms.ModelForm):
 
     class Meta:
         model = GarageSaleEvent
-        fields = ["location", "title", "start_date", "end_date", "notes"]
+        fields = ["location", "title", "start_date", "end_date"]
         widgets = {
             "location": forms.Select(attrs={"class": "form-select"}),
             "title": forms.TextInput(attrs={"class": "form-control"}),
             "start_date": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
             "end_date": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
-            "notes": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,101 @@
+"""
+Time-limited stock holds for draft reservations (optional).
+
+With GARAGE_SALE_HOLD_MINUTES > 0, putting an item in a draft takes the
+quantity out of SaleItem.quantity_available right away, with the same
+conditional UPDATE checkout uses, and stamps the line with held_until. The
+first customers to add an item get it; everyone after them sees it gone
+while they are still browsing instead of at confirm, and confirming a held
+line is just clearing held_until (checkout.confirm).
+
+A hold ends one of three ways:
+
+* confirm: held_until is cleared and the stock stays taken (sold);
+* the line is removed: the stock is given back (delete_lines);
+* it expires: release_expired (the release_expired_holds command) gives the
+  stock back in chunks and clears held_until. The line stays in the cart and
+  is checked against stock again at confirm, like any unheld line.
+
+Lines without held_until never touched stock, so with holds off nothing here
+costs a query.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import ReservationItem, SaleItem
+
+
+def ttl():
+    """The hold length, or None when holds are off."""
+    minutes = getattr(settings, "GARAGE_SALE_HOLD_MINUTES", 0)
+    return timedelta(minutes=minutes) if minutes > 0 else None
+
+
+def take(items, quantity=1):
+    """Hold quantity of each item (in id order); returns the items that had it."""
+    return [
+        it for it in sorted(items, key=lambda it: it.id)
+        if SaleItem.objects
+        .filter(id=it.id, quantity_available__gte=quantity)
+        .update(quantity_available=F("quantity_available") - quantity)
+    ]
+
+
+def _restock(rows):
+    """Give back [(item_id, quantity), ...] with one UPDATE."""
+    per_item = defaultdict(int)
+    for item_id, quantity in rows:
+        per_item[item_id] += quantity
+    if per_item:
+        SaleItem.objects.filter(id__in=per_item).update(quantity_available=F("quantity_available") + Case(
+            *[When(id=item_id, then=Value(n)) for item_id, n in per_item.items()],
+            output_field=models.PositiveIntegerField(),
+        ))
+
+
+def delete_lines(lines, expected=None):
+    """
+    Delete the ReservationItems in the queryset lines, giving held stock back.
+    Unheld lines go in one DELETE; if that removed expected rows there is
+    nothing held and no more queries are run. Returns the number deleted.
+    """
+    deleted, _ = lines.filter(held_until__isnull=True).delete()
+    if expected is not None and deleted >= expected:
+        return deleted
+
+    with transaction.atomic():
+        held = list(lines.select_for_update().filter(held_until__isnull=False).values_list("id", "item_id", "quantity"))
+        if held:
+            _restock([(item_id, quantity) for _, item_id, quantity in held])
+            ReservationItem.objects.filter(id__in=[line_id for line_id, _, _ in held]).delete()
+    return deleted + len(held)
+
+
+def release_expired(chunk_size=500, now=None):
+    """
+    Release holds that expired before now, chunk_size lines per transaction:
+    one UPDATE clears held_until and one UPDATE restocks the chunk's items.
+    Concurrent sweepers skip each other's rows on PostgreSQL. Returns the
+    number of lines released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                ReservationItem.objects
+                .select_for_update(skip_locked=True)
+                .filter(held_until__lt=now)
+                .order_by("held_until", "id")
+                .values_list("id", "item_id", "quantity")[:chunk_size]
+            )
+            if not rows:
+                return released
+            ReservationItem.objects.filter(id__in=[line_id for line_id, _, _ in rows]).update(held_until=None)
+            _restock([(item_id, quantity) for _, item_id, quantity in rows])
+        released += len(rows)
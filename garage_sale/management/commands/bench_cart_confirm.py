@@ -0,0 +1,146 @@
+import random
+import threading
+import time as time_mod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import User
+from garage_sale import checkout
+from garage_sale.models import GarageSaleEvent, Reservation, ReservationItem, SaleItem
+
+MODES = ("conditional", "locking")
+
+
+def _confirm_locking(reservation, lines):
+    """The previous cart_confirm: lock every item row, check in Python, save() per line."""
+    with transaction.atomic():
+        items = {it.id: it for it in SaleItem.objects.select_for_update().filter(id__in=[ln.item_id for ln in lines])}
+        short = [ln for ln in lines if items[ln.item_id].quantity_available < ln.quantity]
+        if short:
+            raise checkout.Shortage(short)
+        for ln in lines:
+            it = items[ln.item_id]
+            it.quantity_available -= ln.quantity
+            it.save(update_fields=["quantity_available"])
+        reservation.status = Reservation.Status.CONFIRMED
+        reservation.confirmed_at = timezone.now()
+        reservation.save(update_fields=["status", "confirmed_at"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Flash-sale benchmark for cart confirmation: N customers with DRAFT carts on the same few "
+        "items confirm at once from a thread pool. Reports confirms/s and checks nothing was oversold. "
+        "Writes its own event/users and deletes them afterwards. SQLite serialises all writers, so "
+        "run against PostgreSQL (DATABASE_URL) for numbers that mean anything."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--items", type=int, default=10, help="Items on sale; every cart draws from these.")
+        parser.add_argument("--stock", type=int, default=30, help="Starting quantity per item.")
+        parser.add_argument("--lines", type=int, default=3, help="Lines per cart.")
+        parser.add_argument("--threads", type=int, default=50, help="Concurrent confirms.")
+        parser.add_argument("--mode", choices=MODES + ("both",), default="both")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        prefix = f"benchcart-{int(time_mod.time())}"
+        event, customers = self._setup(rng, prefix, opts)
+        try:
+            self.stdout.write(
+                f"{opts['customers']} carts x {opts['lines']} line(s) over {opts['items']} item(s) "
+                f"with {opts['stock']} each, {opts['threads']} thread(s), {connection.vendor}"
+            )
+            for mode in MODES if opts["mode"] == "both" else (opts["mode"],):
+                self._reset(event, opts["stock"])
+                self._run(mode, event, opts["threads"], opts["stock"] * opts["items"])
+        finally:
+            # Lines PROTECT their items, so they go first.
+            ReservationItem.objects.filter(reservation__event=event).delete()
+            event.delete()
+            User.objects.filter(id__in=[c.id for c in customers] + [event.owner_id]).delete()
+
+    # --- setup ---
+
+    def _setup(self, rng, prefix, opts):
+        owner = User.objects.create_user(username=f"{prefix}-owner", role=User.Role.LOCATION_OWNER)
+        today = timezone.localdate()
+        event = GarageSaleEvent.objects.create(
+            owner=owner, title=prefix, start_date=today, end_date=today + timedelta(days=1),
+        )
+        items = SaleItem.objects.bulk_create([
+            SaleItem(event=event, title=f"Item {i}", price=5, quantity_available=opts["stock"])
+            for i in range(opts["items"])
+        ])
+        customers = User.objects.bulk_create([
+            User(username=f"{prefix}-cust-{i}", role=User.Role.CUSTOMER)
+            for i in range(opts["customers"])
+        ])
+        reservations = Reservation.objects.bulk_create([Reservation(event=event, customer=c) for c in customers])
+        ReservationItem.objects.bulk_create([
+            ReservationItem(reservation=r, item=it, quantity=rng.randint(1, 2), price_at_time=it.price)
+            for r in reservations
+            for it in rng.sample(items, min(opts["lines"], len(items)))
+        ])
+        return event, customers
+
+    def _reset(self, event, stock):
+        SaleItem.objects.filter(event=event).update(quantity_available=stock)
+        Reservation.objects.filter(event=event).update(status=Reservation.Status.DRAFT, confirmed_at=None)
+
+    # --- run ---
+
+    def _run(self, mode, event, threads, total_stock):
+        confirm = checkout.confirm if mode == "conditional" else _confirm_locking
+        reservations = list(
+            Reservation.objects.filter(event=event).select_related("event").prefetch_related("lines__item")
+        )
+        counts = {"confirmed": 0, "short": 0, "errors": 0}
+        lock = threading.Lock()
+        go = threading.Event()
+
+        def worker(reservation):
+            go.wait()
+            try:
+                confirm(reservation, list(reservation.lines.all()))
+                outcome = "confirmed"
+            except (checkout.Shortage, checkout.AlreadyConfirmed):
+                outcome = "short"
+            except DatabaseError:
+                outcome = "errors"
+            finally:
+                connection.close()
+            with lock:
+                counts[outcome] += 1
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [pool.submit(worker, r) for r in reservations]
+            # Everyone arrives at once, like an event opening.
+            t0 = time_mod.perf_counter()
+            go.set()
+            for f in futures:
+                f.result()
+            elapsed = time_mod.perf_counter() - t0
+
+        taken = ReservationItem.objects.filter(
+            reservation__event=event, reservation__status=Reservation.Status.CONFIRMED,
+        ).aggregate(n=Sum("quantity"))["n"] or 0
+        remaining = SaleItem.objects.filter(event=event).aggregate(n=Sum("quantity_available"))["n"] or 0
+
+        self.stdout.write(
+            f"  {mode:12} {len(reservations) / elapsed:8.0f} confirms/s  "
+            f"({counts['confirmed']} confirmed, {counts['short']} short, {counts['errors']} db errors, "
+            f"{elapsed * 1000:.0f} ms)"
+        )
+        line = f"    {taken} unit(s) sold + {remaining} left = {taken + remaining} of {total_stock}"
+        if taken + remaining == total_stock:
+            self.stdout.write(line)
+        else:
+            self.stderr.write(self.style.ERROR(f"{line}: stock and reservations disagree"))
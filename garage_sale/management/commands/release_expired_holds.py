@@ -0,0 +1,26 @@
+import time as time_mod
+
+from django.core.management.base import BaseCommand
+
+from garage_sale.holds import release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Give back the stock of expired draft-reservation holds (GARAGE_SALE_HOLD_MINUTES) in chunked "
+        "bulk updates. Runs once, or keeps sweeping with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Lines released per transaction.")
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping.")
+        parser.add_argument("--interval", type=float, default=30.0, help="Seconds between sweeps with --loop.")
+
+    def handle(self, *args, **opts):
+        while True:
+            released = release_expired(chunk_size=opts["chunk_size"])
+            if released or not opts["loop"]:
+                self.stdout.write(f"Released {released} expired hold(s).")
+            if not opts["loop"]:
+                return
+            time_mod.sleep(opts["interval"])
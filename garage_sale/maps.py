@@ -0,0 +1,46 @@
+"""
+The "garage_sale" map layer: one pin per event per day it is on, at its
+Location. The map only ever asks for today, so days that are over get pruned
+and days further out than MAX_INDEXED_DAYS are not stored.
+Kept in core.clusters by garage_sale.signals; rebuild_map_layer() recomputes it.
+
+Signals only index an event when it is saved, so `manage.py rebuild_map_clusters`
+has to run daily: it prunes the day that just ended and picks up event days
+that have come within MAX_INDEXED_DAYS since.
+"""
+from datetime import timedelta
+
+from django.apps import apps as django_apps
+from django.utils import timezone
+
+from core import clusters
+
+MAP_LAYER = "garage_sale"
+MAX_INDEXED_DAYS = 366
+
+
+def event_points(coords, start_date, end_date, today=None):
+    """coords: (lat, lng) of the event's Location, or None."""
+    if not coords or coords[0] is None or coords[1] is None:
+        return []
+    today = today or timezone.localdate()
+    first = max(start_date, today)
+    last = min(end_date, today + timedelta(days=MAX_INDEXED_DAYS))
+    lat, lng = coords
+    return [(lat, lng, first + timedelta(days=i)) for i in range((last - first).days + 1)]
+
+
+def rebuild_map_layer(apps=None):
+    GarageSaleEvent = (apps or django_apps).get_model("garage_sale", "GarageSaleEvent")
+    today = timezone.localdate()
+    rows = (
+        GarageSaleEvent.objects
+        .filter(end_date__gte=today, location__geo_lat__isnull=False, location__geo_lng__isnull=False)
+        .values_list("location__geo_lat", "location__geo_lng", "start_date", "end_date")
+    )
+    points = (
+        p
+        for lat, lng, start, end in rows.iterator()
+        for p in event_points((lat, lng), start, end, today=today)
+    )
+    return clusters.rebuild(MAP_LAYER, points, apps=apps)
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garage_sale', '0002_build_map_clusters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['customer', 'status', 'created_at'], name='resv_customer_status_idx'),
+        ),
+    ]
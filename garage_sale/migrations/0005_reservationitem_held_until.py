@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garage_sale', '0003_reservation_customer_status_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservationitem',
+            name='held_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reservationitem',
+            index=models.Index(condition=models.Q(('held_until__isnull', False)), fields=['held_until'], name='resv_item_hold_expiry_idx'),
+        ),
+    ]
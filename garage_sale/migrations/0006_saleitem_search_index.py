@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:05
+
+from django.db import migrations
+
+# Frozen here rather than imported from garage_sale.search, so later edits to
+# the search module cannot change what this migration did.
+INSTALL_SQL = {
+    "sqlite": [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS garage_sale_saleitem_fts USING fts5(
+            title, description,
+            content='garage_sale_saleitem', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS garage_sale_saleitem_fts_ai AFTER INSERT ON garage_sale_saleitem BEGIN
+            INSERT INTO garage_sale_saleitem_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS garage_sale_saleitem_fts_ad AFTER DELETE ON garage_sale_saleitem BEGIN
+            INSERT INTO garage_sale_saleitem_fts(garage_sale_saleitem_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS garage_sale_saleitem_fts_au AFTER UPDATE OF title, description ON garage_sale_saleitem BEGIN
+            INSERT INTO garage_sale_saleitem_fts(garage_sale_saleitem_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO garage_sale_saleitem_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END""",
+        "INSERT INTO garage_sale_saleitem_fts(garage_sale_saleitem_fts) VALUES ('rebuild')",
+    ],
+    "postgresql": [
+        """CREATE INDEX IF NOT EXISTS garage_sale_saleitem_search_gin ON garage_sale_saleitem USING GIN ((
+            to_tsvector('english', coalesce("garage_sale_saleitem"."title", '') || ' ' || coalesce("garage_sale_saleitem"."description", ''))
+        ))""",
+    ],
+}
+
+UNINSTALL_SQL = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS garage_sale_saleitem_fts_au",
+        "DROP TRIGGER IF EXISTS garage_sale_saleitem_fts_ad",
+        "DROP TRIGGER IF EXISTS garage_sale_saleitem_fts_ai",
+        "DROP TABLE IF EXISTS garage_sale_saleitem_fts",
+    ],
+    "postgresql": [
+        "DROP INDEX IF EXISTS garage_sale_saleitem_search_gin",
+    ],
+}
+
+
+def install(apps, schema_editor):
+    for sql in INSTALL_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    for sql in UNINSTALL_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garage_sale', '0005_reservationitem_held_until'),
+    ]
+
+    operations = [
+        # SQLite FTS5 table + triggers, or a PostgreSQL GIN index; see garage_sale.search.
+        migrations.RunPython(install, uninstall),
+    ]
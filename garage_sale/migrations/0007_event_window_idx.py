@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_mapcluster'),
+        ('garage_sale', '0006_saleitem_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='garagesaleevent',
+            index=models.Index(fields=['end_date', 'start_date'], name='event_window_idx'),
+        ),
+    ]
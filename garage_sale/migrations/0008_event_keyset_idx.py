@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_mapcluster'),
+        ('garage_sale', '0007_event_window_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='garagesaleevent',
+            index=models.Index(fields=['start_date', 'id'], name='event_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garagesaleevent',
+            index=models.Index(fields=['location', 'start_date', 'id'], name='event_location_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='garagesaleevent',
+            index=models.Index(fields=['owner', 'start_date', 'id'], name='event_owner_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garage_sale', '0008_event_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleItemIndex',
+            fields=[
+                ('item', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='garage_sale.saleitem')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+            ],
+            options={
+                'db_table': 'garage_sale_saleitem_fts',
+                'managed': False,
+            },
+        ),
+    ]
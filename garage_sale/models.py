@@ -1,5 +1,20 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import Q
+
+
+class GarageSaleEventQuerySet(models.QuerySet):
+    def overlapping(self, start, end=None):
+        """
+        Events on for at least one day of start..end (inclusive); no end means
+        on or after start. Served by event_window_idx: past events sit below
+        the end_date range and are never read.
+        """
+        qs = self.filter(end_date__gte=start)
+        return qs.filter(start_date__lte=end) if end is not None else qs
+
+    def active_on(self, day):
+        return self.overlapping(day, day)
 
 
 class GarageSaleEvent(models.Model):
@@ -29,6 +44,28 @@ class GarageSaleEvent(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
 
+    objects = GarageSaleEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # end_date first: "still on at start" is the selective half of an overlap test.
+            models.Index(fields=["end_date", "start_date"], name="event_window_idx"),
+            # Keyset pagination of events_list (newest first on start_date, id), unfiltered and per filter.
+            models.Index(fields=["start_date", "id"], name="event_keyset_idx"),
+            models.Index(fields=["location", "start_date", "id"], name="event_location_keyset_idx"),
+            models.Index(fields=["owner", "start_date", "id"], name="event_owner_keyset_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Where this event was on the map before this save (see garage_sale.signals).
+        self._map_before = (
+            GarageSaleEvent.objects.filter(pk=self.pk)
+            .values("location_id", "start_date", "end_date")
+            .first()
+            if self.pk else None
+        )
+        super().save(*args, **kwargs)
+
     def is_active_today(self):
         from django.utils import timezone
         today = timezone.localdate()
@@ -66,6 +103,28 @@ class SaleItem(models.Model):
         return self.is_listed and self.quantity_available > 0
 
 
+class SaleItemIndex(models.Model):
+    """
+    A row of the SQLite full-text index over item text, so search can join
+    it through the ORM. Migration 0006 creates the table and its triggers;
+    it does not exist on other databases (see garage_sale.search).
+    """
+    item = models.OneToOneField(
+        SaleItem,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_index",
+    )
+    title = models.TextField()
+    description = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = "garage_sale_saleitem_fts"
+
+
 class Reservation(models.Model):
     class Status(models.TextChoices):
         DRAFT = "DRAFT", "Draft"
@@ -107,6 +166,10 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # The customer's current DRAFT (cart_review / cart_confirm / items_list).
+            models.Index(fields=["customer", "status", "created_at"], name="resv_customer_status_idx"),
+        ]
 
     def __str__(self):
         return f"Reservation {self.id} - {self.customer} - {self.status}"
@@ -128,8 +191,16 @@ class ReservationItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price_at_time = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    # Set while this line's quantity is held out of the item's stock (hold
+    # mode, see garage_sale.holds); cleared on confirm or when the hold is released.
+    held_until = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         unique_together = ("reservation", "item")
+        indexes = [
+            # release_expired_holds: held lines by expiry.
+            models.Index(fields=["held_until"], condition=Q(held_until__isnull=False), name="resv_item_hold_expiry_idx"),
+        ]
 
     def __str__(self):
         return f"{self.item.title} x{self.quantity}"
@@ -0,0 +1,232 @@
+"""
+Full-text search over listed, in-stock items of current and upcoming sales.
+
+The text index depends on the database:
+
+* SQLite: an FTS5 table (garage_sale_saleitem_fts) over title and
+  description, external-content on the item table and kept in step by
+  triggers, so every write path (save(), update(), bulk_create, raw SQL)
+  reindexes without help from Python. Ranked by bm25.
+* PostgreSQL: a GIN index on the title/description tsvector expression that
+  match() filters on; PostgreSQL maintains it itself. Ranked by ts_rank.
+* Anything else: icontains per word, unranked.
+
+Only text is indexed. Stock, listing and event dates are filtered on the
+item and event rows at query time, so stock changes never touch the index.
+
+SQLite drops triggers with their table, and Django rebuilds a table for many
+schema changes there. repair_index() runs after every migrate (post_migrate,
+see signals.py) and puts the triggers back, reindexing, if one went missing.
+
+Words are matched as prefixes and all of them must match ("oak tab" finds
+"Oak table"). Facet counts are for the text match within active events,
+each with the other facets applied: price bands, and when the sale is on.
+Small result sets come best match first; large ones newest first (RANK_LIMIT).
+"""
+import re
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import BooleanField, Count, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import SaleItem
+
+FTS_TABLE = "garage_sale_saleitem_fts"
+# Table-qualified: search queries join the event table, which has a title too.
+# The GIN index is built on this same expression so the planner matches it.
+PG_DOCUMENT = (
+    "to_tsvector('english', coalesce(\"garage_sale_saleitem\".\"title\", '') || ' ' "
+    "|| coalesce(\"garage_sale_saleitem\".\"description\", ''))"
+)
+
+MAX_WORDS = 8
+# Ranking scores every match before the first page can be returned; past
+# this many matches ("chair") results come newest first instead.
+RANK_LIMIT = 2000
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# (key, min inclusive, max exclusive or None)
+PRICE_BANDS = (
+    ("under-5", 0, 5),
+    ("5-20", 5, 20),
+    ("20-50", 20, 50),
+    ("50-100", 50, 100),
+    ("100-plus", 100, None),
+)
+DATE_BANDS = ("today", "this-week", "later")
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+TRIGGERS = (f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au")
+
+# The same statements as migration 0006, which has its own frozen copy.
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='garage_sale_saleitem', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON garage_sale_saleitem BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON garage_sale_saleitem BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON garage_sale_saleitem BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def repair_index(using=DEFAULT_DB_ALIAS):
+    """
+    Re-create the SQLite index triggers if a table rebuild dropped them, then
+    reindex every item, since writes made without them were missed. A no-op
+    elsewhere, and before migration 0006 (no FTS table). Returns whether it
+    repaired anything.
+    """
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", [FTS_TABLE, *TRIGGERS],
+        )
+        present = {name for (name,) in cursor.fetchall()}
+        if FTS_TABLE not in present or present.issuperset(TRIGGERS):
+            return False
+        for sql in SQLITE_INDEX_SQL:
+            cursor.execute(sql)
+    return True
+
+
+# --- matching ---
+
+def words(q):
+    return _WORD.findall(q.lower())[:MAX_WORDS]
+
+
+def _fts_expr(terms):
+    # Each word quoted (no FTS syntax from user input) and prefix-matched.
+    return " ".join(f'"{w}"*' for w in terms)
+
+
+def _tsquery(terms):
+    return " & ".join(f"{w}:*" for w in terms)
+
+
+def match(qs, terms):
+    """qs narrowed to items matching every one of terms (see words())."""
+    if connection.vendor == "sqlite":
+        # A join (SaleItemIndex), not "id IN (...)": SQLite then drives the
+        # query from the FTS table and probes the items by primary key.
+        return qs.filter(search_index__isnull=False).filter(RawSQL(
+            f"{FTS_TABLE} MATCH %s", [_fts_expr(terms)], output_field=BooleanField(),
+        ))
+    if connection.vendor == "postgresql":
+        return qs.filter(RawSQL(
+            f"{PG_DOCUMENT} @@ to_tsquery('english', %s)", [_tsquery(terms)], output_field=BooleanField(),
+        ))
+    for w in terms:
+        qs = qs.filter(Q(title__icontains=w) | Q(description__icontains=w))
+    return qs
+
+
+def by_relevance(qs, terms):
+    """Order a match() queryset best first. Scores every matching row, see RANK_LIMIT."""
+    if connection.vendor == "sqlite":
+        # bm25 is lower-is-better; a title hit counts ten times a description hit.
+        return qs.annotate(rank=RawSQL(
+            f"bm25({FTS_TABLE}, 10.0, 1.0)", [], output_field=FloatField(),
+        )).order_by("rank", "id")
+    if connection.vendor == "postgresql":
+        return qs.annotate(rank=RawSQL(
+            f"ts_rank({PG_DOCUMENT}, to_tsquery('english', %s))", [_tsquery(terms)], output_field=FloatField(),
+        )).order_by("-rank", "id")
+    return qs.order_by("id")
+
+
+def by_newest(qs):
+    """Order a match() queryset newest first, which the index can stream without scoring."""
+    if connection.vendor == "sqlite":
+        return qs.order_by("-search_index")
+    return qs.order_by("-id")
+
+
+# --- facets ---
+
+def _price_q(band):
+    _, low, high = band
+    q = Q(price__gte=low)
+    return q & Q(price__lt=high) if high is not None else q
+
+
+def _date_q(key, today):
+    week = today + timedelta(days=7)
+    if key == "today":
+        return Q(event__start_date__lte=today)
+    if key == "this-week":
+        return Q(event__start_date__gt=today, event__start_date__lte=week)
+    return Q(event__start_date__gt=week)
+
+
+def search(q, *, min_price=None, max_price=None, when=None, offset=0, limit=PAGE_SIZE):
+    """
+    Items for q plus facet counts. when is one of DATE_BANDS. Returns
+    {"items": [...], "total": n, "order": "relevance"|"newest",
+     "facets": {"price": [...], "when": [...]}, "more": bool}.
+    """
+    today = timezone.localdate()
+    terms = words(q)
+    if not terms:
+        return {"items": [], "total": 0, "order": "relevance", "more": False, "facets": _facets({}, {})}
+    base = match(
+        SaleItem.objects.filter(is_listed=True, quantity_available__gt=0, event__end_date__gte=today),
+        terms,
+    )
+
+    price_filter = Q()
+    if min_price is not None:
+        price_filter &= Q(price__gte=min_price)
+    if max_price is not None:
+        price_filter &= Q(price__lte=max_price)
+    date_filter = _date_q(when, today) if when else Q()
+
+    # Each facet group is counted with the other group's filter applied; with
+    # no filters both groups share one pass over the matches.
+    price_aggs = {key: Count("id", filter=_price_q((key, low, high))) for key, low, high in PRICE_BANDS}
+    date_aggs = {key: Count("id", filter=_date_q(key, today)) for key in DATE_BANDS}
+    if not price_filter and not date_filter:
+        price_counts = date_counts = base.aggregate(**price_aggs, **date_aggs)
+    else:
+        price_counts = base.filter(date_filter).aggregate(**price_aggs)
+        date_counts = base.filter(price_filter).aggregate(**date_aggs)
+    total = date_counts[when] if when else sum(date_counts[key] for key in DATE_BANDS)
+
+    results = base.filter(price_filter, date_filter).select_related("event", "event__location")
+    order = "relevance" if total <= RANK_LIMIT else "newest"
+    results = by_relevance(results, terms) if order == "relevance" else by_newest(results)
+    page = list(results[offset:offset + limit + 1])
+
+    return {
+        "items": page[:limit],
+        "total": total,
+        "order": order,
+        "more": len(page) > limit,
+        "facets": _facets(price_counts, date_counts),
+    }
+
+
+def _facets(price_counts, date_counts):
+    return {
+        "price": [
+            {"key": key, "min": low, "max": high, "count": price_counts.get(key, 0)}
+            for key, low, high in PRICE_BANDS
+        ],
+        "when": [{"key": key, "count": date_counts.get(key, 0)} for key in DATE_BANDS],
+    }
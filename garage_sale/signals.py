@@ -0,0 +1,88 @@
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import clusters, mapcache
+from core.models import Location
+from . import search
+from .maps import MAP_LAYER, event_points
+from .models import GarageSaleEvent
+
+
+def _coords(location_ids):
+    return {
+        loc_id: (lat, lng)
+        for loc_id, lat, lng in (
+            Location.objects
+            .filter(id__in=[i for i in location_ids if i])
+            .values_list("id", "geo_lat", "geo_lng")
+        )
+    }
+
+
+@receiver(post_save, sender=GarageSaleEvent)
+def event_saved(sender, instance, **kwargs):
+    before = getattr(instance, "_map_before", None)
+    coords = _coords({instance.location_id, before["location_id"] if before else None})
+
+    old = event_points(coords.get(before["location_id"]), before["start_date"], before["end_date"]) if before else []
+    new = event_points(coords.get(instance.location_id), instance.start_date, instance.end_date)
+    clusters.move_points(MAP_LAYER, old, new)
+    mapcache.bump(MAP_LAYER)
+
+
+@receiver(post_delete, sender=GarageSaleEvent)
+def event_deleted(sender, instance, **kwargs):
+    coords = _coords({instance.location_id})
+    clusters.apply_points(MAP_LAYER, event_points(coords.get(instance.location_id), instance.start_date, instance.end_date), -1)
+    mapcache.bump(MAP_LAYER)
+
+
+def _upcoming_events(location):
+    return (
+        GarageSaleEvent.objects
+        .filter(location=location, end_date__gte=timezone.localdate())
+        .values_list("start_date", "end_date")
+    )
+
+
+@receiver(post_save, sender=Location)
+def location_moved(sender, instance, created, **kwargs):
+    # Event pins show the location's name too, so any change may redraw the map.
+    mapcache.bump(MAP_LAYER)
+
+    before = getattr(instance, "_geo_before", None)
+    if created or not before:
+        return
+
+    old_coords = (before["geo_lat"], before["geo_lng"])
+    new_coords = (instance.geo_lat, instance.geo_lng)
+    if old_coords == new_coords:
+        return
+
+    events = list(_upcoming_events(instance))
+    clusters.move_points(
+        MAP_LAYER,
+        [p for start, end in events for p in event_points(old_coords, start, end)],
+        [p for start, end in events for p in event_points(new_coords, start, end)],
+    )
+
+
+@receiver(pre_delete, sender=Location)
+def location_deleting(sender, instance, **kwargs):
+    # Its events survive (location is SET_NULL) but drop off the map.
+    coords = (instance.geo_lat, instance.geo_lng)
+    clusters.apply_points(
+        MAP_LAYER,
+        [p for start, end in _upcoming_events(instance) for p in event_points(coords, start, end)],
+        -1,
+    )
+    mapcache.bump(MAP_LAYER)
+
+
+@receiver(post_migrate)
+def migrated(sender, using, **kwargs):
+    # A migration that rebuilt garage_sale_saleitem on SQLite took the search
+    # index's triggers with it.
+    if sender.name == "garage_sale":
+        search.repair_index(using)
@@ -49,7 +49,30 @@ document.addEventListener("DOMContentLoaded", () => {
   const userRole = cfg.userRole || "";
   const canShop = isLoggedIn && userRole === "CUSTOMER";
 
-  fetch(mapDataUrl, { credentials: "same-origin" })
+  const pins = L.layerGroup().addTo(map);
+  const clusterLayer = L.layerGroup().addTo(map);
+  // Event markers by id, kept across reloads: a popup opened near the edge
+  // auto-pans the map, and the reload that follows must not remove its marker.
+  const markers = new Map();
+  let emptyShown = false;
+
+  // Zoomed out the server sends {lat, lng, count} clusters instead of pins.
+  function addCluster(c) {
+    const size = c.count < 10 ? 30 : c.count < 100 ? 38 : 46;
+    const icon = L.divIcon({
+      className: "map-cluster",
+      html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;border-radius:50%;
+                         background:rgba(0,0,0,.75);color:#fff;text-align:center;font-weight:600">${c.count}</div>`,
+      iconSize: [size, size],
+    });
+    L.marker([c.lat, c.lng], { icon }).addTo(clusterLayer)
+      .on("click", () => map.setView([c.lat, c.lng], map.getZoom() + 2));
+  }
+
+  function loadPins() {
+    const query = `bbox=${encodeURIComponent(map.getBounds().toBBoxString())}&zoom=${map.getZoom()}`;
+
+    return fetch(`${mapDataUrl}?${query}`, { credentials: "same-origin" })
     .then(async (r) => {
       const ct = (r.headers.get("content-type") || "").toLowerCase();
       const text = await r.text();
@@ -64,12 +87,26 @@ document.addEventListener("DOMContentLoaded", () => {
     })
     .then((data) => {
       const events = (data && data.events) || [];
+      const clusters = (data && data.clusters) || [];
+
+      clusterLayer.clearLayers();
+      clusters.forEach(addCluster);
+
+      const wanted = new Set(events.map((ev) => ev && ev.id));
+      markers.forEach((m, id) => {
+        if (!wanted.has(id) && !m.isPopupOpen()) {
+          pins.removeLayer(m);
+          markers.delete(id);
+        }
+      });
 
-      if (!events.length) {
+      if (!events.length && !clusters.length) {
+        if (emptyShown) return;
+        emptyShown = true;
         L.popup()
           .setLatLng(map.getCenter())
           .setContent(
-            `<b>No active garage sales today.</b><br/>
+            `<b>No active garage sales in this area today.</b><br/>
              <span class="muted">
                Try <a href="${eventsListUrl}">View Events</a> or
                <a href="${createEventUrl}">Create Event</a>.
@@ -79,17 +116,15 @@ document.addEventListener("DOMContentLoaded", () => {
         return;
       }
 
-      const bounds = [];
-
       events.forEach((ev) => {
         const lat = ev && ev.lat;
         const lng = ev && ev.lng;
 
         if (!Number.isFinite(lat) || !Number.isFinite(lng)) return;
+        if (markers.has(ev.id)) return;
 
-        bounds.push([lat, lng]);
-
-        const marker = L.marker([lat, lng]).addTo(map);
+        const marker = L.marker([lat, lng]).addTo(pins);
+        markers.set(ev.id, marker);
 
         const title = esc(ev.title || "Garage Sale");
         const locationName = esc(ev.location_name || "");
@@ -112,10 +147,6 @@ document.addEventListener("DOMContentLoaded", () => {
 
         marker.bindPopup(popupHtml);
       });
-
-      if (bounds.length) {
-        map.fitBounds(bounds, { padding: [30, 30] });
-      }
     })
     .catch((err) => {
       console.error("Garage Sale map error:", err);
@@ -129,4 +160,14 @@ document.addEventListener("DOMContentLoaded", () => {
         )
         .openOn(map);
     });
+  }
+
+  // Only what is on screen: reload pins after each pan/zoom (debounced).
+  let reloadTimer = null;
+  map.on("moveend", () => {
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(loadPins, 250);
+  });
+
+  loadPins();
 });
@@ -1,3 +1,655 @@
-from django.test import TestCase
+import datetime as dt
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import IntegrityError, connection, models
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Location, MapCluster, User
+from core.testing import QueryBudgetMixin, QueryPlanMixin, plain_static_storage
+from . import checkout, holds, search
+from .maps import MAP_LAYER, MAX_INDEXED_DAYS
+from .models import GarageSaleEvent, Reservation, ReservationItem, SaleItem
+
+HOT_TABLES = ("garage_sale_reservation", "garage_sale_reservationitem")
+
+
+class ReservationIndexTests(QueryPlanMixin, TestCase):
+    """Cart lookups must reach the customer's DRAFT through an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        location = Location.objects.create(
+            name="Yard", owner=cls.owner, latitude=-37.81, longitude=144.96, is_garage_sale=True,
+        )
+        today = timezone.localdate()
+        cls.event = GarageSaleEvent.objects.create(
+            location=location, owner=cls.owner, title="Sale", start_date=today, end_date=today + dt.timedelta(days=1),
+        )
+        cls.item = SaleItem.objects.create(event=cls.event, title="Lamp", price=5, quantity_available=3)
+        reservation = Reservation.objects.create(event=cls.event, customer=cls.customer)
+        ReservationItem.objects.create(reservation=reservation, item=cls.item, quantity=1, price_at_time=5)
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def test_cart_review(self):
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.get("/garage-sale/cart/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_confirm(self):
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.post("/garage-sale/cart/confirm/")
+        self.assertLess(response.status_code, 400)
+        self.assertTrue(Reservation.objects.filter(customer=self.customer, status=Reservation.Status.CONFIRMED).exists())
+
+    def test_items_list(self):
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.get(f"/garage-sale/events/{self.event.id}/items/")
+        self.assertEqual(response.status_code, 200)
+
+
+@plain_static_storage
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Every garage sale view against several events, items and reservations.
+    Budgets include the session and user lookups of logged-in requests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.customers = [
+            User.objects.create_user(f"cust{i}", password="x", role=User.Role.CUSTOMER) for i in range(3)
+        ]
+        cls.customer = cls.customers[0]
+        today = timezone.localdate()
+        cls.events = []
+        for i in range(4):
+            location = Location.objects.create(
+                name=f"Yard {i}", owner=cls.owner, latitude=-37.81 + i / 100, longitude=144.96, is_garage_sale=True,
+            )
+            cls.events.append(GarageSaleEvent.objects.create(
+                location=location, owner=cls.owner, consultant=cls.consultant, title=f"Sale {i}",
+                start_date=today, end_date=today + dt.timedelta(days=2),
+            ))
+        cls.event = cls.events[0]
+        SaleItem.objects.bulk_create([
+            SaleItem(event=ev, title=f"Item {n}", price=n, quantity_available=5)
+            for ev in cls.events for n in range(6)
+        ])
+        cls.items = list(cls.event.items.order_by("id"))
+
+        for cust in cls.customers[1:]:
+            for ev in cls.events:
+                reservation = Reservation.objects.create(
+                    event=ev, customer=cust, status=Reservation.Status.CONFIRMED, assigned_consultant=cls.consultant,
+                )
+                ReservationItem.objects.bulk_create([
+                    ReservationItem(reservation=reservation, item=it, quantity=1, price_at_time=it.price)
+                    for it in ev.items.all()[:3]
+                ])
+
+    def _run(self, cases):
+        for label, user, method, url, data, budget in cases:
+            with self.subTest(label):
+                if user:
+                    self.client.force_login(user)
+                else:
+                    self.client.logout()
+                with self.assertMaxQueries(budget, label):
+                    if method == "post":
+                        response = self.client.post(url, data)
+                    elif method == "json":
+                        response = self.client.post(url, data, content_type="application/json")
+                    else:
+                        response = self.client.get(url, data)
+                self.assertLess(response.status_code, 500, label)
+
+    def test_public_views(self):
+        self._run([
+            ("home", None, "get", "/garage-sale/", {}, 0),
+            ("map events", None, "get", "/garage-sale/map-data/", {"bbox": "144,-38,145,-37", "zoom": 15}, 1),
+            ("map clusters", None, "get", "/garage-sale/map-data/", {"bbox": "144,-38,145,-37", "zoom": 8}, 1),
+            ("events list", None, "get", "/garage-sale/events/", {}, 1),
+            ("events list filtered", None, "get", "/garage-sale/events/", {"status": "past", "limit": 2}, 1),
+            ("events list json", None, "get", "/garage-sale/api/events/list/", {"owner": self.owner.id}, 1),
+            ("event detail", None, "get", f"/garage-sale/events/{self.event.id}/", {}, 2),
+            ("search", None, "get", "/garage-sale/api/search/", {"q": "item", "max_price": 3}, 3),
+            ("events window", None, "get", "/garage-sale/api/events/", {"bbox": "144,-38,145,-37"}, 1),
+        ])
+
+    def test_customer_views(self):
+        items_url = f"/garage-sale/events/{self.event.id}/items/"
+        toggle_url = f"{items_url}{self.items[0].id}/toggle/"
+        self._run([
+            ("items list", self.customer, "get", items_url, {}, 9),
+            ("items select", self.customer, "post", items_url, {"item_ids": [it.id for it in self.items]}, 7),
+            ("items reselect", self.customer, "post", items_url, {"item_ids": [it.id for it in self.items[1:]]}, 6),
+            ("item toggle on", self.customer, "json", toggle_url, {"selected": True}, 5),
+            ("item toggle off", self.customer, "json", toggle_url, {"selected": False}, 5),
+            ("cart review", self.customer, "get", "/garage-sale/cart/", {}, 5),
+            ("cart confirm", self.customer, "post", "/garage-sale/cart/confirm/", {}, 14),
+            ("cart clear", self.customer, "get", "/garage-sale/cart/clear/", {}, 3),
+            ("post-login", self.customer, "get", "/garage-sale/post-login/", {}, 2),
+        ])
+
+    def test_owner_views(self):
+        item = self.items[0]
+        self._run([
+            ("event create form", self.owner, "get", "/garage-sale/events/create/", {}, 3),
+            ("items list", self.owner, "get", f"/garage-sale/events/{self.event.id}/items/", {}, 4),
+            ("item create form", self.owner, "get", f"/garage-sale/events/{self.event.id}/items/add/", {}, 3),
+            ("item edit form", self.owner, "get", f"/garage-sale/items/{item.id}/edit/", {}, 4),
+            ("item delete form", self.owner, "get", f"/garage-sale/items/{item.id}/delete/", {}, 4),
+            ("item delete", self.owner, "post", f"/garage-sale/items/{self.items[-1].id}/delete/", {}, 6),
+        ])
+
+    def test_consultant_views(self):
+        self._run([
+            ("consultant dashboard", self.consultant, "get", "/garage-sale/consultant/dashboard/", {}, 4),
+        ])
+
+
+class CartConfirmTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.alice = User.objects.create_user("alice", password="x", role=User.Role.CUSTOMER)
+        cls.bob = User.objects.create_user("bob", password="x", role=User.Role.CUSTOMER)
+        today = timezone.localdate()
+        cls.event = GarageSaleEvent.objects.create(
+            owner=cls.owner, consultant=cls.consultant, title="Sale", start_date=today, end_date=today,
+        )
+        cls.lamp = SaleItem.objects.create(event=cls.event, title="Lamp", price=10, quantity_available=1)
+        cls.chair = SaleItem.objects.create(event=cls.event, title="Chair", price=20, quantity_available=3)
+
+    def cart(self, customer, **quantities):
+        reservation = Reservation.objects.create(event=self.event, customer=customer)
+        for name, qty in quantities.items():
+            item = getattr(self, name)
+            ReservationItem.objects.create(reservation=reservation, item=item, quantity=qty, price_at_time=item.price)
+        return reservation
+
+    def stock(self):
+        return dict(SaleItem.objects.values_list("title", "quantity_available"))
+
+    def test_confirm_takes_stock(self):
+        reservation = self.cart(self.alice, lamp=1, chair=2)
+        self.client.force_login(self.alice)
+        self.client.post("/garage-sale/cart/confirm/")
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, Reservation.Status.CONFIRMED)
+        self.assertEqual(reservation.assigned_consultant, self.consultant)
+        self.assertEqual(self.stock(), {"Lamp": 0, "Chair": 1})
+
+    def test_last_unit_goes_to_one_buyer(self):
+        self.cart(self.alice, lamp=1)
+        self.cart(self.bob, lamp=1, chair=1)
+        self.client.force_login(self.alice)
+        self.client.post("/garage-sale/cart/confirm/")
+        self.client.force_login(self.bob)
+        response = self.client.post("/garage-sale/cart/confirm/", follow=True)
+        self.assertContains(response, "Not enough stock for Lamp. Available: 0, in your cart: 1.")
+        # All or nothing: Bob's chair wasn't taken either.
+        self.assertEqual(self.stock(), {"Lamp": 0, "Chair": 3})
+        self.assertEqual(Reservation.objects.get(customer=self.bob).status, Reservation.Status.DRAFT)
+
+    def test_double_submit(self):
+        reservation = self.cart(self.alice, chair=1)
+        lines = list(reservation.lines.select_related("item"))
+        stale = Reservation.objects.select_related("event").get(id=reservation.id)
+        checkout.confirm(Reservation.objects.select_related("event").get(id=reservation.id), lines)
+        with self.assertRaises(checkout.AlreadyConfirmed):
+            checkout.confirm(stale, lines)
+        self.assertEqual(self.stock()["Chair"], 2)
+
+    def test_stock_cannot_go_negative(self):
+        with self.assertRaises(IntegrityError):
+            SaleItem.objects.filter(id=self.lamp.id).update(quantity_available=models.F("quantity_available") - 2)
+
+
+class CartSelectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        today = timezone.localdate()
+        cls.event = GarageSaleEvent.objects.create(owner=cls.owner, title="Sale", start_date=today, end_date=today)
+        cls.items = SaleItem.objects.bulk_create([
+            SaleItem(event=cls.event, title=f"Item {n:02}", price=n, quantity_available=2) for n in range(60)
+        ])
+        cls.sold_out = SaleItem.objects.create(event=cls.event, title="Gone", quantity_available=0)
+        cls.url = f"/garage-sale/events/{cls.event.id}/items/"
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def selected(self):
+        return set(ReservationItem.objects.filter(reservation__customer=self.customer).values_list("item_id", flat=True))
+
+    def writes(self, queries):
+        return [q["sql"].split()[0] for q in queries if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+
+    def test_one_change_costs_one_write(self):
+        ids = [it.id for it in self.items]
+        self.client.post(self.url, {"item_ids": ids})
+        ReservationItem.objects.filter(item_id=ids[0]).update(quantity=2)
+
+        with CaptureQueriesContext(connection) as added:
+            self.client.post(self.url, {"item_ids": ids + [self.sold_out.id]})
+        with CaptureQueriesContext(connection) as removed:
+            self.client.post(self.url, {"item_ids": ids[1:]})
+        with CaptureQueriesContext(connection) as swapped:
+            self.client.post(self.url, {"item_ids": ids[:59] + [ids[0]]})
+
+        self.assertEqual(self.writes(added), [])  # sold out: nothing to add
+        self.assertEqual(self.writes(removed), ["DELETE"])
+        self.assertEqual(self.writes(swapped), ["DELETE", "INSERT"])
+        self.assertEqual(self.selected(), set(ids[:59]))
+        # Kept lines are left alone.
+        self.assertFalse(ReservationItem.objects.filter(item_id=ids[1]).exclude(quantity=1).exists())
+
+    def test_toggle(self):
+        item = self.items[0]
+        url = f"{self.url}{item.id}/toggle/"
+        on = self.client.post(url, {"selected": True}, content_type="application/json")
+        again = self.client.post(url, {"selected": True}, content_type="application/json")
+        self.assertEqual((on.json(), again.status_code), ({"ok": True, "item_id": item.id, "selected": True}, 200))
+        self.assertEqual(self.selected(), {item.id})
+
+        self.client.post(url, {"selected": False}, content_type="application/json")
+        self.assertEqual(self.selected(), set())
+
+    def test_toggle_rejections(self):
+        sold_out = self.client.post(f"{self.url}{self.sold_out.id}/toggle/", {"selected": True}, content_type="application/json")
+        bad = self.client.post(f"{self.url}{self.items[0].id}/toggle/", "nope", content_type="application/json")
+        self.client.force_login(self.owner)
+        owner = self.client.post(f"{self.url}{self.items[0].id}/toggle/", {"selected": True}, content_type="application/json")
+        self.assertEqual((sold_out.status_code, bad.status_code, owner.status_code), (409, 400, 403))
+        self.assertEqual(self.selected(), set())
+
+
+@override_settings(GARAGE_SALE_HOLD_MINUTES=15)
+class StockHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.alice = User.objects.create_user("alice", password="x", role=User.Role.CUSTOMER)
+        cls.bob = User.objects.create_user("bob", password="x", role=User.Role.CUSTOMER)
+        today = timezone.localdate()
+        cls.event = GarageSaleEvent.objects.create(owner=cls.owner, title="Sale", start_date=today, end_date=today)
+        cls.lamp = SaleItem.objects.create(event=cls.event, title="Lamp", price=10, quantity_available=1)
+        cls.chair = SaleItem.objects.create(event=cls.event, title="Chair", price=20, quantity_available=3)
+        cls.url = f"/garage-sale/events/{cls.event.id}/items/"
+
+    def select(self, customer, *items):
+        self.client.force_login(customer)
+        return self.client.post(self.url, {"item_ids": [it.id for it in items]}, follow=True)
+
+    def stock(self):
+        return dict(SaleItem.objects.values_list("title", "quantity_available"))
+
+    def lines(self, customer):
+        return ReservationItem.objects.filter(reservation__customer=customer)
+
+    def test_first_to_add_gets_the_hold(self):
+        self.select(self.alice, self.lamp, self.chair)
+        self.assertEqual(self.stock(), {"Lamp": 0, "Chair": 2})
+        self.assertFalse(self.lines(self.alice).filter(held_until__isnull=True).exists())
+
+        response = self.select(self.bob, self.lamp, self.chair)
+        self.assertContains(response, "1 item(s) were no longer available")
+        toggle = self.client.post(f"{self.url}{self.lamp.id}/toggle/", {"selected": True}, content_type="application/json")
+        self.assertEqual(toggle.status_code, 409)
+        self.assertEqual(list(self.lines(self.bob).values_list("item__title", flat=True)), ["Chair"])
+
+    def test_removing_gives_stock_back(self):
+        self.select(self.alice, self.lamp, self.chair)
+        self.select(self.alice, self.chair)
+        self.assertEqual(self.stock(), {"Lamp": 1, "Chair": 2})
+        self.client.get("/garage-sale/cart/clear/")
+        self.assertEqual(self.stock(), {"Lamp": 1, "Chair": 3})
+
+    def test_confirm_converts_holds(self):
+        self.select(self.alice, self.lamp, self.chair)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post("/garage-sale/cart/confirm/")
+        self.assertFalse([q for q in queries if q["sql"].startswith('UPDATE "garage_sale_saleitem"')])
+        self.assertEqual(Reservation.objects.get(customer=self.alice).status, Reservation.Status.CONFIRMED)
+        self.assertEqual(self.stock(), {"Lamp": 0, "Chair": 2})
+        self.assertFalse(self.lines(self.alice).filter(held_until__isnull=False).exists())
+
+    def test_expired_holds_are_released(self):
+        self.select(self.alice, self.lamp, self.chair)
+        self.lines(self.alice).filter(item=self.lamp).update(held_until=timezone.now() - dt.timedelta(minutes=1))
+
+        self.assertEqual(holds.release_expired(chunk_size=1), 1)
+        self.assertEqual(self.stock(), {"Lamp": 1, "Chair": 2})
+        # The line stays in Alice's cart, unheld; Bob takes the lamp first.
+        self.select(self.bob, self.lamp)
+        self.client.force_login(self.alice)
+        response = self.client.post("/garage-sale/cart/confirm/", follow=True)
+        self.assertContains(response, "Not enough stock for Lamp. Available: 0, in your cart: 1.")
+        self.assertEqual(self.stock(), {"Lamp": 0, "Chair": 2})
+
+    @override_settings(GARAGE_SALE_HOLD_MINUTES=0)
+    def test_holds_off(self):
+        self.select(self.alice, self.lamp)
+        self.assertEqual(self.stock(), {"Lamp": 1, "Chair": 3})
+        self.assertEqual(self.lines(self.alice).get().held_until, None)
+
+
+class ItemSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        today = timezone.localdate()
+        cls.today_event = GarageSaleEvent.objects.create(owner=owner, title="Today", start_date=today, end_date=today)
+        cls.later_event = GarageSaleEvent.objects.create(
+            owner=owner, title="Later", start_date=today + dt.timedelta(days=10), end_date=today + dt.timedelta(days=11),
+        )
+        cls.past_event = GarageSaleEvent.objects.create(
+            owner=owner, title="Past", start_date=today - dt.timedelta(days=3), end_date=today - dt.timedelta(days=1),
+        )
+        cls.table = SaleItem.objects.create(event=cls.today_event, title="Oak table", description="Solid oak", price=80)
+        cls.chairs = SaleItem.objects.create(
+            event=cls.later_event, title="Dining chairs", description="Four chairs, go with an oak table", price=15,
+        )
+        SaleItem.objects.bulk_create([
+            SaleItem(event=cls.today_event, title="Oak shelf (unlisted)", price=10, is_listed=False),
+            SaleItem(event=cls.today_event, title="Oak stool (sold out)", price=10, quantity_available=0),
+            SaleItem(event=cls.past_event, title="Oak desk (ended)", price=10),
+        ])
+
+    def ids(self, q, **filters):
+        return [it.id for it in search.search(q, **filters)["items"]]
+
+    def test_prefix_words_all_must_match(self):
+        self.assertEqual(self.ids("oak tab"), [self.table.id, self.chairs.id])
+        self.assertEqual(self.ids("chair"), [self.chairs.id])
+        self.assertEqual(self.ids("oak lamp"), [])
+
+    def test_only_listed_in_stock_items_of_active_events(self):
+        self.assertCountEqual(self.ids("oak"), [self.table.id, self.chairs.id])
+
+    def test_index_follows_writes(self):
+        SaleItem.objects.filter(id=self.table.id).update(title="Pine table", description="")
+        self.assertEqual(self.ids("oak"), [self.chairs.id])
+        self.assertEqual(self.ids("pine"), [self.table.id])
+
+        SaleItem.objects.create(event=self.today_event, title="Oak chest", price=30)
+        self.assertEqual(len(self.ids("chest")), 1)
+
+        self.chairs.delete()
+        self.assertEqual(self.ids("chair"), [])
+
+    def test_triggers_come_back_after_a_table_rebuild(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite keeps the index with triggers")
+        # What a migration that rebuilds garage_sale_saleitem leaves behind.
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.FTS_TABLE}_au")
+        SaleItem.objects.filter(id=self.table.id).update(title="Pine table", description="")
+
+        emit_post_migrate_signal(0, False, "default")
+
+        self.assertEqual(self.ids("pine"), [self.table.id])
+        SaleItem.objects.filter(id=self.table.id).update(title="Elm table")
+        self.assertEqual(self.ids("elm"), [self.table.id])
+        self.assertFalse(search.repair_index())
+
+    def test_stock_is_read_live(self):
+        SaleItem.objects.filter(id=self.table.id).update(quantity_available=0)
+        self.assertEqual(self.ids("oak"), [self.chairs.id])
+
+    def test_facets_and_filters(self):
+        result = search.search("oak", when="today")
+        self.assertEqual([it.id for it in result["items"]], [self.table.id])
+        price = {f["key"]: f["count"] for f in result["facets"]["price"]}
+        when = {f["key"]: f["count"] for f in result["facets"]["when"]}
+        # Each facet group is counted with the other group's filter only.
+        self.assertEqual(price, {"under-5": 0, "5-20": 0, "20-50": 0, "50-100": 1, "100-plus": 0})
+        self.assertEqual(when, {"today": 1, "this-week": 0, "later": 1})
+
+        self.assertEqual(self.ids("oak", max_price=20), [self.chairs.id])
+        self.assertEqual(self.ids("oak", min_price=20, when="later"), [])
+
+    def test_broad_queries_come_newest_first(self):
+        with mock.patch.object(search, "RANK_LIMIT", 1):
+            result = search.search("oak")
+        self.assertEqual(result["order"], "newest")
+        self.assertEqual(result["total"], 2)
+        self.assertEqual([it.id for it in result["items"]], [self.chairs.id, self.table.id])
+
+    def test_postgres_sql_names_item_columns(self):
+        # Search joins the event table, which has its own title: bare column names would be ambiguous.
+        qs = SaleItem.objects.filter(event__end_date__gte=timezone.localdate())
+        with mock.patch.object(search, "connection", mock.Mock(vendor="postgresql")):
+            sql = str(search.by_relevance(search.match(qs, ["oak"]), ["oak"]).query)
+        index_sql = import_module("garage_sale.migrations.0006_saleitem_search_index").INSTALL_SQL["postgresql"][0]
+        self.assertIn('"garage_sale_garagesaleevent"', sql)
+        self.assertEqual(sql.count(search.PG_DOCUMENT), 2)
+        self.assertIn(search.PG_DOCUMENT, index_sql)
+        self.assertNotRegex(search.PG_DOCUMENT, r"\(\s*(title|description)\b")
+
+    def test_paging(self):
+        first = search.search("oak", limit=1)
+        second = search.search("oak", offset=1, limit=1)
+        self.assertTrue(first["more"])
+        self.assertFalse(second["more"])
+        self.assertEqual(len({first["items"][0].id, second["items"][0].id}), 2)
+
+    def test_api(self):
+        response = self.client.get("/garage-sale/api/search/", {"q": "oak", "when": "later"})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([it["id"] for it in body["items"]], [self.chairs.id])
+        self.assertEqual(body["items"][0]["event"]["title"], "Later")
+        self.assertFalse(body["more"])
+
+        for params in ({}, {"q": "oak", "when": "soon"}, {"q": "oak", "min_price": "cheap"}, {"q": "oak", "limit": "x"}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get("/garage-sale/api/search/", params).status_code, 400)
+
+
+class EventWindowTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.today = today = timezone.localdate()
+        near = Location.objects.create(
+            name="Near", owner=owner, latitude=-37.81, longitude=144.96, is_garage_sale=True,
+        )
+        far = Location.objects.create(
+            name="Far", owner=owner, latitude=-37.50, longitude=145.30, is_garage_sale=True,
+        )
+
+        def event(title, location, start, end):
+            return GarageSaleEvent.objects.create(
+                location=location, owner=owner, title=title,
+                start_date=today + dt.timedelta(days=start), end_date=today + dt.timedelta(days=end),
+            )
+
+        cls.past = event("Past", near, -10, -8)
+        cls.now = event("Now", near, -1, 1)
+        cls.soon = event("Soon", far, 3, 4)
+        cls.long = event("Long", far, -5, 30)
+        # Enough finished events that reading them all would show up as a scan.
+        GarageSaleEvent.objects.bulk_create([
+            GarageSaleEvent(location=near, owner=owner, title=f"Old {i}",
+                            start_date=today - dt.timedelta(days=400 - i), end_date=today - dt.timedelta(days=399 - i))
+            for i in range(50)
+        ])
+
+    def titles(self, qs):
+        return set(qs.exclude(title__startswith="Old").values_list("title", flat=True))
+
+    def test_overlapping(self):
+        d = lambda n: self.today + dt.timedelta(days=n)
+        self.assertEqual(self.titles(GarageSaleEvent.objects.active_on(self.today)), {"Now", "Long"})
+        self.assertEqual(self.titles(GarageSaleEvent.objects.overlapping(d(-9), d(-1))), {"Past", "Now", "Long"})
+        self.assertEqual(self.titles(GarageSaleEvent.objects.overlapping(d(2), d(3))), {"Soon", "Long"})
+        self.assertEqual(self.titles(GarageSaleEvent.objects.overlapping(self.today)), {"Now", "Soon", "Long"})
+
+    def test_map_and_window_skip_past_events_by_index(self):
+        with self.assertIndexedQueries("garage_sale_garagesaleevent"):
+            responses = [
+                self.client.get("/garage-sale/map-data/"),
+                self.client.get("/garage-sale/api/events/", {"lat": -37.81, "lng": 144.96}),
+            ]
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+
+    def test_window_by_bbox(self):
+        response = self.client.get("/garage-sale/api/events/", {
+            "start": (self.today + dt.timedelta(days=2)).isoformat(),
+            "end": (self.today + dt.timedelta(days=5)).isoformat(),
+            "bbox": "144,-38,146,-37",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e["title"] for e in response.json()["events"]], ["Long", "Soon"])
+
+        response = self.client.get("/garage-sale/api/events/", {"bbox": "144,-38,146,-37", "limit": 1})
+        self.assertEqual(len(response.json()["events"]), 1)
+        self.assertTrue(response.json()["more"])
+
+    def test_window_nearest(self):
+        body = self.client.get("/garage-sale/api/events/", {"lat": -37.81, "lng": 144.96}).json()
+        self.assertEqual([e["title"] for e in body["events"]], ["Now", "Long"])
+        self.assertEqual(body["events"][0]["distance_km"], 0)
+
+        body = self.client.get("/garage-sale/api/events/", {"lat": -37.81, "lng": 144.96, "max_km": 5}).json()
+        self.assertEqual([e["title"] for e in body["events"]], ["Now"])
+
+    def test_window_validation(self):
+        today = self.today.isoformat()
+        for params in (
+            {},
+            {"lat": -37.8},
+            {"lat": -37.8, "lng": 144.9, "bbox": "144,-38,146,-37"},
+            {"lat": -37.8, "lng": 144.9, "start": "tomorrow"},
+            {"lat": -37.8, "lng": 144.9, "start": today, "end": (self.today - dt.timedelta(days=1)).isoformat()},
+            {"lat": -37.8, "lng": 144.9, "start": today, "end": (self.today + dt.timedelta(days=31)).isoformat()},
+            {"lat": -37.8, "lng": 144.9, "limit": 0},
+            {"lat": 91, "lng": 144.9},
+        ):
+            with self.subTest(params):
+                self.assertEqual(self.client.get("/garage-sale/api/events/", params).status_code, 400)
+
+
+class EventsListTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.other = User.objects.create_user("other", password="x", role=User.Role.LOCATION_OWNER)
+        cls.location = Location.objects.create(
+            name="Yard", owner=cls.owner, latitude=-37.81, longitude=144.96, is_garage_sale=True,
+        )
+        today = timezone.localdate()
+        # Two events per start date so the id breaks ties; offsets -6..+6 days.
+        cls.events = [
+            GarageSaleEvent.objects.create(
+                owner=cls.owner if n % 2 else cls.other, location=cls.location if n % 3 == 0 else None,
+                title=f"E{n}", start_date=today + dt.timedelta(days=n // 2 * 2 - 6),
+                end_date=today + dt.timedelta(days=n // 2 * 2 - 5),
+            )
+            for n in range(13)
+        ]
+
+    def get(self, **params):
+        response = self.client.get("/garage-sale/api/events/list/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, body):
+        return [e["title"] for e in body["events"]]
+
+    def newest_first(self, events):
+        return [ev.title for ev in sorted(events, key=lambda ev: (ev.start_date, ev.id), reverse=True)]
+
+    def test_pages_newest_first_and_back(self):
+        seen, pages, body = [], [], self.get(limit=5)
+        self.assertIsNone(body["newer"])
+        while True:
+            pages.append(body)
+            seen += self.titles(body)
+            if not body["older"]:
+                break
+            body = self.get(limit=5, before=body["older"])
+        self.assertEqual(seen, self.newest_first(self.events))
+        self.assertEqual([len(p["events"]) for p in pages], [5, 5, 3])
+
+        back = self.get(limit=5, after=pages[-1]["newer"])
+        self.assertEqual(self.titles(back), self.titles(pages[-2]))
+        # And Older again lands on the same page, boundary row included.
+        self.assertEqual(self.titles(self.get(limit=5, before=back["older"])), self.titles(pages[-1]))
+
+    def test_filters(self):
+        today = timezone.localdate()
+        cases = {
+            "past": [ev for ev in self.events if ev.end_date < today],
+            "upcoming": [ev for ev in self.events if ev.start_date > today],
+            "active": [ev for ev in self.events if ev.start_date <= today <= ev.end_date],
+        }
+        for status, expected in cases.items():
+            with self.subTest(status):
+                self.assertEqual(self.titles(self.get(status=status)), self.newest_first(expected))
+        self.assertEqual(
+            self.titles(self.get(owner=self.owner.id, location=self.location.id)),
+            self.newest_first([ev for ev in self.events if ev.owner == self.owner and ev.location_id]),
+        )
+
+    def test_bad_params(self):
+        for params in ({"status": "soon"}, {"owner": "me"}, {"before": "yesterday"}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get("/garage-sale/api/events/list/", params).status_code, 400)
+                self.assertRedirects(
+                    self.client.get("/garage-sale/events/", params), "/garage-sale/events/", fetch_redirect_response=False,
+                )
+
+    def test_html_pager_keeps_filters(self):
+        self.client.force_login(self.owner)
+        response = self.client.get("/garage-sale/events/", {"status": "past", "limit": 2})
+        self.assertEqual([ev.title for ev in response.context["events"]], self.newest_first(
+            [ev for ev in self.events if ev.end_date < timezone.localdate()]
+        )[:2])
+        self.assertContains(response, f"?status=past&before={response.context['page'].older}")
+        self.assertContains(response, f"?status=past&amp;owner={self.owner.id}")
+
+    def test_pages_read_through_indexes(self):
+        # The unfiltered first page walks event_keyset_idx from the end for limit + 1
+        # rows; the plan check can't tell that from a full scan, so it stays outside.
+        body = self.get(limit=3)
+        with self.assertIndexedQueries("garage_sale_garagesaleevent"):
+            self.get(limit=3, before=body["older"])
+            self.get(limit=3, location=self.location.id)
+            self.get(limit=3, owner=self.owner.id, before=body["older"])
+
+
+class MapLayerTests(TestCase):
+    def days(self):
+        return list(MapCluster.objects.filter(layer=MAP_LAYER).values_list("day", flat=True).distinct())
+
+    def test_daily_rebuild_indexes_days_that_come_within_the_horizon(self):
+        owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        location = Location.objects.create(
+            name="Hall", owner=owner, latitude=-37.81, longitude=144.96, is_garage_sale=True,
+        )
+        today = timezone.localdate()
+        day = today + dt.timedelta(days=MAX_INDEXED_DAYS + 10)
+        GarageSaleEvent.objects.create(location=location, owner=owner, title="Far off", start_date=day, end_date=day)
+        self.assertEqual(self.days(), [])
+
+        with mock.patch("django.utils.timezone.localdate", return_value=today + dt.timedelta(days=10)):
+            call_command("rebuild_map_clusters", stdout=StringIO())
+        self.assertEqual(self.days(), [day])
@@ -6,7 +6,21 @@ app_name = "garage_sale"
 urlpatterns = [
     path("", views.home, name="home"),
     path("map-data/", views.map_data, name="map_data"),
+    path("api/events/list/", views.api_events_list, name="api_events_list"),
+    path("api/events/", views.api_events_window, name="api_events_window"),
+    path("api/search/", views.api_search, name="api_search"),
+    path("post-login/", views.post_login_router, name="post_login_router"),
     path("events/", views.events_list, name="events_list"),
-    # path("events/create/", views.event_create, name="event_create"),  # ✅ add this
+    path("events/create/", views.event_create, name="event_create"),
+    path("events/<int:event_id>/", views.event_detail, name="event_detail"),
+    path("events/<int:event_id>/items/", views.items_list, name="items_list"),
+    path("events/<int:event_id>/items/<int:item_id>/toggle/", views.item_toggle, name="item_toggle"),
+    path("cart/", views.cart_review, name="cart_review"),
+    path("cart/clear/", views.cart_clear, name="cart_clear"),
+    path("cart/confirm/", views.cart_confirm, name="cart_confirm"),
+    path("events/<int:event_id>/items/add/", views.item_create, name="item_create"),
+    path("items/<int:item_id>/edit/", views.item_edit, name="item_edit"),
+    path("items/<int:item_id>/delete/", views.item_delete, name="item_delete"),
+    path("consultant/dashboard/", views.consultant_dashboard, name="consultant_dashboard"),
 ]
 
@@ -1,15 +1,25 @@
 from __future__ import annotations
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
 from typing import Set
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
 from django.db.models import Prefetch
 from django.http import JsonResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
 from django.utils import timezone
+from core.clusters import cluster_level, clusters_in_bbox
+from core.geo import bbox_q, nearest, parse_viewport
+from core.mapcache import cached_json
+from core.pagination import Keyset, page_params
 from core.models import User
-# from .forms import GarageSaleEventForm
+from . import cart, checkout, holds, search
+from .forms import GarageSaleEventForm, SaleItemForm
+from .maps import MAP_LAYER
 from .models import GarageSaleEvent, SaleItem, Reservation, ReservationItem
 from django.conf import settings
 
@@ -46,37 +56,199 @@ def _current_draft_reservation(user, event: GarageSaleEvent) -> Reservation:
 
 
 
+_URL_ID_PLACEHOLDER = 2147483647
+
+
+def _url_template(name):
+    """reverse() once for a one-id URL and return it as a str.format template."""
+    return reverse(name, args=[_URL_ID_PLACEHOLDER]).replace(str(_URL_ID_PLACEHOLDER), "{}")
+
+
+# A whole-world map at street zoom could otherwise list every event that is on.
+MAP_MAX_EVENTS = 1000
+
+_EVENT_FIELDS = (
+    "id", "title", "start_date", "end_date",
+    "location__name", "location__geo_lat", "location__geo_lng",
+)
+
+
+def _event_json():
+    """Serializer for _EVENT_FIELDS rows, with the URL templates resolved once."""
+    items_url = _url_template("garage_sale:items_list")
+    event_url = _url_template("garage_sale:event_detail")
+
+    def to_json(row):
+        ev_id, title, start_date, end_date, loc_name, lat, lng = row
+        return {
+            "id": ev_id,
+            "title": title or f"Garage Sale @ {loc_name}",
+            "location_name": loc_name,
+            "lat": lat,
+            "lng": lng,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "items_url": items_url.format(ev_id),
+            "event_url": event_url.format(ev_id),
+        }
+    return to_json
+
+
 def map_data(request):
     """
     Active events ONLY. Coordinates come from event.location (physio Location).
+    Optional ?bbox=west,south,east,north&zoom=N limits the response to the visible map area;
+    below CLUSTER_MAX_ZOOM it returns pre-aggregated "clusters" ({lat, lng, count}) instead of "events".
+    At most MAP_MAX_EVENTS events, newest first; "more" says whether any were left out.
+    The bbox is snapped to grid cells and the response served from core.mapcache with an ETag.
     """
+    try:
+        viewport = parse_viewport(request.GET, snap=True)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": f"Invalid viewport: {e}"}, status=400)
+
     today = timezone.localdate()
-    qs = (
-        GarageSaleEvent.objects
-        .select_related("location")
-        .filter(start_date__lte=today, end_date__gte=today)
-        .order_by("-start_date", "-id")
-    )
 
-    events = []
-    for ev in qs:
-        loc = ev.location
-        if loc.latitude is None or loc.longitude is None:
-            continue
+    def build():
+        level = cluster_level(viewport.zoom)
+        if level is not None:
+            return {
+                "clusters": clusters_in_bbox(MAP_LAYER, level, viewport.bbox, day=today),
+                "events": [],
+            }
+
+        qs = (
+            GarageSaleEvent.objects
+            .active_on(today)
+            .filter(location__geo_lat__isnull=False, location__geo_lng__isnull=False)
+            .order_by("-start_date", "-id")
+        )
+        if viewport.bbox:
+            qs = qs.filter(bbox_q(viewport.bbox, "location__"))
+
+        rows = list(qs.values_list(*_EVENT_FIELDS)[:MAP_MAX_EVENTS + 1])
+        to_json = _event_json()
+        return {"events": [to_json(row) for row in rows[:MAP_MAX_EVENTS]], "more": len(rows) > MAP_MAX_EVENTS}
+
+    # today is part of the key: the same data draws a different map tomorrow.
+    return cached_json(request, MAP_LAYER, (viewport, today), build)
 
-        events.append({
-            "id": ev.id,
-            "title": ev.title or f"Garage Sale @ {loc.name}",
-            "location_name": loc.name,
-            "lat": float(loc.latitude),
-            "lng": float(loc.longitude),
-            "start_date": ev.start_date.isoformat(),
-            "end_date": ev.end_date.isoformat(),
-            "items_url": reverse("garage_sale:items_list", args=[ev.id]),
-            "event_url": reverse("garage_sale:event_detail", args=[ev.id]),
-        })
 
-    return JsonResponse({"events": events})
+WINDOW_MAX_DAYS = 31
+WINDOW_DEFAULT_EVENTS = 50
+WINDOW_MAX_EVENTS = 200
+
+
+def api_events_window(request):
+    """
+    Events on for at least one day of ?start=..?end= (YYYY-MM-DD, inclusive;
+    end defaults to start, start to today), at most WINDOW_MAX_DAYS days.
+    Where: ?lat=&lng= (optionally ?max_km=) for the nearest events, closest
+    first, or ?bbox=west,south,east,north for the events inside it, soonest
+    first. ?limit= caps the result (default 50, max 200); "more" says whether
+    a bbox had more events than that.
+    """
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET["start"]) if request.GET.get("start") else today
+        end = date.fromisoformat(request.GET["end"]) if request.GET.get("end") else start
+        limit = int(request.GET.get("limit") or WINDOW_DEFAULT_EVENTS)
+        viewport = parse_viewport(request.GET)
+        near = None
+        if request.GET.get("lat") or request.GET.get("lng"):
+            near = (float(request.GET["lat"]), float(request.GET["lng"]))
+        max_km = float(request.GET["max_km"]) if request.GET.get("max_km") else None
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"ok": False, "error": f"Invalid parameters: {e}"}, status=400)
+
+    if end < start or (end - start).days >= WINDOW_MAX_DAYS:
+        return JsonResponse({"ok": False, "error": f"Date range must be 1-{WINDOW_MAX_DAYS} days"}, status=400)
+    if not (1 <= limit <= WINDOW_MAX_EVENTS):
+        return JsonResponse({"ok": False, "error": f"limit must be 1..{WINDOW_MAX_EVENTS}"}, status=400)
+    if (near is None) == (viewport.bbox is None):
+        return JsonResponse({"ok": False, "error": "Give either lat and lng or bbox"}, status=400)
+    if near is not None and not (-90 <= near[0] <= 90 and -180 <= near[1] <= 180):
+        return JsonResponse({"ok": False, "error": "lat/lng out of range"}, status=400)
+    if max_km is not None and max_km <= 0:
+        return JsonResponse({"ok": False, "error": "max_km must be positive"}, status=400)
+
+    qs = GarageSaleEvent.objects.overlapping(start, end)
+    to_json = _event_json()
+    more = False
+    if near is not None:
+        hits = nearest(qs, *near, limit, fields=_EVENT_FIELDS, max_km=max_km, prefix="location__")
+        events = [{**to_json(row), "distance_km": round(dist, 3)} for dist, row in hits]
+    else:
+        rows = list(
+            qs.filter(bbox_q(viewport.bbox, "location__"))
+            .order_by("start_date", "id")
+            .values_list(*_EVENT_FIELDS)[:limit + 1]
+        )
+        events = [to_json(row) for row in rows[:limit]]
+        more = len(rows) > limit
+    return JsonResponse({"ok": True, "start": start.isoformat(), "end": end.isoformat(), "events": events, "more": more})
+
+
+# ----------------------------
+# Search
+# ----------------------------
+
+def _decimal_param(request, name):
+    raw = request.GET.get(name, "").strip()
+    if not raw:
+        return None
+    value = Decimal(raw)
+    if not value.is_finite() or value < 0:
+        raise InvalidOperation(name)
+    return value
+
+
+def api_search(request):
+    """
+    Listed, in-stock items of active events matching ?q=, best match first
+    (newest first for very broad queries, see "order").
+    Optional min_price, max_price, when (today|this-week|later), offset, limit.
+    Facet counts and the total come back with every page (garage_sale.search).
+    """
+    q = request.GET.get("q", "").strip()
+    when = request.GET.get("when") or None
+    try:
+        min_price = _decimal_param(request, "min_price")
+        max_price = _decimal_param(request, "max_price")
+        offset = max(int(request.GET.get("offset", 0)), 0)
+        limit = min(max(int(request.GET.get("limit", search.PAGE_SIZE)), 1), search.MAX_PAGE_SIZE)
+    except (InvalidOperation, ValueError):
+        return JsonResponse({"ok": False, "error": "min_price/max_price must be non-negative numbers, offset/limit integers."}, status=400)
+    if when is not None and when not in search.DATE_BANDS:
+        return JsonResponse({"ok": False, "error": f"when must be one of {', '.join(search.DATE_BANDS)}."}, status=400)
+    if not search.words(q):
+        return JsonResponse({"ok": False, "error": "q is required."}, status=400)
+
+    found = search.search(q, min_price=min_price, max_price=max_price, when=when, offset=offset, limit=limit)
+    items_url = _url_template("garage_sale:items_list")
+    return JsonResponse({
+        "ok": True,
+        "items": [
+            {
+                "id": it.id,
+                "title": it.title,
+                "price": str(it.price),
+                "quantity_available": it.quantity_available,
+                "event": {
+                    "id": it.event_id,
+                    "title": it.event.title or (f"Garage Sale @ {it.event.location.name}" if it.event.location else "Garage Sale"),
+                    "start_date": it.event.start_date.isoformat(),
+                    "end_date": it.event.end_date.isoformat(),
+                    "items_url": items_url.format(it.event_id),
+                },
+            }
+            for it in found["items"]
+        ],
+        "total": found["total"],
+        "order": found["order"],
+        "more": found["more"],
+        "facets": found["facets"],
+    })
 
 
 # ----------------------------
@@ -100,10 +272,96 @@ def post_login_router(request):
 # Events
 # ----------------------------
 
-def events_list(request):
+# Newest first, page by page: ?before=<cursor> goes to older events, ?after= back
+# to newer ones (keyset on start_date, id; see core.pagination).
+EVENT_KEYSET = Keyset("start_date", "id")
+EVENT_STATUSES = ("active", "upcoming", "past")
+
+
+def _events_page(request):
+    """
+    (page, filters) for events_list and its JSON twin. Filters: ?status= (one
+    of EVENT_STATUSES), ?location=<id>, ?owner=<id>. Raises ValueError on a bad
+    filter or cursor.
+    """
     today = timezone.localdate()
-    events = GarageSaleEvent.objects.select_related("location", "owner", "consultant").order_by("-start_date", "-id")
-    return render(request, "garage_sale/events_list.html", {"events": events, "today": today})
+    qs = GarageSaleEvent.objects.select_related("location", "owner", "consultant")
+    filters = {}
+
+    status = request.GET.get("status") or ""
+    if status == "active":
+        qs = qs.active_on(today)
+    elif status == "upcoming":
+        qs = qs.filter(start_date__gt=today)
+    elif status == "past":
+        qs = qs.filter(end_date__lt=today)
+    elif status:
+        raise ValueError("status")
+    if status:
+        filters["status"] = status
+    for param in ("location", "owner"):
+        if request.GET.get(param):
+            filters[param] = int(request.GET[param])
+            qs = qs.filter(**{f"{param}_id": filters[param]})
+
+    before, after, limit = page_params(request)
+    if before or after:
+        page = EVENT_KEYSET.page(qs, before=before, after=after, limit=limit)
+    else:
+        page = EVENT_KEYSET.latest(qs, limit=limit)
+    return page, filters
+
+
+def events_list(request):
+    try:
+        page, filters = _events_page(request)
+    except ValueError:
+        return redirect("garage_sale:events_list")
+
+    others = {k: v for k, v in filters.items() if k != "status"}
+    mine = None
+    if getattr(request.user, "role", None) == User.Role.LOCATION_OWNER and filters.get("owner") != request.user.id:
+        mine = urlencode({**filters, "owner": request.user.id})
+
+    return render(request, "garage_sale/events_list.html", {
+        "events": page.items[::-1],
+        "page": page,
+        "filters": filters,
+        "filter_query": urlencode(filters),
+        # (label, status, query string) for the status tabs; location/owner filters carry over.
+        "status_tabs": [("All", "", urlencode(others))] + [
+            (status.capitalize(), status, urlencode({"status": status, **others})) for status in EVENT_STATUSES
+        ],
+        "mine_query": mine,
+        "today": timezone.localdate(),
+    })
+
+
+def api_events_list(request):
+    """JSON twin of events_list: same filters and ?before=/?after= cursors, newest first."""
+    try:
+        page, _ = _events_page(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid status/location/owner or cursor"}, status=400)
+
+    return JsonResponse({
+        "ok": True,
+        "events": [
+            {
+                "id": ev.id,
+                "title": ev.title or "Garage Sale",
+                "start_date": ev.start_date.isoformat(),
+                "end_date": ev.end_date.isoformat(),
+                "location_id": ev.location_id,
+                "location_name": ev.location.name if ev.location else None,
+                "owner_id": ev.owner_id,
+                "consultant_id": ev.consultant_id,
+            }
+            for ev in page.items[::-1]
+        ],
+        "older": page.older,
+        "newer": page.newer,
+    })
 
 
 def event_detail(request, event_id):
@@ -156,19 +414,10 @@ def items_list(request, event_id: int):
         preselected = set(reservation.lines.values_list("item_id", flat=True))
 
         if request.method == "POST":
-            selected_ids = request.POST.getlist("item_ids")
-            reservation.lines.all().delete()
-
-            selected_items = items.filter(id__in=selected_ids, quantity_available__gt=0)
-            for it in selected_items:
-                ReservationItem.objects.create(
-                    reservation=reservation,
-                    item=it,
-                    quantity=1,
-                    price_at_time=it.price,
-                )
-
+            _, _, unavailable = cart.set_selection(reservation, items, request.POST.getlist("item_ids"), preselected)
             messages.success(request, "Selection updated.")
+            if unavailable:
+                messages.warning(request, f"{unavailable} item(s) were no longer available and were not added.")
             return redirect("garage_sale:cart_review")
 
     else:
@@ -184,6 +433,34 @@ def items_list(request, event_id: int):
     })
 
 
+@require_POST
+@login_required
+def item_toggle(request, event_id: int, item_id: int):
+    """JSON add/remove of one item in the customer's draft: {"selected": true|false}."""
+    if getattr(request.user, "role", None) != User.Role.CUSTOMER:
+        return JsonResponse({"ok": False, "error": "Only customers can select items."}, status=403)
+
+    try:
+        selected = bool(json.loads(request.body.decode("utf-8"))["selected"])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"ok": False, "error": "Expected {\"selected\": true|false}"}, status=400)
+
+    item = get_object_or_404(
+        SaleItem.objects.select_related("event__consultant"), pk=item_id, event_id=event_id, is_listed=True,
+    )
+    if selected and item.quantity_available <= 0:
+        return JsonResponse({"ok": False, "error": f"{item.title} is out of stock."}, status=409)
+
+    reservation = _current_draft_reservation(request.user, item.event)
+    if selected:
+        if not cart.add_item(reservation, item):
+            # Hold mode: someone else took the last one first.
+            return JsonResponse({"ok": False, "error": f"{item.title} is out of stock."}, status=409)
+    else:
+        cart.remove_item(reservation, item.id)
+    return JsonResponse({"ok": True, "item_id": item.id, "selected": selected})
+
+
 # ----------------------------
 # Cart
 # ----------------------------
@@ -201,8 +478,14 @@ def cart_review(request):
         .order_by("-created_at")
         .first()
     )
+    lines = list(reservation.lines.all()) if reservation else []
+    total = sum(ln.price_at_time * ln.quantity for ln in lines)
 
-    return render(request, "garage_sale/cart_review.html", {"reservation": reservation})
+    return render(request, "garage_sale/cart_review.html", {
+        "reservation": reservation,
+        "lines": lines,
+        "total": total,
+    })
 
 
 @login_required
@@ -217,7 +500,7 @@ def cart_clear(request):
         .first()
     )
     if reservation:
-        reservation.lines.all().delete()
+        holds.delete_lines(reservation.lines.all())
         reservation.delete()
         messages.info(request, "Shopping list cleared.")
 
@@ -225,7 +508,6 @@ def cart_clear(request):
 
 
 @login_required
-@transaction.atomic
 def cart_confirm(request):
     if getattr(request.user, "role", None) != User.Role.CUSTOMER:
         return render(request, "garage_sale/not_allowed.html", status=403)
@@ -233,7 +515,7 @@ def cart_confirm(request):
     reservation = (
         Reservation.objects
         .filter(customer=request.user, status=Reservation.Status.DRAFT)
-        .select_related("event", "event__consultant")
+        .select_related("event")
         .prefetch_related("lines__item")
         .order_by("-created_at")
         .first()
@@ -243,38 +525,21 @@ def cart_confirm(request):
         messages.error(request, "No draft reservation to confirm.")
         return redirect("garage_sale:cart_review")
 
-    lines = list(reservation.lines.select_related("item").all())
+    lines = list(reservation.lines.all())
     if not lines:
         messages.error(request, "Your shopping list is empty.")
         return redirect("garage_sale:cart_review")
 
-    item_ids = [ln.item_id for ln in lines]
-    items_by_id = {it.id: it for it in SaleItem.objects.select_for_update().filter(id__in=item_ids)}
-
-    # validate stock first
-    shortages = []
-    for ln in lines:
-        it = items_by_id.get(ln.item_id)
-        if (it is None) or (it.quantity_available < ln.quantity):
-            shortages.append((it.title if it else "Unknown", it.quantity_available if it else 0, ln.quantity))
-
-    if shortages:
-        for title, available, wanted in shortages:
+    # Stock is taken with conditional UPDATEs; see garage_sale.checkout.
+    try:
+        checkout.confirm(reservation, lines)
+    except checkout.Shortage as e:
+        for title, available, wanted in e.shortages:
             messages.error(request, f"Not enough stock for {title}. Available: {available}, in your cart: {wanted}.")
         return redirect("garage_sale:cart_review")
-
-    # decrement stock
-    for ln in lines:
-        it = items_by_id[ln.item_id]
-        it.quantity_available -= ln.quantity
-        it.save(update_fields=["quantity_available"])
-
-    if reservation.assigned_consultant_id is None and reservation.event.consultant_id:
-        reservation.assigned_consultant = reservation.event.consultant
-
-    reservation.status = Reservation.Status.CONFIRMED
-    reservation.confirmed_at = timezone.now()
-    reservation.save(update_fields=["assigned_consultant", "status", "confirmed_at"])
+    except checkout.AlreadyConfirmed:
+        messages.info(request, "This reservation was already confirmed.")
+        return redirect("garage_sale:cart_review")
 
     messages.success(request, "Confirmed! Your items are reserved for pickup.")
     return redirect("garage_sale:cart_review")
@@ -352,7 +617,8 @@ def consultant_dashboard(request):
     events = (
         GarageSaleEvent.objects
         .select_related("location", "owner", "consultant")
-        .filter(end_date__gte=today, consultant=request.user)
+        .overlapping(today)
+        .filter(consultant=request.user)
         .order_by("start_date", "location__name", "title")
     )
 
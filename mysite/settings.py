@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 import dj_database_url
@@ -42,8 +43,9 @@ ROOT_URLCONF = "mysite.urls"
 WSGI_APPLICATION = "mysite.wsgi.application"
 
 MIDDLEWARE = [
+    "core.perf.PerformanceMiddleware",  # first, so its timings cover the rest of the stack
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",  # must be right after SecurityMiddleware
+    "core.middleware.WhiteNoiseMiddleware",  # must be right after SecurityMiddleware
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -54,7 +56,8 @@ MIDDLEWARE = [
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, timed for core.perf.
+        "BACKEND": "core.perf.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -92,6 +95,54 @@ else:
         }
     }
 
+# CACHES
+# Holds the map_data payloads (core.mapcache) and compiled consultant schedules
+# (physio.schedule). Local memory is per process: when running several workers, point
+# CACHE_BACKEND/CACHE_LOCATION at a shared cache so version bumps and schedule
+# invalidations reach all of them.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "m2p"),
+    }
+}
+
+# PERFORMANCE INSTRUMENTATION (core.perf)
+# Server-Timing header on every response (on with DEBUG: it exposes query counts and
+# timings to anyone, so don't turn it on in production); a JSON line to the "core.perf"
+# logger for a sample of requests plus every request slower than PERF_SLOW_MS.
+PERF_SERVER_TIMING = os.environ.get("PERF_SERVER_TIMING", str(DEBUG)).lower() == "true"
+PERF_LOG_SAMPLE_RATE = float(os.environ.get("PERF_LOG_SAMPLE_RATE", "0.01"))
+PERF_SLOW_MS = float(os.environ.get("PERF_SLOW_MS", "1000"))
+
+# GARAGE SALE STOCK HOLDS (garage_sale.holds)
+# Minutes an item added to a draft reservation stays held for that customer; 0 turns
+# holds off (stock is only taken at confirm). Expired holds are released by
+# `manage.py release_expired_holds`.
+GARAGE_SALE_HOLD_MINUTES = int(os.environ.get("GARAGE_SALE_HOLD_MINUTES", "0"))
+
+# NOTIFICATIONS (physio.notifications)
+# Messages are queued in NotificationOutbox and sent by `manage.py drain_outbox`.
+NOTIFICATION_SENDER = os.environ.get("NOTIFICATION_SENDER", "physio.notifications.ConsoleSender")
+NOTIFICATION_RATE_PER_SECOND = float(os.environ.get("NOTIFICATION_RATE_PER_SECOND", "1"))
+TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID", "")
+TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN", "")
+TWILIO_FROM_NUMBER = os.environ.get("TWILIO_FROM_NUMBER", "")
+
+TESTING = sys.argv[1:2] == ["test"]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # Quiet under `manage.py test`, where sampled lines would land in the test output.
+        "core.perf": {"handlers": ["console"], "level": "WARNING" if TESTING else "INFO", "propagate": False},
+    },
+}
+
 # STATIC FILES
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
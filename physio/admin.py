@@ -1,6 +1,6 @@
 # physio/admin.py
 from django.contrib import admin
-from .models import Appointment
+from .models import Appointment, NotificationOutbox, ScheduleException, SlotInventory, WorkingHours
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
@@ -9,3 +9,34 @@ class AppointmentAdmin(admin.ModelAdmin):
     search_fields = ("location__name", "consultant__username", "created_by__username")
     ordering = ("-date", "-time", "-id")
 
+
+@admin.register(SlotInventory)
+class SlotInventoryAdmin(admin.ModelAdmin):
+    list_display = ("id", "location", "date", "time", "free_rooms", "free_consultants", "updated_at")
+    list_filter = ("date", "location")
+    ordering = ("-date", "time", "location")
+
+
+
+@admin.register(WorkingHours)
+class WorkingHoursAdmin(admin.ModelAdmin):
+    list_display = ("id", "consultant", "location", "weekday", "start_time", "end_time")
+    list_filter = ("weekday", "location")
+    search_fields = ("consultant__username", "location__name")
+    ordering = ("consultant", "location", "weekday", "start_time")
+
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ("id", "consultant", "location", "date", "start_time", "end_time", "available", "note")
+    list_filter = ("available", "date")
+    search_fields = ("consultant__username", "location__name", "note")
+    ordering = ("-date", "consultant")
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "channel", "recipient", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "channel")
+    search_fields = ("recipient", "body")
+    ordering = ("-id",)
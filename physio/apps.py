@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PhysioConfig(AppConfig):
     name = 'physio'
+
+    def ready(self):
+        from . import signals  # noqa: F401
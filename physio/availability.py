@@ -0,0 +1,83 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+
+from core.models import Location, User
+from .models import Appointment
+from .schedule import FULL_DAY, schedules, slot_bit, working_mask
+from .utils import slot_times
+
+# Keep one request bounded: a month of days, a screenful of locations.
+MAX_MATRIX_DAYS = 31
+MAX_MATRIX_LOCATIONS = 50
+
+
+def availability_matrix(location_ids, start, end):
+    """
+    Free consultants for every location x day x SLOT in [start, end].
+
+    Returns (dates, times, consultants, matrix) where
+      matrix[location_id][date_index][time_index] = [consultant_id, ...]
+    and consultants maps id -> username.
+
+    Always three queries (locations, consultant links, ACCEPTED appointments)
+    plus the schedule cache, however many locations/days are asked for.
+    Per consultant and day, free slots are working hours & ~booked slots.
+    """
+    days = (end - start).days + 1
+    dates = [start + timedelta(days=i) for i in range(days)]
+    times = slot_times()
+
+    rooms = dict(
+        Location.objects
+        .filter(id__in=location_ids, is_physio=True)
+        .values_list("id", "room_count")
+    )
+
+    linked = defaultdict(list)
+    consultants = {}
+    for loc_id, user_id, username in (
+        Location.consultants.through.objects
+        .filter(location_id__in=rooms, user__role=User.Role.CONSULTANT)
+        .order_by("user__username")
+        .values_list("location_id", "user_id", "user__username")
+    ):
+        linked[loc_id].append(user_id)
+        consultants[user_id] = username
+
+    busy = defaultdict(int)       # (consultant_id, date) -> bitmask of booked slots
+    rooms_taken = Counter()       # (location_id, date, time) -> ACCEPTED count
+    accepted = (
+        Appointment.objects
+        .filter(status=Appointment.Status.ACCEPTED, date__range=(start, end))
+        .filter(Q(location_id__in=rooms) | Q(consultant_id__in=consultants))
+        .values_list("location_id", "consultant_id", "date", "time")
+    )
+    for loc_id, cons_id, d, t in accepted:
+        if cons_id:
+            busy[(cons_id, d)] |= slot_bit(t)
+        if loc_id in rooms:
+            rooms_taken[(loc_id, d, t)] += 1
+
+    entries = schedules(consultants)
+    bits = [slot_bit(t) for t in times]
+
+    matrix = {}
+    for loc_id, room_count in rooms.items():
+        per_day = []
+        for d in dates:
+            free = {
+                cid: working_mask(entries.get(cid), loc_id, d) & ~busy[(cid, d)] & FULL_DAY
+                for cid in linked[loc_id]
+            }
+            row = []
+            for t, bit in zip(times, bits):
+                if rooms_taken[(loc_id, d, t)] >= int(room_count or 0):
+                    row.append([])
+                else:
+                    row.append([cid for cid in linked[loc_id] if free[cid] & bit])
+            per_day.append(row)
+        matrix[loc_id] = per_day
+
+    return dates, times, consultants, matrix
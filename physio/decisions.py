@@ -0,0 +1,239 @@
+"""
+Consultant accept/decline decisions on PENDING appointments.
+
+Every path (form views, token links, bulk endpoint) goes through decide(), so
+double-booking checks, room allocation and the slot inventory refresh are done
+once per batch with a fixed number of queries instead of once per appointment.
+
+Decisions run in a critical section: the consultant's user row and the
+SlotInventory row of every (location, date, time) being accepted are locked
+with select_for_update (in a fixed order, so batches cannot deadlock), and the
+whole transaction is retried with bounded backoff if it still loses a race.
+"""
+import random
+import time
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Q
+
+from core.models import Location, User
+from .inventory import refresh_slots
+from .models import Appointment, SlotInventory
+from .rooms import RoomAllocator
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.05  # seconds; doubled per attempt, with jitter
+
+# Outcome codes returned per appointment
+ACCEPTED = "accepted"
+DECLINED = "declined"
+AUTO_DECLINED = "auto_declined"
+NOT_PENDING = "not_pending"
+NOT_FOUND = "not_found"
+
+
+class DecisionConflict(Exception):
+    """Still losing the race for a slot after MAX_ATTEMPTS; the caller should ask the user to retry."""
+
+
+def decide(appointments, accept_ids):
+    """
+    Apply decisions to already-loaded PENDING appointments of ONE consultant.
+    Appointments whose id is in accept_ids are accepted, the rest declined.
+
+    Accepts are processed in (date, time, id) order: the consultant can only
+    hold one ACCEPTED booking per slot, and each needs a free room at its
+    location; otherwise it is auto-declined. Returns {id: (outcome, reason)}.
+
+    Callers must already hold the slot locks (see _decide_locked).
+    """
+    appointments = sorted(appointments, key=lambda a: (a.date, a.time, a.id))
+    if not appointments:
+        return {}
+
+    accept_ids = set(accept_ids)
+    to_accept = [a for a in appointments if a.id in accept_ids]
+    consultant_ids = {a.consultant_id for a in appointments if a.consultant_id}
+    ids = [a.id for a in appointments]
+
+    busy = set()
+    if to_accept and consultant_ids:
+        busy = set(
+            Appointment.objects
+            .filter(
+                consultant_id__in=consultant_ids,
+                status=Appointment.Status.ACCEPTED,
+                date__in={a.date for a in to_accept},
+                time__in={a.time for a in to_accept},
+            )
+            .exclude(id__in=ids)
+            .values_list("consultant_id", "date", "time")
+        )
+
+    allocator = RoomAllocator.load(to_accept, exclude_ids=ids)
+
+    results = {}
+    for appt in appointments:
+        if appt.id not in accept_ids:
+            appt.status = Appointment.Status.DECLINED
+            results[appt.id] = (DECLINED, None)
+            continue
+
+        slot = (appt.consultant_id, appt.date, appt.time)
+        reason = None
+        if appt.consultant_id and slot in busy:
+            reason = "you already have an ACCEPTED booking at that time"
+        elif appt.location_id and not appt.room_number:
+            appt.room_number = allocator.allocate(appt.location_id, appt.date, appt.time)
+            if appt.room_number is None:
+                reason = f"no rooms available at {appt.location.name} for that timeslot"
+
+        if reason:
+            appt.status = Appointment.Status.DECLINED
+            results[appt.id] = (AUTO_DECLINED, reason)
+        else:
+            appt.status = Appointment.Status.ACCEPTED
+            busy.add(slot)
+            results[appt.id] = (ACCEPTED, None)
+
+    Appointment.objects.bulk_update(appointments, ["status", "room_number"])
+    _refresh_inventory(appointments, consultant_ids)
+    return results
+
+
+def _refresh_inventory(appointments, consultant_ids):
+    location_ids = {a.location_id for a in appointments if a.location_id}
+    location_ids.update(
+        Location.consultants.through.objects
+        .filter(user_id__in=consultant_ids)
+        .values_list("location_id", flat=True)
+    )
+    refresh_slots(location_ids, {(a.date, a.time) for a in appointments})
+
+
+def _with_retry(fn):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return fn()
+        except (IntegrityError, OperationalError) as e:
+            # IntegrityError: a uniq_*_when_accepted constraint beat us (e.g. SQLite, which
+            # ignores FOR UPDATE). OperationalError: deadlock / lock timeout / "database is locked".
+            if attempt == MAX_ATTEMPTS:
+                raise DecisionConflict(str(e)) from e
+            time.sleep(BACKOFF_BASE * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+def _lock_slots(keys):
+    """
+    Lock the SlotInventory rows for these (location_id, date, time) keys, creating
+    missing ones first, and return the keys. Rows created here are placeholders
+    (nothing free) that the caller must refresh before commit.
+    """
+    keys = sorted({k for k in keys if k[0]})
+    if not keys:
+        return keys
+    SlotInventory.objects.bulk_create(
+        [SlotInventory(location_id=loc_id, date=d, time=t) for loc_id, d, t in keys],
+        ignore_conflicts=True,
+    )
+    list(
+        SlotInventory.objects
+        .select_for_update()
+        .filter(reduce(or_, (Q(location_id=loc_id, date=d, time=t) for loc_id, d, t in keys)))
+        .order_by("location_id", "date", "time")
+        .values_list("id", flat=True)
+    )
+    return keys
+
+
+def _decide_locked(consultant_id, ids, accept_ids):
+    """
+    One attempt: lock, reload, decide. Returns ({id: appointment}, {id: (outcome, reason)}).
+    """
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(id=consultant_id).values_list("id", flat=True))
+
+        locked = _lock_slots(
+            Appointment.objects
+            .filter(id__in=ids, consultant_id=consultant_id, status=Appointment.Status.PENDING)
+            .filter(id__in=accept_ids)
+            .values_list("location_id", "date", "time")
+        )
+
+        found = {
+            a.id: a
+            for a in (
+                Appointment.objects
+                .select_for_update(of=("self",))
+                .select_related("location")
+                .filter(id__in=ids, consultant_id=consultant_id)
+            )
+        }
+        pending = [a for a in found.values() if a.status == Appointment.Status.PENDING]
+        results = decide(pending, accept_ids)
+
+        # decide() refreshed the slots of what it decided; any other locked slot
+        # (decided concurrently since the lock query) still holds a placeholder.
+        decided = {(a.location_id, a.date, a.time) for a in pending}
+        stale = [k for k in locked if k not in decided]
+        if stale:
+            refresh_slots({loc_id for loc_id, _, _ in stale}, {(d, t) for _, d, t in stale})
+        return found, results
+
+
+def _decide_ids(consultant_id, ids, accept_ids):
+    return _with_retry(lambda: _decide_locked(consultant_id, list(ids), set(accept_ids)))
+
+
+def _apply_single(appt: Appointment, accept: bool):
+    found, results = _decide_ids(appt.consultant_id, [appt.id], [appt.id] if accept else [])
+    fresh = found.get(appt.id)
+    if fresh is None:
+        return NOT_FOUND, None
+    appt.status = fresh.status
+    appt.room_number = fresh.room_number
+    return results.get(appt.id, (NOT_PENDING, f"already {fresh.status}"))
+
+
+def accept_appointment(appt: Appointment):
+    """
+    Accept one PENDING appointment, auto-declining it if the consultant or rooms
+    are taken. Returns (outcome, reason) and updates appt in place.
+    Raises DecisionConflict if the slot stays contended after retries.
+    """
+    return _apply_single(appt, accept=True)
+
+
+def decline_appointment(appt: Appointment):
+    return _apply_single(appt, accept=False)
+
+
+def decide_bulk(consultant, accept_ids=(), decline_ids=()):
+    """
+    Accept/decline many of a consultant's appointments in one transaction.
+    Returns [{"id", "outcome", "status", "room_number", "reason"}, ...] in request order.
+    Raises DecisionConflict if the batch keeps losing races after retries.
+    """
+    accept_ids = [int(i) for i in accept_ids]
+    decline_ids = [int(i) for i in decline_ids]
+    wanted = list(dict.fromkeys(accept_ids + decline_ids))
+
+    found, results = _decide_ids(consultant.id, wanted, accept_ids)
+
+    out = []
+    for appt_id in wanted:
+        appt = found.get(appt_id)
+        if appt is None:
+            outcome, reason = NOT_FOUND, None
+        else:
+            outcome, reason = results.get(appt_id, (NOT_PENDING, f"already {appt.status}"))
+        out.append({
+            "id": appt_id,
+            "outcome": outcome,
+            "status": appt.status if appt else None,
+            "room_number": appt.room_number if appt else None,
+            "reason": reason,
+        })
+    return out
@@ -0,0 +1,157 @@
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Location, User
+from .models import Appointment, SlotInventory
+from .schedule import is_working, schedules
+from .utils import slot_times
+
+
+def compute_slots(location_ids, slots):
+    """
+    Free rooms / free consultants for every (location, date, time) in
+    location_ids x slots, as unsaved SlotInventory rows.
+
+    Set-based: a fixed handful of queries no matter how many slots are computed.
+    """
+    location_ids = {int(i) for i in location_ids if i}
+    slots = set(slots)
+    if not location_ids or not slots:
+        return []
+
+    rooms = dict(Location.objects.filter(id__in=location_ids).values_list("id", "room_count"))
+    if not rooms:
+        return []
+
+    linked = defaultdict(set)
+    for loc_id, user_id in (
+        Location.consultants.through.objects
+        .filter(location_id__in=rooms, user__role=User.Role.CONSULTANT)
+        .values_list("location_id", "user_id")
+    ):
+        linked[loc_id].add(user_id)
+    consultant_ids = set().union(*linked.values())
+
+    # A consultant ACCEPTED anywhere at (date, time) is busy for every location they work at.
+    rooms_taken = Counter()
+    busy = defaultdict(set)
+    accepted = (
+        Appointment.objects
+        .filter(
+            status=Appointment.Status.ACCEPTED,
+            date__in={d for d, _ in slots},
+            time__in={t for _, t in slots},
+        )
+        .filter(Q(location_id__in=rooms) | Q(consultant_id__in=consultant_ids))
+        .values_list("location_id", "consultant_id", "date", "time")
+    )
+    for loc_id, cons_id, d, t in accepted:
+        if (d, t) not in slots:
+            continue
+        if loc_id in rooms:
+            rooms_taken[(loc_id, d, t)] += 1
+        if cons_id:
+            busy[(d, t)].add(cons_id)
+
+    entries = schedules(consultant_ids)
+    return [
+        SlotInventory(
+            location_id=loc_id,
+            date=d,
+            time=t,
+            free_rooms=max(int(room_count or 0) - rooms_taken[(loc_id, d, t)], 0),
+            free_consultants=sum(
+                1 for cid in linked[loc_id] - busy[(d, t)]
+                if is_working(entries.get(cid), loc_id, d, t)
+            ),
+        )
+        for loc_id, room_count in rooms.items()
+        for d, t in slots
+    ]
+
+
+def refresh_slots(location_ids, slots):
+    """
+    Recompute the rows for location_ids x slots (compute_slots) and upsert them
+    into SlotInventory. Returns the rows.
+    """
+    rows = compute_slots(location_ids, slots)
+    if not rows:
+        return rows
+    SlotInventory.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["location", "date", "time"],
+        update_fields=["free_rooms", "free_consultants", "updated_at"],
+    )
+    return rows
+
+
+def refresh_for_appointment(appt: Appointment):
+    """
+    Refresh the slot an appointment sits in, for its own location and for every
+    other location its consultant works at (their free-consultant count changes too).
+    """
+    location_ids = {appt.location_id}
+    if appt.consultant_id:
+        location_ids.update(
+            Location.consultants.through.objects
+            .filter(user_id=appt.consultant_id)
+            .values_list("location_id", flat=True)
+        )
+    refresh_slots(location_ids, {(appt.date, appt.time)})
+
+
+def refresh_location(location_id):
+    """
+    Re-derive every upcoming row of one location, e.g. after its rooms or
+    consultant list changed. Past rows are left alone.
+    """
+    today = timezone.localdate()
+    slots = set(
+        SlotInventory.objects
+        .filter(location_id=location_id, date__gte=today)
+        .values_list("date", "time")
+    )
+    refresh_slots({location_id}, slots)
+
+
+def _missing(date, rows):
+    return {(date, t) for t in slot_times() if t not in rows}
+
+
+def _bookable(rows):
+    return [
+        (t, rows[t].free_rooms, rows[t].free_consultants)
+        for t in slot_times()
+        if rows[t].is_bookable
+    ]
+
+
+def free_slots(location: Location, date):
+    """
+    Bookable times for one location/day: [(time, free_rooms, free_consultants), ...].
+
+    One indexed lookup on (location, date). Slots without a row yet (nothing
+    was ever booked or changed there) are computed in memory and not saved:
+    this is a public read, and it must not write rows for any date asked for.
+    """
+    rows = {r.time: r for r in SlotInventory.objects.filter(location=location, date=date)}
+    missing = _missing(date, rows)
+    if missing:
+        rows.update((r.time, r) for r in compute_slots({location.id}, missing))
+    return _bookable(rows)
+
+
+async def afree_slots(location: Location, date):
+    rows = {
+        r.time: r
+        async for r in SlotInventory.objects.filter(location=location, date=date)
+    }
+    missing = _missing(date, rows)
+    if missing:
+        rows.update((r.time, r) for r in await sync_to_async(compute_slots)({location.id}, missing))
+    return _bookable(rows)
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time as time_mod
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Location, User
+from physio.utils import SLOTS
+
+SERVERS = {
+    # label -> command line; {workers} and {port} are filled in.
+    "gunicorn sync (WSGI)": "-m gunicorn mysite.wsgi:application --worker-class sync --workers {workers} --bind 127.0.0.1:{port}",
+    "uvicorn (ASGI)": "-m uvicorn mysite.asgi:application --workers {workers} --host 127.0.0.1 --port {port} --no-access-log",
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the map and booking popup endpoints (map_data, api_timeslots, "
+        "api_available_consultants) under gunicorn sync workers and under an ASGI server "
+        "with the same concurrency, and report requests/s and latency percentiles. "
+        "Needs gunicorn, uvicorn and aiohttp; run seed_bench_data first for realistic data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Worker processes per server.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight.")
+        parser.add_argument("--requests", type=int, default=3000, help="Requests per server.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--server", action="append", choices=list(SERVERS),
+            help="Only run these servers (repeatable). Default: all.",
+        )
+
+    def handle(self, *args, **opts):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise CommandError("bench_asgi needs aiohttp (pip install aiohttp).")
+
+        rng = random.Random(opts["seed"])
+        urls = self._urls(rng, opts["requests"])
+        cookie = self._session_cookie()
+
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "mysite.settings"),
+            # Measure the views, not per-query debug logging or the perf log.
+            "DEBUG": os.environ.get("DEBUG", "False"),
+            "PERF_LOG_SAMPLE_RATE": "0",
+        }
+
+        self.stdout.write(
+            f"{len(urls)} requests, concurrency {opts['concurrency']}, {opts['workers']} worker(s) per server"
+        )
+        for label in opts["server"] or SERVERS:
+            port = _free_port()
+            cmd = [sys.executable] + SERVERS[label].format(workers=opts["workers"], port=port).split()
+            proc = subprocess.Popen(cmd, env=env, cwd=settings.BASE_DIR,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            try:
+                self._wait_for(port, proc, label)
+                base = f"http://127.0.0.1:{port}"
+                # Warm up: imports, connections, first cache fills.
+                asyncio.run(self._load(base, urls[:200], cookie, opts["concurrency"]))
+                result = asyncio.run(self._load(base, urls, cookie, opts["concurrency"]))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+            self._report(label, *result)
+
+    # --- setup ---
+
+    def _urls(self, rng, n):
+        locations = list(
+            Location.objects.filter(is_physio=True, geo_lat__isnull=False, consultants__isnull=False)
+            .distinct().values_list("id", "geo_lat", "geo_lng")[:2000]
+        )
+        if not locations:
+            raise CommandError("No physio locations with consultants; run seed_bench_data first.")
+
+        today = timezone.localdate()
+        urls = []
+        for i in range(n):
+            loc_id, lat, lng = rng.choice(locations)
+            day = (today + timedelta(days=rng.randrange(14))).isoformat()
+            # The mix one booking popup produces: the map, then times, then consultants.
+            kind = i % 3
+            if kind == 0:
+                d = rng.uniform(0.02, 0.2)
+                urls.append(f"/physio/map-data/?bbox={lng - d:.4f},{lat - d:.4f},{lng + d:.4f},{lat + d:.4f}&zoom=14")
+            elif kind == 1:
+                urls.append(f"/physio/api/timeslots/?location_id={loc_id}&date={day}")
+            else:
+                urls.append(
+                    f"/physio/api/available-consultants/?location_id={loc_id}&date={day}&time={rng.choice(SLOTS)}"
+                )
+        return urls
+
+    def _session_cookie(self):
+        """A logged-in customer session, written straight to the session store."""
+        customer = User.objects.filter(role=User.Role.CUSTOMER).order_by("id").first()
+        if customer is None:
+            raise CommandError("No customer user; run seed_bench_data first.")
+        session = import_string(f"{settings.SESSION_ENGINE}.SessionStore")()
+        session[SESSION_KEY] = str(customer.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = customer.get_session_auth_hash()
+        session.create()
+        return {settings.SESSION_COOKIE_NAME: session.session_key}
+
+    def _wait_for(self, port, proc, label, timeout=30):
+        deadline = time_mod.monotonic() + timeout
+        while time_mod.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise CommandError(f"{label} exited: {proc.stderr.read().decode()[-2000:]}")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                    return
+            except OSError:
+                time_mod.sleep(0.1)
+        raise CommandError(f"{label} did not start within {timeout}s")
+
+    # --- load ---
+
+    async def _load(self, base, urls, cookies, concurrency):
+        import aiohttp
+
+        latencies, errors = [], 0
+        queue = iter(urls)
+
+        async def worker(session):
+            nonlocal errors
+            for url in queue:
+                t0 = time_mod.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        if response.status >= 400:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time_mod.perf_counter() - t0)
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(base, connector=connector, cookies=cookies) as session:
+            started = time_mod.perf_counter()
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+            elapsed = time_mod.perf_counter() - started
+        return latencies, errors, elapsed
+
+    def _report(self, label, latencies, errors, elapsed):
+        latencies.sort()
+        ms = lambda p: _percentile(latencies, p) * 1000  # noqa: E731
+        self.stdout.write(
+            f"  {label:22} {len(latencies) / elapsed:8.0f} req/s   "
+            f"p50 {ms(0.50):7.1f} ms   p99 {ms(0.99):7.1f} ms   errors {errors}"
+        )
@@ -0,0 +1,113 @@
+import random
+import time as time_mod
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Location, User
+from physio.models import Appointment
+from physio.rooms import RoomAllocator
+from physio.utils import slot_times
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark room allocation: in-memory bitmask allocator vs the old per-slot set scan, "
+        "and (with --db) a batch accept against the database inside a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accepts", type=int, default=5000, help="Accepts per day.")
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--locations", type=int, default=50)
+        parser.add_argument("--rooms", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--db", action="store_true", help="Also run the batch path against the DB.")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        times = slot_times()
+        start = timezone.localdate() + timedelta(days=1)
+        days = [start + timedelta(days=i) for i in range(opts["days"])]
+        loc_ids = list(range(1, opts["locations"] + 1))
+
+        requests = [
+            (rng.choice(loc_ids), day, rng.choice(times))
+            for day in days
+            for _ in range(opts["accepts"])
+        ]
+        total = len(requests)
+
+        # Old approach: a set of taken rooms per slot, scanned 1..room_count each time.
+        taken = {}
+        t0 = time_mod.perf_counter()
+        placed_scan = 0
+        for key in requests:
+            rooms = taken.setdefault(key, set())
+            for r in range(1, opts["rooms"] + 1):
+                if r not in rooms:
+                    rooms.add(r)
+                    placed_scan += 1
+                    break
+        scan_s = time_mod.perf_counter() - t0
+
+        allocator = RoomAllocator({loc_id: opts["rooms"] for loc_id in loc_ids})
+        t0 = time_mod.perf_counter()
+        placed_mask = sum(1 for key in requests if allocator.allocate(*key) is not None)
+        mask_s = time_mod.perf_counter() - t0
+
+        self.stdout.write(f"{total} accepts over {len(days)} day(s), {len(loc_ids)} locations x {opts['rooms']} rooms")
+        self.stdout.write(f"  set scan : {placed_scan} placed in {scan_s * 1000:.1f} ms ({total / scan_s:,.0f}/s)")
+        self.stdout.write(f"  bitmask  : {placed_mask} placed in {mask_s * 1000:.1f} ms ({total / mask_s:,.0f}/s)")
+
+        if opts["db"]:
+            self._bench_db(rng, days, times, opts)
+
+    def _bench_db(self, rng, days, times, opts):
+        per_day = opts["accepts"]
+        try:
+            with transaction.atomic():
+                owner = User.objects.create_user(username="bench-owner", role=User.Role.LOCATION_OWNER)
+                locations = Location.objects.bulk_create([
+                    Location(name=f"bench-{i}", owner=owner, room_count=opts["rooms"])
+                    for i in range(opts["locations"])
+                ])
+
+                for day in days:
+                    pending = Appointment.objects.bulk_create([
+                        Appointment(
+                            location=rng.choice(locations),
+                            consultant=None,  # keep uniq_consultant_timeslot out of the measurement
+                            date=day,
+                            time=rng.choice(times),
+                        )
+                        for _ in range(per_day)
+                    ])
+
+                    t0 = time_mod.perf_counter()
+                    appts = list(
+                        Appointment.objects.select_related("location")
+                        .filter(id__in=[a.id for a in pending])
+                        .order_by("id")
+                    )
+                    allocator = RoomAllocator.load(appts)
+                    unplaced = {a.id for a in allocator.allocate_batch(appts)}
+                    placed = [a for a in appts if a.id not in unplaced]
+                    for a in placed:
+                        a.status = Appointment.Status.ACCEPTED
+                    Appointment.objects.bulk_update(placed, ["status", "room_number"], batch_size=500)
+                    elapsed = time_mod.perf_counter() - t0
+
+                    self.stdout.write(
+                        f"  db batch {day}: {len(placed)}/{per_day} placed in {elapsed * 1000:.1f} ms "
+                        f"({per_day / elapsed:,.0f} accepts/s)"
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
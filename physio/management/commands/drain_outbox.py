@@ -0,0 +1,32 @@
+import time as time_mod
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from physio.notifications import drain, get_sender
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued notifications (NotificationOutbox) through NOTIFICATION_SENDER in batches, "
+        "rate limited, retrying failures with backoff. Runs once, or keeps polling with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--rate", type=float, default=getattr(settings, "NOTIFICATION_RATE_PER_SECOND", 1.0),
+            help="Messages per second; 0 for no limit.",
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new messages.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **opts):
+        sender = get_sender()
+        while True:
+            n_sent, n_failed = drain(batch_size=opts["batch_size"], rate=opts["rate"], sender=sender)
+            if n_sent or n_failed or not opts["loop"]:
+                self.stdout.write(f"{n_sent} sent, {n_failed} failed.")
+            if not opts["loop"]:
+                return
+            time_mod.sleep(opts["interval"])
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Location
+from physio.inventory import refresh_slots
+from physio.models import Appointment
+
+
+class Command(BaseCommand):
+    help = "Re-derive SlotInventory rows for every upcoming slot that has ACCEPTED appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Include past dates too.")
+
+    def handle(self, *args, **options):
+        qs = Appointment.objects.filter(status=Appointment.Status.ACCEPTED, location__isnull=False)
+        if not options["all"]:
+            qs = qs.filter(date__gte=timezone.localdate())
+
+        locations_of = {}
+        for loc_id, user_id in Location.consultants.through.objects.values_list("location_id", "user_id"):
+            locations_of.setdefault(user_id, set()).add(loc_id)
+
+        by_slot = {}
+        for loc_id, cons_id, d, t in qs.values_list("location_id", "consultant_id", "date", "time"):
+            ids = by_slot.setdefault((d, t), set())
+            ids.add(loc_id)
+            ids.update(locations_of.get(cons_id, ()))
+
+        for slot, location_ids in by_slot.items():
+            refresh_slots(location_ids, {slot})
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(by_slot)} slot(s)."))
@@ -0,0 +1,25 @@
+"""
+The "physio" map layer: one pin per physio Location with coordinates.
+Kept in core.clusters by physio.signals; rebuild_map_layer() recomputes it.
+"""
+from django.apps import apps as django_apps
+
+from core import clusters
+
+MAP_LAYER = "physio"
+
+
+def location_points(geo_lat, geo_lng, is_physio):
+    if not is_physio or geo_lat is None or geo_lng is None:
+        return []
+    return [(geo_lat, geo_lng, None)]
+
+
+def rebuild_map_layer(apps=None):
+    Location = (apps or django_apps).get_model("core", "Location")
+    rows = (
+        Location.objects
+        .filter(is_physio=True, geo_lat__isnull=False, geo_lng__isnull=False)
+        .values_list("geo_lat", "geo_lng")
+    )
+    return clusters.rebuild(MAP_LAYER, ((lat, lng, None) for lat, lng in rows.iterator()), apps=apps)
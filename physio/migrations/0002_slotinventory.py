@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('physio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('free_rooms', models.PositiveSmallIntegerField(default=0)),
+                ('free_consultants', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_inventory', to='core.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'date', 'time'), name='uniq_slot_inventory_location_date_time')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:55
+
+from django.db import migrations
+
+
+def build_layer(apps, schema_editor):
+    from physio.maps import rebuild_map_layer
+    rebuild_map_layer(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_mapcluster'),
+        ('physio', '0002_slotinventory'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_layer, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_mapcluster'),
+        ('physio', '0003_build_map_clusters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['consultant', 'date', 'time', 'id'], name='appt_consultant_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['location', 'date', 'time', 'id'], name='appt_location_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_mapcluster'),
+        ('physio', '0005_appointment_action_token_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('available', models.BooleanField(default=False)),
+                ('note', models.CharField(blank=True, default='', max_length=120)),
+                ('consultant', models.ForeignKey(limit_choices_to={'role': 'CONSULTANT'}, on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='core.location')),
+            ],
+            options={
+                'ordering': ['consultant', 'date', 'start_time'],
+                'indexes': [models.Index(fields=['consultant', 'date'], name='schedule_exception_lookup_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('end_time__isnull', True), ('start_time__isnull', True)), ('start_time__lt', models.F('end_time')), _connector='OR'), name='schedule_exception_range')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('consultant', models.ForeignKey(limit_choices_to={'role': 'CONSULTANT'}, on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to=settings.AUTH_USER_MODEL)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='core.location')),
+            ],
+            options={
+                'ordering': ['consultant', 'location', 'weekday', 'start_time'],
+                'indexes': [models.Index(fields=['consultant', 'location', 'weekday'], name='working_hours_lookup_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('start_time__lt', models.F('end_time'))), name='working_hours_start_before_end')],
+            },
+        ),
+    ]
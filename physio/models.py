@@ -3,7 +3,7 @@ from datetime import timedelta
 
 from django.conf import settings
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
 from django.utils import timezone
 
 from core.models import Location  # Location lives in core
@@ -62,7 +62,7 @@ class Appointment(models.Model):
     )
 
     # Consultant action links
-    action_token = models.UUIDField(default=uuid.uuid4, editable=False)
+    action_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     action_token_expires_at = models.DateTimeField(blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -80,30 +80,193 @@ class Appointment(models.Model):
                 name="uniq_room_timeslot_when_accepted",
             ),
         ]
+        indexes = [
+            # Keyset pagination of the dashboards (core.pagination, on date, time, id).
+            models.Index(fields=["consultant", "date", "time", "id"], name="appt_consultant_keyset_idx"),
+            models.Index(fields=["location", "date", "time", "id"], name="appt_location_keyset_idx"),
+        ]
 
     def refresh_action_token(self, hours=48):
         self.action_token = uuid.uuid4()
         self.action_token_expires_at = timezone.now() + timedelta(hours=hours)
 
 
-def pick_available_room(*, location, date, time):
+class SlotInventory(models.Model):
     """
-    Return lowest free room number (1..room_count) for ACCEPTED appts at this slot.
+    Free capacity for one (location, date, time) slot.
+    Rows are derived from ACCEPTED appointments and working hours and rewritten
+    by physio.inventory when bookings, rooms or schedules change. Slots without
+    a row are computed on read and not saved.
     """
-    if not location or not location.room_count:
-        return None
-
-    taken = set(
-        Appointment.objects.filter(
-            location=location,
-            date=date,
-            time=time,
-            status="ACCEPTED",
-            room_number__isnull=False,
-        ).values_list("room_number", flat=True)
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name="slot_inventory",
     )
 
-    for rn in range(1, int(location.room_count) + 1):
-        if rn not in taken:
-            return rn
-    return None
+    date = models.DateField()
+    time = models.TimeField()
+
+    free_rooms = models.PositiveSmallIntegerField(default=0)
+    free_consultants = models.PositiveSmallIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also the index api_timeslots reads through: (location, date) prefix.
+            models.UniqueConstraint(
+                fields=["location", "date", "time"],
+                name="uniq_slot_inventory_location_date_time",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.location_id} {self.date} {self.time}: {self.free_rooms} rooms, {self.free_consultants} consultants"
+
+    @property
+    def is_bookable(self) -> bool:
+        return self.free_rooms > 0 and self.free_consultants > 0
+
+
+class WorkingHours(models.Model):
+    """
+    A consultant's recurring hours at one location on one weekday; a day can
+    have several ranges. Consultants without any rows for a location are
+    bookable there at every slot. See physio.schedule.
+    """
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, "Monday"
+        TUESDAY = 1, "Tuesday"
+        WEDNESDAY = 2, "Wednesday"
+        THURSDAY = 3, "Thursday"
+        FRIDAY = 4, "Friday"
+        SATURDAY = 5, "Saturday"
+        SUNDAY = 6, "Sunday"
+
+    consultant = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="working_hours",
+        limit_choices_to={"role": "CONSULTANT"},
+    )
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="working_hours")
+    weekday = models.PositiveSmallIntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ["consultant", "location", "weekday", "start_time"]
+        constraints = [
+            models.CheckConstraint(condition=Q(start_time__lt=F("end_time")), name="working_hours_start_before_end"),
+        ]
+        indexes = [
+            models.Index(fields=["consultant", "location", "weekday"], name="working_hours_lookup_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.consultant_id} @ {self.location_id} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
+class ScheduleException(models.Model):
+    """
+    A one-off change to a consultant's hours on a date: time off
+    (available=False) or extra hours (available=True). No location means every
+    location; no times means the whole day.
+    """
+    consultant = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="schedule_exceptions",
+        limit_choices_to={"role": "CONSULTANT"},
+    )
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="schedule_exceptions",
+    )
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    available = models.BooleanField(default=False)
+    note = models.CharField(max_length=120, blank=True, default="")
+
+    class Meta:
+        ordering = ["consultant", "date", "start_time"]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    Q(start_time__isnull=True, end_time__isnull=True)
+                    | Q(start_time__lt=F("end_time"))
+                ),
+                name="schedule_exception_range",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["consultant", "date"], name="schedule_exception_lookup_idx"),
+        ]
+
+    def __str__(self):
+        kind = "extra" if self.available else "off"
+        return f"{self.consultant_id} {kind} {self.date} {self.start_time or ''}-{self.end_time or ''}"
+
+
+
+class NotificationOutbox(models.Model):
+    """
+    A message waiting to be delivered. Rows are written in the same transaction
+    as whatever they announce and sent later by the drain_outbox command
+    (physio.notifications), so provider latency and outages never reach the
+    request that created them.
+    """
+    class Channel(models.TextChoices):
+        SMS = "SMS", "SMS"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        SENT = "SENT", "Sent"
+        FAILED = "FAILED", "Failed"
+
+    appointment = models.ForeignKey(
+        Appointment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="notifications",
+    )
+    channel = models.CharField(max_length=10, choices=Channel.choices, default=Channel.SMS)
+    recipient = models.CharField(max_length=64)
+    body = models.TextField()
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time for PENDING rows; pushed forward while a worker holds the row and on retry.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The drain query: PENDING rows that are due, oldest first.
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                condition=Q(status="PENDING"),
+                name="outbox_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+
+def pick_available_room(*, location, date, time):
+    """
+    Return lowest free room number (1..room_count) for ACCEPTED appts at this slot.
+    Kept for old callers; see physio.rooms.
+    """
+    from .rooms import pick_room
+    return pick_room(location=location, date=date, time=time)
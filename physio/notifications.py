@@ -0,0 +1,187 @@
+"""
+Outgoing notifications through a transactional outbox.
+
+enqueue_* functions add NotificationOutbox rows inside the caller's
+transaction, so a message exists exactly when the thing it announces was
+committed. drain() (the drain_outbox command) claims due rows in batches,
+hands them to the configured sender at a limited rate and records the
+outcome; failures are retried with exponential backoff, then marked FAILED.
+
+NOTIFICATION_SENDER picks the sender by dotted path:
+
+    physio.notifications.ConsoleSender  prints messages (development default)
+    physio.notifications.LocMemSender   keeps them in physio.notifications.sent (tests)
+    physio.notifications.TwilioSender   SMS via Twilio; needs TWILIO_ACCOUNT_SID,
+                                        TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER
+"""
+import sys
+import time as time_mod
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import tokens
+from .models import NotificationOutbox
+
+MAX_ATTEMPTS = 5
+RETRY_BASE = timedelta(minutes=1)
+RETRY_CAP = timedelta(hours=1)
+# How long a claimed row stays invisible to other workers while it is being sent:
+# LEASE_HEADROOM times what the batch takes at the send rate, and at least LEASE.
+LEASE = timedelta(minutes=5)
+LEASE_HEADROOM = 2
+
+# LocMemSender appends here, like django.core.mail.outbox.
+sent = []
+
+
+# --- senders ---
+
+class ConsoleSender:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, message):
+        self.stream.write(f"[{message.channel} to {message.recipient}] {message.body}\n")
+
+
+class LocMemSender:
+    def send(self, message):
+        sent.append(message)
+
+
+class TwilioSender:
+    def __init__(self):
+        try:
+            from twilio.rest import Client
+        except ImportError:
+            raise ImproperlyConfigured("TwilioSender needs the twilio package.")
+        names = ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_FROM_NUMBER")
+        missing = [n for n in names if not getattr(settings, n, "")]
+        if missing:
+            raise ImproperlyConfigured(f"TwilioSender needs {', '.join(missing)}.")
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        self.from_number = settings.TWILIO_FROM_NUMBER
+
+    def send(self, message):
+        self.client.messages.create(to=message.recipient, from_=self.from_number, body=message.body)
+
+
+def get_sender():
+    path = getattr(settings, "NOTIFICATION_SENDER", "physio.notifications.ConsoleSender")
+    return import_string(path)()
+
+
+# --- enqueueing ---
+
+def enqueue_action_links(request, appt):
+    """
+    Queue the accept/decline links for a new booking request to its consultant.
+    Call inside the transaction that created appt. Returns the row, or None when
+    the consultant has no phone number.
+    """
+    consultant = appt.consultant
+    if consultant is None or not consultant.phone:
+        return None
+
+    def link(action):
+        return request.build_absolute_uri(reverse("physio:consultant_action_link", args=[tokens.make(appt, action)]))
+
+    body = (
+        f"New booking request: {appt.location_label}, {appt.date:%a %d %b} at {appt.time:%H:%M} "
+        f"for {appt.customer_label}.\n"
+        f"Accept: {link(tokens.ACCEPT)}\n"
+        f"Decline: {link(tokens.DECLINE)}"
+    )
+    return NotificationOutbox.objects.create(appointment=appt, recipient=consultant.phone, body=body)
+
+
+# --- draining ---
+
+def _retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_CAP)
+
+
+def _lease(batch_size, rate):
+    if not rate:
+        return LEASE
+    return max(LEASE, timedelta(seconds=LEASE_HEADROOM * batch_size / rate))
+
+
+def claim(batch_size, lease=LEASE):
+    """
+    Lease up to batch_size due rows for `lease`. On PostgreSQL concurrent workers
+    skip each other's rows (SKIP LOCKED); SQLite has no row locks, so run one
+    worker there.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if rows:
+            NotificationOutbox.objects.filter(id__in=[m.id for m in rows]).update(next_attempt_at=now + lease)
+    return rows
+
+
+def drain(batch_size=100, rate=None, sender=None, limit=None):
+    """
+    Send due messages until none are left (or limit have been tried), at most
+    rate per second. Returns (sent, failed) counts; failed includes rows that
+    will be retried later.
+    """
+    sender = sender or get_sender()
+    interval = 1 / rate if rate else 0
+    next_send = time_mod.monotonic()
+    n_sent = n_failed = 0
+
+    while limit is None or n_sent + n_failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - n_sent - n_failed)
+        # A slow rate must not let the lease run out before the batch's last row is sent.
+        batch = claim(size, _lease(size, rate))
+        if not batch:
+            break
+
+        delivered = []
+        for message in batch:
+            if interval:
+                delay = next_send - time_mod.monotonic()
+                if delay > 0:
+                    time_mod.sleep(delay)
+                next_send = max(next_send, time_mod.monotonic()) + interval
+            try:
+                sender.send(message)
+            except Exception as e:
+                n_failed += 1
+                _failed(message, e)
+            else:
+                delivered.append(message.id)
+
+        if delivered:
+            n_sent += len(delivered)
+            NotificationOutbox.objects.filter(id__in=delivered).update(
+                status=NotificationOutbox.Status.SENT,
+                sent_at=timezone.now(),
+                attempts=F("attempts") + 1,
+                last_error="",
+            )
+    return n_sent, n_failed
+
+
+def _failed(message, error):
+    attempts = message.attempts + 1
+    fields = {"attempts": attempts, "last_error": f"{type(error).__name__}: {error}"[:1000]}
+    if attempts >= MAX_ATTEMPTS:
+        fields["status"] = NotificationOutbox.Status.FAILED
+    else:
+        fields["next_attempt_at"] = timezone.now() + _retry_delay(attempts)
+    NotificationOutbox.objects.filter(id=message.id).update(**fields)
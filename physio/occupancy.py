@@ -0,0 +1,164 @@
+"""
+Data for the location owner overview page.
+
+One windowed query fetches value tuples for [today - PAST_DAYS, today + days),
+and one conditional aggregate gives the all-time past/today/future counts.
+Occupancy is a flat array indexed by (date, location room, time) instead of
+nested dicts of model instances, so memory is bounded by the window size,
+not by how many appointments the owner has.
+"""
+from array import array
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Count, Q
+
+from .models import Appointment
+from .utils import slot_times
+
+OVERVIEW_DAYS = 14
+MAX_OVERVIEW_DAYS = 60
+PAST_DAYS = 7
+
+# Cell values in OccupancyGrid.cells
+FREE, PENDING, ACCEPTED = 0, 1, 2
+
+OverviewRow = namedtuple(
+    "OverviewRow",
+    "id date time location_name room_number status customer_label consultant",
+)
+
+_CELL_STATE = {
+    Appointment.Status.PENDING: PENDING,
+    Appointment.Status.ACCEPTED: ACCEPTED,
+}
+
+
+class OccupancyGrid:
+    """
+    Room occupancy for dates x (location, room) x times, one byte per cell.
+
+    Rooms of every location are laid end to end along one axis (location
+    offsets in `room_start`), so a cell is cells[(d * total_rooms + r) * T + t].
+    Appointments without a room yet are counted per (date, location, time)
+    in `unassigned`.
+    """
+
+    def __init__(self, dates, locations, times):
+        self.dates = list(dates)
+        self.locations = list(locations)   # [(id, name, room_count), ...]
+        self.times = list(times)
+
+        self.room_start = {}
+        total = 0
+        for loc_id, _, room_count in self.locations:
+            self.room_start[loc_id] = total
+            total += int(room_count or 0)
+        self.total_rooms = total
+
+        self._date_idx = {d: i for i, d in enumerate(self.dates)}
+        self._time_idx = {t: i for i, t in enumerate(self.times)}
+        self._loc_idx = {loc[0]: i for i, loc in enumerate(self.locations)}
+
+        T = len(self.times)
+        self.cells = bytearray(len(self.dates) * total * T)
+        self.unassigned = array("H", bytes(2 * len(self.dates) * len(self.locations) * T))
+
+    def add(self, date, location_id, time, room_number, status):
+        state = _CELL_STATE.get(status)
+        d = self._date_idx.get(date)
+        t = self._time_idx.get(time)
+        if state is None or d is None or t is None or location_id not in self.room_start:
+            return
+
+        T = len(self.times)
+        room_count = int(self.locations[self._loc_idx[location_id]][2] or 0)
+        if room_number and 1 <= room_number <= room_count:
+            r = self.room_start[location_id] + room_number - 1
+            i = (d * self.total_rooms + r) * T + t
+            self.cells[i] = max(self.cells[i], state)
+        else:
+            self.unassigned[(d * len(self.locations) + self._loc_idx[location_id]) * T + t] += 1
+
+    def days(self):
+        """
+        Template-friendly view, built lazily one date at a time:
+        (date, [(location_name, room_label, [cell, ...]), ...]).
+        Dates with nothing to draw (no rooms, no unassigned bookings) are skipped.
+        """
+        T = len(self.times)
+        for d, day in enumerate(self.dates):
+            rows = []
+            for li, (loc_id, name, room_count) in enumerate(self.locations):
+                start = self.room_start[loc_id]
+                for room in range(int(room_count or 0)):
+                    i = (d * self.total_rooms + start + room) * T
+                    rows.append((name, f"Room {room + 1}", list(self.cells[i:i + T])))
+                i = (d * len(self.locations) + li) * T
+                waiting = self.unassigned[i:i + T]
+                if any(waiting):
+                    rows.append((name, "No room", list(waiting)))
+            if rows:
+                yield day, rows
+
+
+def owner_overview(owner, today, days=OVERVIEW_DAYS):
+    """
+    Everything the overview page shows, in three queries:
+    the owner's locations, the status counts, and the windowed rows.
+    """
+    window_end = today + timedelta(days=days)
+
+    locations = list(
+        owner.owned_locations.order_by("name").values_list("id", "name", "room_count")
+    )
+    loc_ids = [loc_id for loc_id, _, _ in locations]
+
+    counts = Appointment.objects.filter(location_id__in=loc_ids).aggregate(
+        past=Count("id", filter=Q(date__lt=today)),
+        today=Count("id", filter=Q(date=today)),
+        future=Count("id", filter=Q(date__gt=today)),
+    )
+    counts["upcoming"] = counts["today"] + counts["future"]
+
+    rows = (
+        Appointment.objects
+        .filter(location_id__in=loc_ids, date__gte=today - timedelta(days=PAST_DAYS), date__lt=window_end)
+        .order_by("date", "time", "location__name", "room_number", "id")
+        .values_list(
+            "id", "date", "time", "location_id", "location__name", "location_label",
+            "room_number", "status", "customer_label", "consultant__username",
+        )
+    )
+
+    times = set(slot_times())
+    past, today_rows, future = [], [], []
+    buffered = []
+    for appt_id, d, t, loc_id, loc_name, loc_label, room, status, customer, consultant in rows.iterator():
+        row = OverviewRow(appt_id, d, t, loc_name or loc_label, room, status, customer, consultant)
+        if d < today:
+            past.append(row)
+            continue
+        (today_rows if d == today else future).append(row)
+        times.add(t)
+        buffered.append((d, loc_id, t, room, status))
+
+    grid = OccupancyGrid(
+        [today + timedelta(days=i) for i in range(days)],
+        locations,
+        sorted(times),
+    )
+    for args in buffered:
+        grid.add(*args)
+
+    past.reverse()  # most recent first
+    return {
+        "locations": locations,
+        "counts": counts,
+        "past_appts": past,
+        "today_appts": today_rows,
+        "future_appts": future,
+        "grid": grid,
+        "window_end": window_end - timedelta(days=1),
+        "past_days": PAST_DAYS,
+    }
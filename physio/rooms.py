@@ -0,0 +1,105 @@
+"""
+Room allocation for ACCEPTED appointments.
+
+Occupancy is kept per (location_id, date, time) slot as an int bitmask where
+bit r-1 set means room r is taken. Load the masks for every slot you care
+about with one query, then allocate in memory; the lowest free room is
+``free & -free``. Callers still save the room_number themselves, and the
+uniq_room_timeslot_when_accepted constraint stays the source of truth.
+"""
+from .models import Appointment
+
+
+def _full_mask(room_count) -> int:
+    return (1 << int(room_count or 0)) - 1
+
+
+class RoomAllocator:
+    def __init__(self, room_counts=None):
+        # location_id -> room_count
+        self.room_counts = dict(room_counts or {})
+        # (location_id, date, time) -> bitmask of taken rooms
+        self.masks = {}
+
+    @classmethod
+    def load(cls, appointments, exclude_ids=()):
+        """
+        Build an allocator covering every slot the given appointments sit in.
+        Appointments need their location loaded (select_related("location")).
+
+        One query, whatever the batch size.
+        """
+        appointments = [a for a in appointments if a.location_id]
+        allocator = cls({a.location_id: a.location.room_count for a in appointments})
+        keys = {(a.location_id, a.date, a.time) for a in appointments}
+        allocator.fetch(keys, exclude_ids=exclude_ids)
+        return allocator
+
+    def fetch(self, keys, exclude_ids=()):
+        keys = set(keys)
+        for key in keys:
+            self.masks.setdefault(key, 0)
+        if not keys:
+            return
+
+        taken = (
+            Appointment.objects
+            .filter(
+                status=Appointment.Status.ACCEPTED,
+                room_number__isnull=False,
+                location_id__in={k[0] for k in keys},
+                date__in={k[1] for k in keys},
+                time__in={k[2] for k in keys},
+            )
+            .exclude(id__in=list(exclude_ids))
+            .values_list("location_id", "date", "time", "room_number")
+        )
+        for loc_id, d, t, room in taken:
+            key = (loc_id, d, t)
+            if key in keys and room >= 1:
+                self.masks[key] |= 1 << (room - 1)
+
+    def free_count(self, location_id, date, time) -> int:
+        free = _full_mask(self.room_counts.get(location_id)) & ~self.masks.get((location_id, date, time), 0)
+        return bin(free).count("1")
+
+    def allocate(self, location_id, date, time):
+        """Take and return the lowest free room number, or None when the slot is full."""
+        key = (location_id, date, time)
+        mask = self.masks.get(key, 0)
+        free = _full_mask(self.room_counts.get(location_id)) & ~mask
+        if not free:
+            return None
+        bit = free & -free
+        self.masks[key] = mask | bit
+        return bit.bit_length()
+
+    def release(self, location_id, date, time, room_number):
+        key = (location_id, date, time)
+        self.masks[key] = self.masks.get(key, 0) & ~(1 << (room_number - 1))
+
+    def allocate_batch(self, appointments):
+        """
+        Set room_number on each appointment that needs one (in the order given).
+        Returns the appointments left without a room because their slot is full.
+        Nothing is saved.
+        """
+        unplaced = []
+        for appt in appointments:
+            if not appt.location_id or appt.room_number:
+                continue
+            room = self.allocate(appt.location_id, appt.date, appt.time)
+            if room is None:
+                unplaced.append(appt)
+            else:
+                appt.room_number = room
+        return unplaced
+
+
+def pick_room(*, location, date, time, exclude_ids=()):
+    """Lowest free room (1..room_count) at this slot, or None."""
+    if not location or not location.room_count:
+        return None
+    allocator = RoomAllocator({location.id: location.room_count})
+    allocator.fetch({(location.id, date, time)}, exclude_ids=exclude_ids)
+    return allocator.allocate(location.id, date, time)
@@ -0,0 +1,151 @@
+"""
+Consultant working hours compiled to per-day slot bitmaps.
+
+Bit i of a day mask stands for slot_times()[i]. A consultant's rules
+(WorkingHours per location and weekday, plus dated ScheduleExceptions) are
+compiled once into a small entry:
+
+    {"weekly": {location_id: (mon_mask, ..., sun_mask)},
+     "exceptions": {date: [(location_id or None, mask, available), ...]}}
+
+and cached per consultant, so answering "is X working at L on D at T" is a
+dict lookup and a few bitwise ops, and free time is working & ~booked.
+
+A consultant with no WorkingHours at a location is treated as working every
+slot there (the behaviour before working hours existed); exceptions still apply.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ScheduleException, WorkingHours
+from .utils import slot_times
+
+# invalidate() only reaches the process it runs in while CACHES is per-process local
+# memory, so this bounds how long other workers can keep answering from old rules.
+SCHEDULE_TTL = 60 * 5
+
+TIMES = slot_times()
+_SLOT_INDEX = {t: i for i, t in enumerate(TIMES)}
+FULL_DAY = (1 << len(TIMES)) - 1
+
+
+def _key(consultant_id):
+    return f"physio:schedule:{consultant_id}"
+
+
+def slot_bit(time) -> int:
+    """The bit for a slot start time; 0 for times that are not slots."""
+    i = _SLOT_INDEX.get(time)
+    return 0 if i is None else 1 << i
+
+
+def slot_mask(start=None, end=None) -> int:
+    """Slots starting in [start, end); the whole day when both are None."""
+    if start is None and end is None:
+        return FULL_DAY
+    mask = 0
+    for i, t in enumerate(TIMES):
+        if start <= t < end:
+            mask |= 1 << i
+    return mask
+
+
+# --- compiling ---
+
+def _compile(consultant_ids, hours, exceptions):
+    weekly = defaultdict(lambda: defaultdict(lambda: [0] * 7))
+    for cons_id, loc_id, weekday, start, end in hours:
+        weekly[cons_id][loc_id][weekday] |= slot_mask(start, end)
+
+    dated = defaultdict(lambda: defaultdict(list))
+    for cons_id, loc_id, d, start, end, available in exceptions:
+        dated[cons_id][d].append((loc_id, slot_mask(start, end), available))
+
+    return {
+        cons_id: {
+            "weekly": {loc_id: tuple(days) for loc_id, days in weekly[cons_id].items()},
+            # Extra hours first, so time off on the same date wins.
+            "exceptions": {d: sorted(rows, key=lambda r: not r[2]) for d, rows in dated[cons_id].items()},
+        }
+        for cons_id in consultant_ids
+    }
+
+
+def _rule_querysets(consultant_ids):
+    hours = (
+        WorkingHours.objects
+        .filter(consultant_id__in=consultant_ids)
+        .values_list("consultant_id", "location_id", "weekday", "start_time", "end_time")
+    )
+    exceptions = (
+        ScheduleException.objects
+        .filter(consultant_id__in=consultant_ids, date__gte=timezone.localdate())
+        .values_list("consultant_id", "location_id", "date", "start_time", "end_time", "available")
+    )
+    return hours, exceptions
+
+
+def schedules(consultant_ids):
+    """{consultant_id: entry}. One cache round trip; two queries for whatever was not cached."""
+    consultant_ids = {int(c) for c in consultant_ids if c}
+    if not consultant_ids:
+        return {}
+    cached = cache.get_many([_key(c) for c in consultant_ids])
+    out = {c: cached[_key(c)] for c in consultant_ids if _key(c) in cached}
+
+    missing = consultant_ids - out.keys()
+    if missing:
+        hours, exceptions = _rule_querysets(missing)
+        compiled = _compile(missing, list(hours), list(exceptions))
+        cache.set_many({_key(c): e for c, e in compiled.items()}, SCHEDULE_TTL)
+        out.update(compiled)
+    return out
+
+
+async def aschedules(consultant_ids):
+    consultant_ids = {int(c) for c in consultant_ids if c}
+    if not consultant_ids:
+        return {}
+    cached = await cache.aget_many([_key(c) for c in consultant_ids])
+    out = {c: cached[_key(c)] for c in consultant_ids if _key(c) in cached}
+
+    missing = consultant_ids - out.keys()
+    if missing:
+        hours, exceptions = _rule_querysets(missing)
+        compiled = _compile(missing, [r async for r in hours], [r async for r in exceptions])
+        await cache.aset_many({_key(c): e for c, e in compiled.items()}, SCHEDULE_TTL)
+        out.update(compiled)
+    return out
+
+
+def invalidate(*consultant_ids):
+    """Drop compiled entries now and again on commit, so a concurrent read can't re-cache old rules."""
+    keys = [_key(c) for c in consultant_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# --- reading ---
+
+def working_mask(entry, location_id, date) -> int:
+    """Slots the consultant works at location_id on date."""
+    if entry is None:
+        return FULL_DAY
+    days = entry["weekly"].get(location_id)
+    mask = FULL_DAY if days is None else days[date.weekday()]
+    for loc_id, exc_mask, available in entry["exceptions"].get(date, ()):
+        if loc_id is None or loc_id == location_id:
+            mask = (mask | exc_mask) if available else (mask & ~exc_mask)
+    return mask
+
+
+def is_working(entry, location_id, date, time) -> bool:
+    mask = working_mask(entry, location_id, date)
+    bit = slot_bit(time)
+    if not bit:
+        # Not a bookable slot: only an unrestricted day covers it.
+        return mask == FULL_DAY
+    return bool(mask & bit)
@@ -0,0 +1,68 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import clusters, mapcache
+from core.models import Location
+from . import schedule
+from .inventory import refresh_location
+from .maps import MAP_LAYER, location_points
+from .models import ScheduleException, WorkingHours
+
+
+@receiver(post_save, sender=Location)
+def location_saved(sender, instance, created, **kwargs):
+    # room_count may have changed
+    if not created:
+        refresh_location(instance.id)
+
+    before = getattr(instance, "_geo_before", None)
+    old = location_points(before["geo_lat"], before["geo_lng"], before["is_physio"]) if before else []
+    new = location_points(instance.geo_lat, instance.geo_lng, instance.is_physio)
+    clusters.move_points(MAP_LAYER, old, new)
+    mapcache.bump(MAP_LAYER)
+
+
+@receiver(post_delete, sender=Location)
+def location_deleted(sender, instance, **kwargs):
+    clusters.apply_points(MAP_LAYER, location_points(instance.geo_lat, instance.geo_lng, instance.is_physio), -1)
+    mapcache.bump(MAP_LAYER)
+
+
+@receiver(m2m_changed, sender=Location.consultants.through)
+def location_consultants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # post_clear gets no pk_set: remember which locations are losing this consultant.
+        instance._cleared_location_ids = list(instance.consultant_locations.values_list("id", flat=True))
+        return
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+
+    if reverse:
+        # consultant.consultant_locations.add(...): instance is the User
+        if action == "post_clear":
+            location_ids = instance.__dict__.pop("_cleared_location_ids", [])
+        else:
+            location_ids = pk_set or []
+    else:
+        location_ids = [instance.id]
+
+    for location_id in location_ids:
+        refresh_location(location_id)
+
+
+@receiver([post_save, post_delete], sender=WorkingHours)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def schedule_changed(sender, instance, **kwargs):
+    schedule.invalidate(instance.consultant_id)
+
+    # Free-consultant counts of upcoming slots depend on who is working.
+    if instance.location_id:
+        location_ids = [instance.location_id]
+    else:
+        location_ids = (
+            Location.consultants.through.objects
+            .filter(user_id=instance.consultant_id)
+            .values_list("location_id", flat=True)
+        )
+    for location_id in location_ids:
+        refresh_location(location_id)
@@ -33,18 +33,60 @@
     return await res.json();
   }
 
+  const pins = L.layerGroup().addTo(map);
+  const clusters = L.layerGroup().addTo(map);
+  // Location markers by id, kept across reloads: a popup opened near the edge
+  // auto-pans the map, and the reload that follows must not remove its marker.
+  const markers = new Map();
+
+  function viewportQuery() {
+    return `bbox=${encodeURIComponent(map.getBounds().toBBoxString())}&zoom=${map.getZoom()}`;
+  }
+
   async function loadPins() {
     if (!cfg.mapDataUrl) throw new Error("PHYSIO.mapDataUrl is missing");
 
-    const data = await fetchJSON(cfg.mapDataUrl);
+    const data = await fetchJSON(`${cfg.mapDataUrl}?${viewportQuery()}`);
     const locs = data.locations || [];
 
+    clusters.clearLayers();
+    (data.clusters || []).forEach((c) => addCluster(c));
+
+    const wanted = new Set(locs.map((loc) => loc.id));
+    markers.forEach((m, id) => {
+      if (!wanted.has(id) && !m.isPopupOpen()) {
+        pins.removeLayer(m);
+        markers.delete(id);
+      }
+    });
     locs.forEach((loc) => {
-      const m = L.marker([loc.lat, loc.lng]).addTo(map);
+      if (markers.has(loc.id)) return;
+      const m = L.marker([loc.lat, loc.lng]).addTo(pins);
       m.on("click", () => openLocationWorkflow(m, loc));
+      markers.set(loc.id, m);
     });
   }
 
+  // Zoomed out the server sends {lat, lng, count} clusters instead of pins.
+  function addCluster(c) {
+    const size = c.count < 10 ? 30 : c.count < 100 ? 38 : 46;
+    const icon = L.divIcon({
+      className: "map-cluster",
+      html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;border-radius:50%;
+                         background:rgba(0,120,200,.75);color:#fff;text-align:center;font-weight:600">${c.count}</div>`,
+      iconSize: [size, size],
+    });
+    L.marker([c.lat, c.lng], { icon }).addTo(clusters)
+      .on("click", () => map.setView([c.lat, c.lng], map.getZoom() + 2));
+  }
+
+  // Only what is on screen: reload pins after each pan/zoom (debounced).
+  let reloadTimer = null;
+  map.on("moveend", () => {
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(() => loadPins().catch(console.error), 250);
+  });
+
   async function openLocationWorkflow(marker, loc) {
     const dateVal = todayISO();
 
@@ -1,3 +1,862 @@
-from django.test import TestCase
+import datetime as dt
+import re
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Location, User
+from core.testing import QueryBudgetMixin, QueryPlanMixin, plain_static_storage
+from . import decisions, inventory, notifications, occupancy, rooms, schedule, tokens
+from .models import Appointment, NotificationOutbox, ScheduleException, SlotInventory, WorkingHours
+from .utils import slot_times
+
+APPOINTMENT = "physio_appointment"
+HOT_TABLES = (APPOINTMENT, "physio_slotinventory")
+
+
+class AppointmentIndexTests(QueryPlanMixin, TestCase):
+    """The booking/decision hot paths must reach Appointment rows through an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=2, is_physio=True,
+        )
+        cls.location.consultants.add(cls.consultant)
+
+        cls.day = timezone.localdate() + dt.timedelta(days=3)
+        cls.appt = Appointment.objects.create(
+            location=cls.location, consultant=cls.consultant, created_by=cls.customer,
+            date=cls.day, time=dt.time(9, 0),
+        )
+
+    def test_token_accept(self):
+        self.client.force_login(self.consultant)
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.get(f"/physio/consultant/token/accept/{self.appt.action_token}/")
+        self.assertLess(response.status_code, 400)
+        self.appt.refresh_from_db()
+        self.assertEqual(self.appt.status, Appointment.Status.ACCEPTED)
+
+    def test_token_lookup_miss(self):
+        self.client.force_login(self.consultant)
+        with self.assertIndexedQueries(APPOINTMENT):
+            response = self.client.get(f"/physio/consultant/token/decline/{uuid.uuid4()}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_decide(self):
+        self.client.force_login(self.consultant)
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.post(
+                "/physio/consultant/appointments/bulk/",
+                {"accept": [self.appt.id]},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_timeslots(self):
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.get("/physio/api/timeslots/", {"location_id": self.location.id, "date": self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+    def test_available_consultants(self):
+        self.client.force_login(self.customer)
+        with self.assertIndexedQueries(APPOINTMENT):
+            response = self.client.get("/physio/api/available-consultants/", {
+                "location_id": self.location.id, "date": self.day.isoformat(), "time": "09:00",
+            })
+        self.assertEqual(response.status_code, 200)
+
+    def test_availability_matrix(self):
+        self.client.force_login(self.customer)
+        with self.assertIndexedQueries(APPOINTMENT):
+            response = self.client.get("/physio/api/availability/", {
+                "location_ids": str(self.location.id),
+                "start": self.day.isoformat(),
+                "end": (self.day + dt.timedelta(days=6)).isoformat(),
+            })
+        self.assertEqual(response.status_code, 200)
+
+    def test_booking(self):
+        self.client.force_login(self.customer)
+        with self.assertIndexedQueries(*HOT_TABLES):
+            response = self.client.post("/physio/api/book/", {
+                "location_id": self.location.id, "consultant_id": self.consultant.id,
+                "date": self.day.isoformat(), "time": "10:00",
+            }, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_consultant_dashboard_pages(self):
+        self.client.force_login(self.consultant)
+        with self.assertIndexedQueries(APPOINTMENT):
+            pages = [
+                self.client.get("/physio/consultant/dashboard/"),
+                self.client.get("/physio/api/consultant/appointments/", {"before": f"{self.day.isoformat()}_09:00:00_{self.appt.id}"}),
+            ]
+        self.assertEqual([page.status_code for page in pages], [200, 200])
+
+    def test_owner_pages(self):
+        self.client.force_login(self.owner)
+        with self.assertIndexedQueries(APPOINTMENT):
+            pages = [self.client.get("/physio/owner/dashboard/"), self.client.get("/physio/owner/overview/")]
+        self.assertEqual([page.status_code for page in pages], [200, 200])
+
+
+@plain_static_storage
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Every physio view against a dataset big enough to expose N+1 patterns.
+    Budgets include the session and user lookups of logged-in requests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.consultants = [
+            User.objects.create_user(f"cons{i}", password="x", role=User.Role.CONSULTANT) for i in range(4)
+        ]
+        cls.consultant = cls.consultants[0]
+        cls.locations = [
+            Location.objects.create(
+                name=f"Clinic {i}", owner=cls.owner, latitude=-37.81 + i / 100, longitude=144.96,
+                room_count=3, is_physio=True,
+            )
+            for i in range(4)
+        ]
+        for loc in cls.locations:
+            loc.consultants.set(cls.consultants)
+
+        today = timezone.localdate()
+        cls.day = today + dt.timedelta(days=2)
+        appts = []
+        for offset in range(-3, 6):
+            for i, cons in enumerate(cls.consultants):
+                appts.append(Appointment(
+                    location=cls.locations[i], consultant=cons, created_by=cls.customer,
+                    customer_label="cust", date=today + dt.timedelta(days=offset), time=dt.time(9 + i, 0),
+                    status=Appointment.Status.ACCEPTED if offset < 0 else Appointment.Status.PENDING,
+                    room_number=1 if offset < 0 else None,
+                ))
+        Appointment.objects.bulk_create(appts)
+        cls.pending = Appointment.objects.filter(consultant=cls.consultant, status=Appointment.Status.PENDING).order_by("id")
+
+    def setUp(self):
+        # Same counts whatever earlier tests left in the map/schedule caches.
+        cache.clear()
+
+    def _run(self, cases):
+        for label, user, method, url, data, budget in cases:
+            with self.subTest(label):
+                if user:
+                    self.client.force_login(user)
+                else:
+                    self.client.logout()
+                with self.assertMaxQueries(budget, label):
+                    if method == "post":
+                        response = self.client.post(url, data, content_type="application/json")
+                    else:
+                        response = self.client.get(url, data)
+                self.assertLess(response.status_code, 500, label)
+
+    def test_public_views(self):
+        day = self.day.isoformat()
+        self._run([
+            ("home", None, "get", "/physio/", {}, 0),
+            ("map pins", None, "get", "/physio/map-data/", {"bbox": "144,-38,145,-37", "zoom": 15}, 1),
+            ("map clusters", None, "get", "/physio/map-data/", {"bbox": "144,-38,145,-37", "zoom": 8}, 1),
+            ("nearest", None, "get", "/physio/api/nearest/", {"lat": -37.8, "lng": 144.9, "k": 3}, 2),
+            # No stored rows for the day: they are computed (and not saved) on every read.
+            ("timeslots computed", None, "get", "/physio/api/timeslots/", {"location_id": self.locations[0].id, "date": day}, 7),
+        ])
+
+    def test_customer_views(self):
+        day = self.day.isoformat()
+        loc_ids = ",".join(str(loc.id) for loc in self.locations)
+        self._run([
+            ("available consultants", self.customer, "get", "/physio/api/available-consultants/",
+             {"location_id": self.locations[0].id, "date": day, "time": "09:00"}, 6),  # incl. 2 to compile schedules
+            ("availability matrix", self.customer, "get", "/physio/api/availability/",
+             {"location_ids": loc_ids, "start": day, "end": day}, 5),
+            ("book", self.customer, "post", "/physio/api/book/",
+             {"location_id": self.locations[0].id, "consultant_id": self.consultant.id, "date": day, "time": "13:00"}, 7),  # incl. the savepoint pair around booking + outbox
+        ])
+
+    def test_consultant_views(self):
+        first, second = self.pending[0], self.pending[1]
+        self._run([
+            ("consultant dashboard", self.consultant, "get", "/physio/consultant/dashboard/", {}, 4),
+            ("consultant appointments", self.consultant, "get", "/physio/consultant/appointments/", {}, 4),
+            ("consultant appointments json", self.consultant, "get", "/physio/api/consultant/appointments/", {}, 4),
+            ("accept", self.consultant, "get", f"/physio/consultant/appointments/{first.id}/accept/", {}, 20),  # incl. 2 to compile schedules
+            ("token decline", self.consultant, "get", f"/physio/consultant/token/decline/{second.action_token}/", {}, 13),
+            ("bulk decide", self.consultant, "post", "/physio/consultant/appointments/bulk/",
+             {"accept": [a.id for a in self.pending[2:]]}, 17),
+        ])
+
+    def test_owner_views(self):
+        self._run([
+            ("owner dashboard", self.owner, "get", "/physio/owner/dashboard/", {}, 5),
+            ("owner appointments json", self.owner, "get", "/physio/api/owner/appointments/", {}, 5),
+            ("owner overview", self.owner, "get", "/physio/owner/overview/", {}, 5),
+        ])
+
+
+class ScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.busy = User.objects.create_user("busy", password="x", role=User.Role.CONSULTANT)
+        cls.free = User.objects.create_user("free", password="x", role=User.Role.CONSULTANT)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=2, is_physio=True,
+        )
+        cls.other = Location.objects.create(
+            name="Other", owner=cls.owner, latitude=-37.82, longitude=144.97, room_count=1, is_physio=True,
+        )
+        cls.location.consultants.set([cls.busy, cls.free])
+
+        today = timezone.localdate()
+        cls.monday = today + dt.timedelta(days=7 - today.weekday())
+        # Mondays 09:00-12:00 at Clinic only.
+        WorkingHours.objects.create(
+            consultant=cls.busy, location=cls.location, weekday=WorkingHours.Weekday.MONDAY,
+            start_time=dt.time(9), end_time=dt.time(12),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def entry(self):
+        return schedule.schedules([self.busy.id])[self.busy.id]
+
+    def test_weekly_hours(self):
+        morning = schedule.slot_mask(dt.time(9), dt.time(12))
+        self.assertEqual(morning, 0b111)  # 09:00, 10:00, 11:00
+        self.assertEqual(schedule.working_mask(self.entry(), self.location.id, self.monday), morning)
+        self.assertEqual(schedule.working_mask(self.entry(), self.location.id, self.monday + dt.timedelta(days=1)), 0)
+        # No hours recorded at the other location: unrestricted there.
+        self.assertEqual(schedule.working_mask(self.entry(), self.other.id, self.monday), schedule.FULL_DAY)
+
+    def test_exceptions(self):
+        ScheduleException.objects.create(
+            consultant=self.busy, location=self.location, date=self.monday,
+            start_time=dt.time(13), end_time=dt.time(14), available=True,
+        )
+        ScheduleException.objects.create(
+            consultant=self.busy, date=self.monday, start_time=dt.time(9), end_time=dt.time(10),
+        )
+        mask = schedule.working_mask(self.entry(), self.location.id, self.monday)
+        self.assertEqual(mask, schedule.slot_mask(dt.time(10), dt.time(12)) | schedule.slot_bit(dt.time(13)))
+        # Location-less time off applies everywhere.
+        self.assertFalse(schedule.is_working(self.entry(), self.other.id, self.monday, dt.time(9)))
+
+    def test_rule_changes_invalidate_cache(self):
+        self.assertFalse(schedule.is_working(self.entry(), self.location.id, self.monday, dt.time(14)))
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkingHours.objects.create(
+                consultant=self.busy, location=self.location, weekday=WorkingHours.Weekday.MONDAY,
+                start_time=dt.time(14), end_time=dt.time(16),
+            )
+        self.assertTrue(schedule.is_working(self.entry(), self.location.id, self.monday, dt.time(14)))
+
+    def test_entries_expire_where_invalidation_cannot_reach(self):
+        # Another worker's local cache never sees our invalidate(); the TTL bounds how stale it gets.
+        self.assertFalse(schedule.is_working(self.entry(), self.location.id, self.monday, dt.time(14)))
+        WorkingHours.objects.filter(consultant=self.busy).update(end_time=dt.time(16))
+        self.assertFalse(schedule.is_working(self.entry(), self.location.id, self.monday, dt.time(14)))
+        later = timezone.now().timestamp() + schedule.SCHEDULE_TTL + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertTrue(schedule.is_working(self.entry(), self.location.id, self.monday, dt.time(14)))
+
+    def test_available_consultants_respects_hours(self):
+        self.client.force_login(self.customer)
+        params = {"location_id": self.location.id, "date": self.monday.isoformat()}
+        morning = self.client.get("/physio/api/available-consultants/", {**params, "time": "09:00"}).json()
+        afternoon = self.client.get("/physio/api/available-consultants/", {**params, "time": "15:00"}).json()
+        self.assertEqual([c["name"] for c in morning["consultants"]], ["busy", "free"])
+        self.assertEqual([c["name"] for c in afternoon["consultants"]], ["free"])
+
+    def test_availability_matrix_respects_hours(self):
+        self.client.force_login(self.customer)
+        data = self.client.get("/physio/api/availability/", {
+            "location_ids": str(self.location.id), "start": self.monday.isoformat(),
+        }).json()
+        row = data["matrix"][str(self.location.id)][0]
+        by_time = dict(zip(data["times"], row))
+        self.assertEqual(by_time["09:00"], [self.busy.id, self.free.id])
+        self.assertEqual(by_time["15:00"], [self.free.id])
+
+    def test_booking_outside_hours_is_rejected(self):
+        self.client.force_login(self.customer)
+        booking = {"location_id": self.location.id, "consultant_id": self.busy.id, "date": self.monday.isoformat()}
+        rejected = self.client.post("/physio/api/book/", {**booking, "time": "15:00"}, content_type="application/json")
+        accepted = self.client.post("/physio/api/book/", {**booking, "time": "10:00"}, content_type="application/json")
+        self.assertEqual(rejected.status_code, 409)
+        self.assertEqual(accepted.status_code, 200)
+
+
+class AvailabilityMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.alice = User.objects.create_user("alice", password="x", role=User.Role.CONSULTANT)
+        cls.bob = User.objects.create_user("bob", password="x", role=User.Role.CONSULTANT)
+        cls.clinic = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=1, is_physio=True,
+        )
+        cls.annex = Location.objects.create(
+            name="Annex", owner=cls.owner, latitude=-37.82, longitude=144.97, room_count=2, is_physio=True,
+        )
+        cls.clinic.consultants.add(cls.alice, cls.bob)
+        cls.annex.consultants.add(cls.alice, cls.bob)
+        cls.day = timezone.localdate() + dt.timedelta(days=3)
+        # Alice is seen at the Clinic at 10:00, which also fills its only room.
+        Appointment.objects.create(
+            location=cls.clinic, consultant=cls.alice, created_by=cls.customer,
+            date=cls.day, time=dt.time(10), room_number=1, status=Appointment.Status.ACCEPTED,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer)
+
+    def get(self, **params):
+        return self.client.get("/physio/api/availability/", params)
+
+    def test_free_consultants_per_slot(self):
+        data = self.get(location_ids=f"{self.clinic.id},{self.annex.id}", start=self.day.isoformat()).json()
+        self.assertEqual(data["dates"], [self.day.isoformat()])
+        self.assertEqual(data["consultants"], {str(self.alice.id): "alice", str(self.bob.id): "bob"})
+
+        def slot(location, time):
+            return data["matrix"][str(location.id)][0][data["times"].index(time)]
+
+        self.assertEqual(slot(self.clinic, "09:00"), [self.alice.id, self.bob.id])
+        # No room left at the Clinic, and Alice is busy wherever she is linked.
+        self.assertEqual(slot(self.clinic, "10:00"), [])
+        self.assertEqual(slot(self.annex, "10:00"), [self.bob.id])
+
+    def test_query_count_does_not_grow_with_the_range(self):
+        params = {"location_ids": f"{self.clinic.id},{self.annex.id}", "start": self.day.isoformat()}
+        # Session and user, locations, consultant links, ACCEPTED appointments, two schedule-rule queries.
+        with self.assertNumQueries(7):
+            self.get(**params)
+        cache.clear()
+        with self.assertNumQueries(7):
+            self.get(**params, end=(self.day + dt.timedelta(days=30)).isoformat())
+
+    def test_rejections(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.get(location_ids=str(self.clinic.id), start=self.day.isoformat()).status_code, 403)
+        self.client.force_login(self.customer)
+        start = self.day.isoformat()
+        for params in (
+            {"location_ids": "x", "start": start},
+            {"location_ids": "", "start": start},
+            {"location_ids": str(self.clinic.id), "start": start, "end": (self.day - dt.timedelta(days=1)).isoformat()},
+            {"location_ids": str(self.clinic.id), "start": start, "end": (self.day + dt.timedelta(days=31)).isoformat()},
+            {"location_ids": ",".join(map(str, range(1, 52))), "start": start},
+        ):
+            with self.subTest(params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+
+class RoomAllocatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=3, is_physio=True,
+        )
+        cls.day = timezone.localdate() + dt.timedelta(days=3)
+        cls.in_room_1 = Appointment.objects.create(
+            location=cls.location, created_by=cls.customer, date=cls.day, time=dt.time(9),
+            room_number=1, status=Appointment.Status.ACCEPTED,
+        )
+
+    def pending(self, time):
+        return Appointment.objects.create(location=self.location, created_by=self.customer, date=self.day, time=time)
+
+    def test_lowest_free_room(self):
+        allocator = rooms.RoomAllocator({1: 3})
+        slot = (1, self.day, dt.time(9))
+        self.assertEqual([allocator.allocate(*slot) for _ in range(4)], [1, 2, 3, None])
+        allocator.release(*slot, 2)
+        self.assertEqual(allocator.free_count(*slot), 1)
+        self.assertEqual(allocator.allocate(*slot), 2)
+        self.assertIsNone(rooms.RoomAllocator().allocate(*slot))
+
+    def test_batch_is_loaded_in_one_query(self):
+        batch = [self.pending(dt.time(9)) for _ in range(3)] + [self.pending(dt.time(10))]
+        batch = list(Appointment.objects.select_related("location").filter(id__in=[a.id for a in batch]).order_by("id"))
+        with self.assertNumQueries(1):
+            allocator = rooms.RoomAllocator.load(batch)
+        unplaced = allocator.allocate_batch(batch)
+        # Room 1 is taken at 09:00, so only two of the three fit there.
+        self.assertEqual([a.room_number for a in batch], [2, 3, None, 1])
+        self.assertEqual(unplaced, [batch[2]])
+
+    def test_excluded_appointments_free_their_rooms(self):
+        allocator = rooms.RoomAllocator.load(
+            Appointment.objects.select_related("location").filter(id=self.in_room_1.id), exclude_ids=[self.in_room_1.id],
+        )
+        self.assertEqual(allocator.free_count(self.location.id, self.day, dt.time(9)), 3)
+        self.assertEqual(rooms.pick_room(location=self.location, date=self.day, time=dt.time(9)), 2)
+        self.assertIsNone(rooms.pick_room(location=None, date=self.day, time=dt.time(9)))
+
+
+class BulkDecideTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.other = User.objects.create_user("other", password="x", role=User.Role.CONSULTANT)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=1, is_physio=True,
+        )
+        cls.location.consultants.add(cls.consultant, cls.other)
+        cls.day = timezone.localdate() + dt.timedelta(days=3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.consultant)
+
+    def appt(self, time, consultant=None, **fields):
+        return Appointment.objects.create(
+            location=self.location, consultant=consultant or self.consultant, created_by=self.customer,
+            date=self.day, time=dt.time(time), **fields,
+        )
+
+    def bulk(self, **payload):
+        return self.client.post("/physio/consultant/appointments/bulk/", payload, content_type="application/json")
+
+    def test_outcomes_in_request_order(self):
+        first, same_slot, dropped = self.appt(9), self.appt(9), self.appt(10)
+        done = self.appt(11, status=Appointment.Status.DECLINED)
+        # The only room at 12:00 is taken by another consultant's booking.
+        self.appt(12, consultant=self.other, status=Appointment.Status.ACCEPTED, room_number=1)
+        no_room = self.appt(12)
+        not_mine = self.appt(13, consultant=self.other)
+
+        response = self.bulk(accept=[first.id, same_slot.id, no_room.id, done.id, not_mine.id], decline=[dropped.id])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(r["id"], r["outcome"], r["status"], r["room_number"]) for r in results],
+            [
+                (first.id, decisions.ACCEPTED, "ACCEPTED", 1),
+                (same_slot.id, decisions.AUTO_DECLINED, "DECLINED", None),
+                (no_room.id, decisions.AUTO_DECLINED, "DECLINED", None),
+                (done.id, decisions.NOT_PENDING, "DECLINED", None),
+                (not_mine.id, decisions.NOT_FOUND, None, None),
+                (dropped.id, decisions.DECLINED, "DECLINED", None),
+            ],
+        )
+        self.assertEqual(Appointment.objects.get(id=not_mine.id).status, Appointment.Status.PENDING)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def queries(n, first_hour):
+            ids = [self.appt(first_hour + i).id for i in range(n)]
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.bulk(accept=ids).status_code, 200)
+            return len(captured)
+
+        queries(1, 8)  # fills the schedule cache
+        self.assertEqual(queries(1, 9), queries(6, 10))
+
+    def test_rejections(self):
+        appt = self.appt(9)
+        self.assertEqual(self.bulk(accept=["x"]).status_code, 400)
+        self.assertEqual(self.bulk().status_code, 400)
+        self.assertEqual(self.bulk(accept=[appt.id], decline=[appt.id]).status_code, 400)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.bulk(accept=[appt.id]).status_code, 403)
+        appt.refresh_from_db()
+        self.assertEqual(appt.status, Appointment.Status.PENDING)
+
+
+class DecisionLockingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=2, is_physio=True,
+        )
+        cls.location.consultants.add(cls.consultant)
+        cls.day = timezone.localdate() + dt.timedelta(days=3)
+
+    def setUp(self):
+        cache.clear()
+        self.appt = Appointment.objects.create(
+            location=self.location, consultant=self.consultant, created_by=self.customer,
+            date=self.day, time=dt.time(9),
+        )
+        self.client.force_login(self.consultant)
+
+    def bulk(self, accept):
+        return self.client.post(
+            "/physio/consultant/appointments/bulk/", {"accept": accept}, content_type="application/json",
+        )
+
+    def test_retries_lost_races(self):
+        real = decisions._decide_locked
+        attempts = [OperationalError("database is locked"), IntegrityError("uniq"), None]
+
+        def flaky(*args):
+            error = attempts.pop(0)
+            if error:
+                raise error
+            return real(*args)
+
+        with mock.patch.object(decisions, "_decide_locked", side_effect=flaky), \
+                mock.patch.object(decisions.time, "sleep") as sleep:
+            response = self.bulk([self.appt.id])
+        self.assertEqual(response.json()["results"][0]["outcome"], decisions.ACCEPTED)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_conflict_after_max_attempts_is_409(self):
+        with mock.patch.object(decisions, "_decide_locked", side_effect=OperationalError("locked")), \
+                mock.patch.object(decisions.time, "sleep") as sleep:
+            response = self.bulk([self.appt.id])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(sleep.call_count, decisions.MAX_ATTEMPTS - 1)
+        self.appt.refresh_from_db()
+        self.assertEqual(self.appt.status, Appointment.Status.PENDING)
+
+    def test_slot_decided_concurrently_is_not_left_as_a_placeholder(self):
+        real = decisions._lock_slots
+
+        def lock_then_lose_race(keys):
+            locked = real(keys)
+            # Another request declines it between our lock query and reload.
+            Appointment.objects.filter(id=self.appt.id).update(status=Appointment.Status.DECLINED)
+            return locked
+
+        with mock.patch.object(decisions, "_lock_slots", side_effect=lock_then_lose_race):
+            response = self.bulk([self.appt.id])
+        self.assertEqual(response.json()["results"][0]["outcome"], decisions.NOT_PENDING)
+        row = SlotInventory.objects.get(location=self.location, date=self.day, time=dt.time(9))
+        self.assertEqual((row.free_rooms, row.free_consultants), (2, 1))
+
+
+class SlotInventoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=1, is_physio=True,
+        )
+        today = timezone.localdate()
+        cls.monday = today + dt.timedelta(days=7 - today.weekday())
+
+    def setUp(self):
+        cache.clear()
+
+    def times(self):
+        return [t.strftime("%H:%M") for t, _, _ in inventory.free_slots(self.location, self.monday)]
+
+    def link(self):
+        WorkingHours.objects.create(
+            consultant=self.consultant, location=self.location, weekday=WorkingHours.Weekday.MONDAY,
+            start_time=dt.time(9), end_time=dt.time(12),
+        )
+        self.location.consultants.add(self.consultant)
+
+    def test_no_consultant_no_slots(self):
+        self.assertEqual(self.times(), [])
+        response = self.client.get("/physio/api/timeslots/", {"location_id": self.location.id, "date": self.monday.isoformat()})
+        self.assertEqual(response.json()["slots"], [])
+
+    def test_slots_follow_working_hours(self):
+        self.link()
+        self.assertEqual(self.times(), ["09:00", "10:00", "11:00"])
+        self.assertEqual(inventory.free_slots(self.location, self.monday)[0][1:], (1, 1))
+
+    def test_reads_do_not_write(self):
+        self.link()
+        far = timezone.localdate() + dt.timedelta(days=3650)
+        response = self.client.get("/physio/api/timeslots/", {"location_id": self.location.id, "date": far.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.times(), ["09:00", "10:00", "11:00"])
+        self.assertFalse(SlotInventory.objects.exists())
+
+    def test_stored_rows_are_one_lookup(self):
+        self.link()
+        inventory.refresh_slots({self.location.id}, {(self.monday, t) for t in slot_times()})
+        self.assertEqual(SlotInventory.objects.filter(location=self.location, date=self.monday).count(), 6)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.times(), ["09:00", "10:00", "11:00"])
+
+    def test_accepted_appointment_takes_the_slot(self):
+        self.link()
+        self.times()
+        appt = Appointment.objects.create(
+            location=self.location, consultant=self.consultant, created_by=self.customer,
+            date=self.monday, time=dt.time(10), status=Appointment.Status.ACCEPTED, room_number=1,
+        )
+        inventory.refresh_for_appointment(appt)
+        self.assertEqual(self.times(), ["09:00", "11:00"])
+
+    def test_clearing_a_consultants_locations_refreshes_them(self):
+        self.link()
+        inventory.refresh_slots({self.location.id}, {(self.monday, t) for t in slot_times()})
+        self.assertEqual(self.times(), ["09:00", "10:00", "11:00"])
+        self.consultant.consultant_locations.clear()
+        self.assertEqual(self.times(), [])
+
+    def test_location_changes_refresh_upcoming_rows(self):
+        self.link()
+        self.times()
+        self.location.room_count = 0
+        self.location.save()
+        self.assertEqual(self.times(), [])
+
+
+class OccupancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.rival = User.objects.create_user("rival", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.clinic = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=2, is_physio=True,
+        )
+        cls.annex = Location.objects.create(
+            name="Annex", owner=cls.owner, latitude=-37.82, longitude=144.97, room_count=1, is_physio=True,
+        )
+        cls.elsewhere = Location.objects.create(
+            name="Elsewhere", owner=cls.rival, latitude=-37.83, longitude=144.98, room_count=1, is_physio=True,
+        )
+        cls.today = timezone.localdate()
+
+    def appt(self, location, days, time, status=Appointment.Status.PENDING, room_number=None):
+        return Appointment.objects.create(
+            location=location, created_by=self.customer, date=self.today + dt.timedelta(days=days),
+            time=time, status=status, room_number=room_number,
+        )
+
+    def test_grid_cells(self):
+        day, nine, ten = self.today, dt.time(9), dt.time(10)
+        grid = occupancy.OccupancyGrid([day], [(1, "Clinic", 2), (2, "Annex", 1)], [nine, ten])
+        grid.add(day, 1, nine, 2, Appointment.Status.PENDING)
+        grid.add(day, 1, nine, 2, Appointment.Status.ACCEPTED)
+        grid.add(day, 1, nine, 2, Appointment.Status.PENDING)     # ACCEPTED is kept
+        grid.add(day, 2, ten, 1, Appointment.Status.DECLINED)     # not drawn
+        grid.add(day, 2, ten, None, Appointment.Status.PENDING)
+        grid.add(day, 2, ten, 5, Appointment.Status.PENDING)      # no such room
+        grid.add(day + dt.timedelta(days=1), 1, nine, 1, Appointment.Status.ACCEPTED)  # outside the window
+        grid.add(day, 3, nine, 1, Appointment.Status.ACCEPTED)    # not one of the locations
+
+        [(date, rows)] = list(grid.days())
+        self.assertEqual(date, day)
+        self.assertEqual(rows, [
+            ("Clinic", "Room 1", [occupancy.FREE, occupancy.FREE]),
+            ("Clinic", "Room 2", [occupancy.ACCEPTED, occupancy.FREE]),
+            ("Annex", "Room 1", [occupancy.FREE, occupancy.FREE]),
+            ("Annex", "No room", [0, 2]),
+        ])
+
+    def test_owner_overview(self):
+        old = self.appt(self.clinic, -3, dt.time(9))
+        older = self.appt(self.clinic, -5, dt.time(9))
+        self.appt(self.clinic, -30, dt.time(9))  # counted, outside the listed window
+        now = self.appt(self.clinic, 0, dt.time(9), Appointment.Status.ACCEPTED, room_number=1)
+        odd = self.appt(self.annex, 2, dt.time(9, 30))
+        self.appt(self.elsewhere, 1, dt.time(9))
+
+        with self.assertNumQueries(3):
+            data = occupancy.owner_overview(self.owner, self.today, days=7)
+            days = list(data["grid"].days())
+        self.assertEqual(data["counts"], {"past": 3, "today": 1, "future": 1, "upcoming": 2})
+        self.assertEqual([r.id for r in data["past_appts"]], [old.id, older.id])
+        self.assertEqual([r.id for r in data["today_appts"]], [now.id])
+        self.assertEqual([r.id for r in data["future_appts"]], [odd.id])
+        # Off-slot times still get a column.
+        self.assertIn(dt.time(9, 30), data["grid"].times)
+        self.assertEqual(len(days), 7)
+        date, rows = days[0]
+        self.assertEqual([row[:2] for row in rows], [("Annex", "Room 1"), ("Clinic", "Room 1"), ("Clinic", "Room 2")])
+        self.assertEqual(rows[1][2][data["grid"].times.index(dt.time(9))], occupancy.ACCEPTED)
+
+    @plain_static_storage
+    def test_owner_without_rooms(self):
+        self.client.force_login(self.rival)
+        self.assertNotContains(self.client.get("/physio/owner/overview/"), "No rooms to show.")
+
+        self.elsewhere.room_count = 0
+        self.elsewhere.save()
+        self.assertEqual(list(occupancy.owner_overview(self.rival, self.today)["grid"].days()), [])
+        self.assertContains(self.client.get("/physio/owner/overview/"), "No rooms to show.")
+
+
+@override_settings(NOTIFICATION_SENDER="physio.notifications.LocMemSender")
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.customer = User.objects.create_user("cust", password="x", role=User.Role.CUSTOMER)
+        cls.consultant = User.objects.create_user(
+            "cons", password="x", role=User.Role.CONSULTANT, phone="+61400000000",
+        )
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=1, is_physio=True,
+        )
+        cls.location.consultants.add(cls.consultant)
+        cls.day = (timezone.localdate() + dt.timedelta(days=3)).isoformat()
+
+    def setUp(self):
+        cache.clear()
+        notifications.sent.clear()
+
+    def book(self, time="10:00"):
+        self.client.force_login(self.customer)
+        return self.client.post("/physio/api/book/", {
+            "location_id": self.location.id, "consultant_id": self.consultant.id, "date": self.day, "time": time,
+        }, content_type="application/json")
+
+    def test_booking_queues_action_links_without_sending(self):
+        appt_id = self.book().json()["appointment_id"]
+        message = NotificationOutbox.objects.get()
+        appt = Appointment.objects.get(id=appt_id)
+        self.assertEqual(message.appointment_id, appt_id)
+        self.assertEqual(message.recipient, "+61400000000")
+        links = re.findall(r"http://testserver/physio/consultant/link/([^/]+)/", message.body)
+        self.assertEqual([tokens.read(t) for t in links], [
+            (appt.id, self.consultant.id, tokens.ACCEPT),
+            (appt.id, self.consultant.id, tokens.DECLINE),
+        ])
+        self.assertEqual(notifications.sent, [])
+
+    def test_no_phone_no_message(self):
+        User.objects.filter(id=self.consultant.id).update(phone="")
+        self.assertEqual(self.book().status_code, 200)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_drain_sends_in_batches(self):
+        for t in ("09:00", "10:00", "11:00"):
+            self.book(t)
+        self.assertEqual(notifications.drain(batch_size=2), (3, 0))
+        self.assertEqual(len(notifications.sent), 3)
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.Status.SENT).exists())
+        # Nothing left to send.
+        self.assertEqual(notifications.drain(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        class Down:
+            def send(self, message):
+                raise ConnectionError("provider down")
+
+        self.book()
+        self.assertEqual(notifications.drain(sender=Down()), (0, 1))
+        message = NotificationOutbox.objects.get()
+        self.assertEqual((message.status, message.attempts), (NotificationOutbox.Status.PENDING, 1))
+        self.assertIn("provider down", message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+
+        # Not due yet; once it is, retries run out.
+        self.assertEqual(notifications.drain(sender=Down()), (0, 0))
+        for _ in range(notifications.MAX_ATTEMPTS - 1):
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+            notifications.drain(sender=Down())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (NotificationOutbox.Status.FAILED, notifications.MAX_ATTEMPTS))
+
+    def test_rate_limit(self):
+        for t in ("09:00", "10:00", "11:00"):
+            self.book(t)
+        with mock.patch("physio.notifications.time_mod.sleep") as sleep:
+            notifications.drain(rate=10)
+        # The first message goes straight out; the mocked sleep doesn't pass time,
+        # so the next two wait until 0.1 s and 0.2 s after it.
+        waits = [c.args[0] for c in sleep.call_args_list]
+        self.assertEqual(len(waits), 2)
+        self.assertAlmostEqual(waits[0], 0.1, places=2)
+        self.assertAlmostEqual(waits[1], 0.2, places=2)
+
+    def test_lease_outlasts_a_slow_batch(self):
+        for t in ("09:00", "10:00", "11:00"):
+            self.book(t)
+        leased = []
+
+        class Recorder:
+            def send(self, message):
+                leased.append(NotificationOutbox.objects.get(id=message.id).next_attempt_at)
+
+        start = timezone.now()
+        with mock.patch("physio.notifications.time_mod.sleep"):
+            notifications.drain(batch_size=1000, rate=0.5, sender=Recorder())
+        # Sized for a full batch of 1000 at one per 2 s, with headroom: well past the fixed LEASE.
+        self.assertEqual(len(leased), 3)
+        for until in leased:
+            self.assertGreaterEqual(until - start, dt.timedelta(seconds=notifications.LEASE_HEADROOM * 1000 / 0.5))
+        self.assertEqual(notifications._lease(100, 1), notifications.LEASE)
+        self.assertEqual(notifications._lease(100, None), notifications.LEASE)
+
+
+class SignedActionLinkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner", password="x", role=User.Role.LOCATION_OWNER)
+        cls.consultant = User.objects.create_user("cons", password="x", role=User.Role.CONSULTANT)
+        cls.other = User.objects.create_user("other", password="x", role=User.Role.CONSULTANT)
+        cls.location = Location.objects.create(
+            name="Clinic", owner=cls.owner, latitude=-37.81, longitude=144.96, room_count=1, is_physio=True,
+        )
+        cls.location.consultants.add(cls.consultant)
+        cls.appt = Appointment.objects.create(
+            location=cls.location, consultant=cls.consultant, customer_label="cust",
+            date=timezone.localdate() + dt.timedelta(days=2), time=dt.time(10),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self, action=tokens.ACCEPT, **kwargs):
+        return f"/physio/consultant/link/{tokens.make(self.appt, action, **kwargs)}/"
+
+    def test_round_trip(self):
+        token = tokens.make(self.appt, tokens.DECLINE)
+        self.assertEqual(tokens.read(token), (self.appt.id, self.consultant.id, tokens.DECLINE))
+
+    def test_bad_links_rejected_without_queries(self):
+        good = tokens.make(self.appt, tokens.ACCEPT)
+        expired = self.url(expires_at=timezone.now() - dt.timedelta(seconds=1))
+        with self.assertNumQueries(0):
+            tampered = self.client.get(f"/physio/consultant/link/{good[:-2]}xx/")
+            forged = self.client.get("/physio/consultant/link/WzEsMiwiYSIsOTk5OTk5OTk5OV0:abc/")
+            stale = self.client.get(expired)
+        self.assertEqual((tampered.status_code, forged.status_code, stale.status_code), (404, 404, 410))
+
+    def test_accept_by_primary_key(self):
+        self.client.force_login(self.consultant)
+        response = self.client.get(self.url())
+        self.assertRedirects(response, "/physio/consultant/dashboard/", fetch_redirect_response=False)
+        self.appt.refresh_from_db()
+        self.assertEqual(self.appt.status, Appointment.Status.ACCEPTED)
+        # Spent: the appointment is no longer pending.
+        self.assertContains(self.client.get(self.url(tokens.DECLINE)), "Already decided")
+
+    def test_wrong_consultant_and_anonymous(self):
+        url = self.url()
+        self.assertRedirects(self.client.get(url), f"/login/?next={url}", fetch_redirect_response=False)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.appt.refresh_from_db()
+        self.assertEqual(self.appt.status, Appointment.Status.PENDING)
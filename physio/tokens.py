@@ -0,0 +1,49 @@
+"""
+Signed consultant action links.
+
+A link token is the appointment id, consultant id, action and expiry, signed
+with SECRET_KEY (django.core.signing, HMAC-SHA256). Verifying one needs no
+database access, so forged, tampered and expired links are turned away before
+the appointment is loaded, and a valid one resolves by primary key.
+
+Tokens can't be revoked individually; deciding the appointment makes every
+outstanding link for it a no-op, and rotating SECRET_KEY voids them all.
+"""
+from datetime import timedelta
+
+from django.core import signing
+from django.utils import timezone
+
+SALT = "physio.action-link"
+ACTION_LINK_TTL = timedelta(hours=48)
+
+ACCEPT = "a"
+DECLINE = "d"
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(InvalidToken):
+    pass
+
+
+def make(appt, action, expires_at=None) -> str:
+    """A token for action (ACCEPT/DECLINE) on appt, valid until expires_at (default: the appointment's own expiry, else ACTION_LINK_TTL from now)."""
+    expires_at = expires_at or appt.action_token_expires_at or timezone.now() + ACTION_LINK_TTL
+    payload = [appt.id, appt.consultant_id, action, int(expires_at.timestamp())]
+    return signing.dumps(payload, salt=SALT, compress=False)
+
+
+def read(token):
+    """(appointment_id, consultant_id, action); raises InvalidToken or ExpiredToken."""
+    try:
+        appt_id, consultant_id, action, expires = signing.loads(token, salt=SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidToken(token)
+    if action not in (ACCEPT, DECLINE):
+        raise InvalidToken(token)
+    if timezone.now().timestamp() > expires:
+        raise ExpiredToken(token)
+    return appt_id, consultant_id, action
@@ -8,20 +8,27 @@ urlpatterns = [
 
     path("", views.home, name='home'),
     path("map-data/", views.map_data, name="map_data"),
+    path("api/nearest/", views.api_nearest, name="api_nearest"),
 
 # workflow endpoints
     path("api/timeslots/", views.api_timeslots, name="api_timeslots"),
     path("api/available-consultants/", views.api_available_consultants, name="api_available_consultants"),
+    path("api/availability/", views.api_availability, name="api_availability"),
     path("api/book/", views.request_booking, name="request_booking"),
 
     path("consultant/dashboard/", views.consultant_dashboard, name="consultant_dashboard"),
     path("consultant/appointments/", views.consultant_appointments, name="consultant_appointments"),
     path("consultant/appointments/<int:pk>/accept/", views.consultant_accept, name="consultant_accept"),
     path("consultant/appointments/<int:pk>/decline/", views.consultant_decline, name="consultant_decline"),
+    path("consultant/appointments/bulk/", views.consultant_bulk_decide, name="consultant_bulk_decide"),
+    path("api/consultant/appointments/", views.api_consultant_appointments, name="api_consultant_appointments"),
 
     path("owner/dashboard/", views.owner_dashboard, name="owner_dashboard"),
+    path("api/owner/appointments/", views.api_owner_appointments, name="api_owner_appointments"),
+    path("owner/overview/", views.location_owner_overview, name="location_owner_overview"),
 
     path("consultant/token/accept/<uuid:token>/", views.consultant_token_accept, name="consultant_token_accept"),
     path("consultant/token/decline/<uuid:token>/", views.consultant_token_decline, name="consultant_token_decline"),
+    path("consultant/link/<str:token>/", views.consultant_action_link, name="consultant_action_link"),
 ]
 
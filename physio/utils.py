@@ -1,5 +1,6 @@
 from datetime import time
-from .models import Appointment
+
+from .rooms import pick_room
 
 # Adjust any time slots you want, but keep it consistent across API + booking
 BOOKABLE_TIMES = [
@@ -13,20 +14,18 @@ BOOKABLE_TIMES = [
     time(16, 0), time(16, 30),
 ]
 
+# Times offered by the booking popup (api_timeslots). Replace later with real availability.
+SLOTS = ["09:00", "10:00", "11:00", "13:00", "14:00", "15:00"]
+
+
+def slot_times():
+    """SLOTS as datetime.time objects, in order."""
+    return [time(int(s[:2]), int(s[3:])) for s in SLOTS]
+
 
 def allocate_room_number(location, date, time_):
     """
     Returns the first available room number (1..location.room_count) for this location/date/time.
     Returns None if no rooms available.
     """
-    booked_rooms = set(
-        Appointment.objects.filter(location=location, date=date, time=time_)
-        .exclude(room__isnull=True)
-        .values_list("room", flat=True)
-    )
-
-    for r in range(1, location.room_count + 1):
-        if r not in booked_rooms:
-            return r
-
-    return None
+    return pick_room(location=location, date=date, time=time_)
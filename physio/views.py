@@ -1,15 +1,16 @@
 from __future__ import annotations
 import os
-from collections import defaultdict
-from datetime import date as date_cls, datetime
+from datetime import date as date_cls, datetime, timedelta
 from django.conf import settings
 from django.db import transaction
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.http import HttpResponseForbidden, JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Exists, OuterRef
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse
 from django.contrib.auth.forms import AuthenticationForm
 from django.views.decorators.csrf import ensure_csrf_cookie
@@ -18,10 +19,22 @@ import traceback
 from django.db import IntegrityError
 from django.utils.http import url_has_allowed_host_and_scheme
 import json
+from core.clusters import aclusters_in_bbox, cluster_level
+from core.geo import bbox_q, nearest, parse_viewport
+from core.mapcache import acached_json
 from core.models import User, Location
+from core.pagination import Keyset, page_params
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .models import Appointment
+from .availability import MAX_MATRIX_DAYS, MAX_MATRIX_LOCATIONS, availability_matrix
+from . import decisions, tokens
+from .decisions import DecisionConflict, accept_appointment, decide_bulk, decline_appointment
+from .inventory import afree_slots
+from .maps import MAP_LAYER
+from .notifications import enqueue_action_links
+from .occupancy import MAX_OVERVIEW_DAYS, OVERVIEW_DAYS, owner_overview
+from .schedule import aschedules, is_working, schedules
 from django.contrib import messages
 
 
@@ -33,36 +46,111 @@ def home(request):
     })
 
 
-def map_data(request):
-    qs = (
-        Location.objects.filter(is_physio=True)
-        .exclude(latitude__isnull=True)
-        .exclude(longitude__isnull=True)
+async def map_data(request):
+    """
+    Physio pins. Optional ?bbox=west,south,east,north&zoom=N limits the
+    response to the visible map area; below CLUSTER_MAX_ZOOM it returns
+    pre-aggregated "clusters" ({lat, lng, count}) instead of "locations".
+    The bbox is snapped to grid cells and the response served from core.mapcache with an ETag.
+
+    This and the booking popup endpoints below are async: under ASGI the
+    concurrent requests one map page fires share an event loop instead of
+    each holding a worker.
+    """
+    try:
+        viewport = parse_viewport(request.GET, snap=True)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": f"Invalid viewport: {e}"}, status=400)
+
+    async def build():
+        level = cluster_level(viewport.zoom)
+        if level is not None:
+            return {
+                "ok": True,
+                "clusters": await aclusters_in_bbox(MAP_LAYER, level, viewport.bbox),
+                "locations": [],
+            }
+
+        qs = Location.objects.filter(is_physio=True, geo_lat__isnull=False, geo_lng__isnull=False)
+        if viewport.bbox:
+            qs = qs.filter(bbox_q(viewport.bbox))
+
+        locations = [
+            {"id": loc_id, "name": name, "lat": lat, "lng": lng}
+            async for loc_id, name, lat, lng in qs.values_list("id", "name", "geo_lat", "geo_lng")
+        ]
+        return {"ok": True, "locations": locations}
+
+    return await acached_json(request, MAP_LAYER, viewport, build)
+
+NEAREST_DEFAULT = 10
+NEAREST_MAX = 50
+
+
+@require_GET
+def api_nearest(request):
+    """
+    Physio locations nearest to ?lat=&lng=, closest first.
+    Optional ?k= (default 10, max 50) and ?max_km= limit the result.
+    """
+    try:
+        lat = float(request.GET["lat"])
+        lng = float(request.GET["lng"])
+        k = int(request.GET.get("k") or NEAREST_DEFAULT)
+        max_km = float(request.GET["max_km"]) if request.GET.get("max_km") else None
+    except (KeyError, ValueError):
+        return JsonResponse({"ok": False, "error": "lat and lng required (numbers); k and max_km optional"}, status=400)
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({"ok": False, "error": "lat/lng out of range"}, status=400)
+    if not (1 <= k <= NEAREST_MAX):
+        return JsonResponse({"ok": False, "error": f"k must be 1..{NEAREST_MAX}"}, status=400)
+    if max_km is not None and max_km <= 0:
+        return JsonResponse({"ok": False, "error": "max_km must be positive"}, status=400)
+
+    hits = nearest(
+        Location.objects.filter(is_physio=True),
+        lat, lng, k,
+        fields=("id", "name", "geo_lat", "geo_lng"),
+        max_km=max_km,
     )
-    locations = [{"id": l.id, "name": l.name, "lat": float(l.latitude), "lng": float(l.longitude)} for l in qs]
+    locations = [
+        {"id": loc_id, "name": name, "lat": loc_lat, "lng": loc_lng, "distance_km": round(dist, 3)}
+        for dist, (loc_id, name, loc_lat, loc_lng) in hits
+    ]
     return JsonResponse({"ok": True, "locations": locations})
 
+
 @require_GET
-def api_timeslots(request):
+async def api_timeslots(request):
     location_id = request.GET.get("location_id")
     date_str = request.GET.get("date")  # YYYY-MM-DD
     if not location_id or not date_str:
         return JsonResponse({"ok": False, "error": "location_id and date required"}, status=400)
 
-    _ = get_object_or_404(Location, id=location_id, is_physio=True)
+    location = await aget_object_or_404(Location, id=location_id, is_physio=True)
 
     try:
-        datetime.strptime(date_str, "%Y-%m-%d").date()
+        date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
         return JsonResponse({"ok": False, "error": "Invalid date format (YYYY-MM-DD)"}, status=400)
 
-    return JsonResponse({"ok": True, "slots": SLOTS})
+    free = await afree_slots(location, date_obj)
+    return JsonResponse({
+        "ok": True,
+        "slots": [t.strftime("%H:%M") for t, _, _ in free],
+        "capacity": {
+            t.strftime("%H:%M"): {"rooms": rooms, "consultants": consultants}
+            for t, rooms, consultants in free
+        },
+    })
 
 
 @require_GET
 @login_required
-def api_available_consultants(request):
-    if getattr(request.user, "role", None) != User.Role.CUSTOMER:
+async def api_available_consultants(request):
+    user = await request.auser()
+    if getattr(user, "role", None) != User.Role.CUSTOMER:
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
 
     location_id = request.GET.get("location_id")
@@ -71,7 +159,7 @@ def api_available_consultants(request):
     if not (location_id and date_str and time_str):
         return JsonResponse({"ok": False, "error": "Missing location_id/date/time"}, status=400)
 
-    location = get_object_or_404(Location, id=location_id, is_physio=True)
+    location = await aget_object_or_404(Location, id=location_id, is_physio=True)
 
     try:
         date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
@@ -79,24 +167,80 @@ def api_available_consultants(request):
     except ValueError:
         return JsonResponse({"ok": False, "error": "Invalid date/time format"}, status=400)
 
-    # v1: consultants linked to the location
-    qs = location.consultants.filter(role=User.Role.CONSULTANT).order_by("username")
-
-    # v1.1: optionally remove consultants already ACCEPTED at that time
-    taken_ids = set(
-        Appointment.objects.filter(
-            consultant__in=qs,
-            date=date_obj,
-            time=time_obj,
-            status=Appointment.Status.ACCEPTED,
-        ).values_list("consultant_id", flat=True)
+    # Consultants linked to the location, minus those already ACCEPTED at that time
+    # and those whose working hours don't cover it.
+    taken = Appointment.objects.filter(
+        consultant=OuterRef("pk"),
+        date=date_obj,
+        time=time_obj,
+        status=Appointment.Status.ACCEPTED,
+    )
+    qs = (
+        location.consultants
+        .filter(role=User.Role.CONSULTANT)
+        .exclude(Exists(taken))
+        .order_by("username")
+        .values_list("id", "username")
     )
-    qs = qs.exclude(id__in=taken_ids)
 
-    consultants = [{"id": u.id, "name": u.username} for u in qs]
+    rows = [row async for row in qs]
+    entries = await aschedules(uid for uid, _ in rows)
+    consultants = [
+        {"id": uid, "name": username}
+        for uid, username in rows
+        if is_working(entries.get(uid), location.id, date_obj, time_obj)
+    ]
     return JsonResponse({"ok": True, "consultants": consultants})
 
 
+@require_GET
+@login_required
+def api_availability(request):
+    """
+    GET ?location_ids=1,2,3&start=2026-02-16&end=2026-02-22
+
+    Free consultant IDs for every location x day x slot in one response:
+      {
+        "ok": true,
+        "dates": ["2026-02-16", ...],
+        "times": ["09:00", ...],
+        "consultants": {"7": "alice", ...},
+        "matrix": {"2": [[[7, 9], [9], ...per time], ...per date]}
+      }
+    """
+    if getattr(request.user, "role", None) != User.Role.CUSTOMER:
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    raw_ids = (request.GET.get("location_ids") or "").split(",")
+    start_str = request.GET.get("start")
+    end_str = request.GET.get("end") or start_str
+    if not (raw_ids and start_str):
+        return JsonResponse({"ok": False, "error": "location_ids and start required"}, status=400)
+
+    try:
+        location_ids = {int(x) for x in raw_ids if x.strip()}
+        start = datetime.strptime(start_str, "%Y-%m-%d").date()
+        end = datetime.strptime(end_str, "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid location_ids/start/end"}, status=400)
+
+    if not location_ids:
+        return JsonResponse({"ok": False, "error": "location_ids and start required"}, status=400)
+    if len(location_ids) > MAX_MATRIX_LOCATIONS:
+        return JsonResponse({"ok": False, "error": f"At most {MAX_MATRIX_LOCATIONS} locations"}, status=400)
+    if end < start or (end - start).days >= MAX_MATRIX_DAYS:
+        return JsonResponse({"ok": False, "error": f"Date range must be 1-{MAX_MATRIX_DAYS} days"}, status=400)
+
+    dates, times, consultants, matrix = availability_matrix(location_ids, start, end)
+    return JsonResponse({
+        "ok": True,
+        "dates": [d.isoformat() for d in dates],
+        "times": [t.strftime("%H:%M") for t in times],
+        "consultants": {str(cid): name for cid, name in consultants.items()},
+        "matrix": {str(loc_id): rows for loc_id, rows in matrix.items()},
+    })
+
+
 @require_POST
 @login_required
 def request_booking(request):
@@ -275,10 +419,6 @@ def onboarding_router(request):
     return redirect("home")
 
 
-# Example static schedule (replace later with real availability)
-SLOTS = ["09:00", "10:00", "11:00", "13:00", "14:00", "15:00"]
-
-
 @require_POST
 @login_required
 def request_booking(request):
@@ -305,16 +445,22 @@ def request_booking(request):
         date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
         time_obj = datetime.strptime(time_str, "%H:%M").time()
 
-        appt = Appointment.objects.create(
-            location=location,
-            location_label=location.name,
-            consultant=consultant,
-            created_by=request.user,
-            customer_label=request.user.username,
-            date=date_obj,
-            time=time_obj,
-            status=Appointment.Status.PENDING,
-        )
+        if not is_working(schedules([consultant.id]).get(consultant.id), location.id, date_obj, time_obj):
+            return JsonResponse({"ok": False, "error": "The consultant is not working at that time."}, status=409)
+
+        # The consultant's SMS is queued with the booking and sent by drain_outbox.
+        with transaction.atomic():
+            appt = Appointment.objects.create(
+                location=location,
+                location_label=location.name,
+                consultant=consultant,
+                created_by=request.user,
+                customer_label=request.user.username,
+                date=date_obj,
+                time=time_obj,
+                status=Appointment.Status.PENDING,
+            )
+            enqueue_action_links(request, appt)
 
         return JsonResponse({"ok": True, "appointment_id": appt.id, "status": appt.status})
 
@@ -513,6 +659,53 @@ def post_login(request):
 # Dashboards (placeholders)
 # -----------------------------
 
+# Dashboards open on the last DASHBOARD_PAST_DAYS days onwards; older history is
+# reached page by page with ?before=<cursor> (keyset on date, time, id).
+DASHBOARD_PAST_DAYS = 7
+APPOINTMENT_KEYSET = Keyset("date", "time", "id")
+
+
+def _consultant_appointments_qs(consultant):
+    return Appointment.objects.filter(consultant=consultant).select_related("location", "consultant")
+
+
+def _owner_appointments_qs(locations):
+    return (
+        Appointment.objects
+        .filter(location_id__in=[getattr(loc, "id", loc) for loc in locations])
+        .select_related("consultant", "location")
+    )
+
+
+def _appointments_page(request, qs):
+    """Raises ValueError on a malformed cursor."""
+    before, after, limit = page_params(request)
+    start = timezone.localdate() - timedelta(days=DASHBOARD_PAST_DAYS)
+    return APPOINTMENT_KEYSET.page(qs, before=before, after=after, start=start, limit=limit)
+
+
+def _appointments_page_json(page):
+    return JsonResponse({
+        "ok": True,
+        "appointments": [
+            {
+                "id": a.id,
+                "date": a.date.isoformat(),
+                "time": a.time.strftime("%H:%M"),
+                "location_id": a.location_id,
+                "location_name": a.location.name if a.location else a.location_label,
+                "consultant": a.consultant.username if a.consultant_id else None,
+                "customer_label": a.customer_label,
+                "status": a.status,
+                "room_number": a.room_number,
+            }
+            for a in page.items
+        ],
+        "older": page.older,
+        "newer": page.newer,
+    })
+
+
 @login_required
 def consultant_dashboard(request):
     if getattr(request.user, "role", "") != "CONSULTANT":
@@ -520,15 +713,14 @@ def consultant_dashboard(request):
 
     today = timezone.localdate()
 
-    consultant_appointments = (
-        Appointment.objects
-        .filter(consultant=request.user)
-        .select_related("location")
-        .order_by("date", "time", "id")
-    )
+    try:
+        page = _appointments_page(request, _consultant_appointments_qs(request.user))
+    except ValueError:
+        return redirect("physio:consultant_dashboard")
 
     return render(request, "physio/consultant_dashboard.html", {
-        "consultant_appointments": consultant_appointments,
+        "consultant_appointments": page.items,
+        "page": page,
         "today": today,
         "next_url": reverse("physio:home"),
     })
@@ -578,15 +770,29 @@ def consultant_appointments(request):
     if request.user.role != request.user.Role.CONSULTANT:
         return redirect("physio:home")
 
-    appointments = Appointment.objects.filter(
-        consultant=request.user
-    ).order_by("date", "time")
+    try:
+        page = _appointments_page(request, _consultant_appointments_qs(request.user))
+    except ValueError:
+        return redirect("physio:consultant_appointments")
 
     return render(request, "physio/consultant_appointments.html", {
-        "appointments": appointments
+        "appointments": page.items,
+        "page": page,
     })
 
 
+@login_required
+@require_GET
+def api_consultant_appointments(request):
+    """JSON twin of consultant_appointments: same window and ?before=/?after= cursors."""
+    if getattr(request.user, "role", None) != User.Role.CONSULTANT:
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    try:
+        page = _appointments_page(request, _consultant_appointments_qs(request.user))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid cursor"}, status=400)
+    return _appointments_page_json(page)
 
 
 @login_required
@@ -598,91 +804,6 @@ def consultant_requests(request):
 
     return render(request, "central/consultant_requests.html", {"pending": pending})
 
-@login_required
-@require_POST
-def consultant_accept(request, appointment_id):
-    if getattr(request.user, "role", None) != User.Role.CONSULTANT:
-        return redirect("physio/home")
-
-    appt = get_object_or_404(
-        Appointment,
-        id=appointment_id,
-        consultant=request.user,
-    )
-
-    # only allow accepting pending
-    if appt.status != Appointment.Status.PENDING:
-        return redirect("physio/consultant_requests")
-
-    # 1) Prevent consultant double-booking
-    consultant_taken = Appointment.objects.filter(
-        consultant=request.user,
-        date=appt.date,
-        time=appt.time,
-        status=Appointment.Status.ACCEPTED,
-    ).exclude(id=appt.id).exists()
-
-    if consultant_taken:
-        appt.status = Appointment.Status.DECLINED
-        appt.save(update_fields=["status"])
-        messages.warning(request, f"Request #{appt.id} auto-declined: you already have an ACCEPTED booking at that time.")
-        return redirect("physio/consultant_requests")
-
-    # 2) Allocate a room (only if location exists + not already set)
-    if appt.location and not appt.room_number:
-        room_count = getattr(appt.location, "room_count", 0) or 0
-
-        if room_count >= 1:
-            taken_rooms = set(
-                Appointment.objects.filter(
-                    location=appt.location,
-                    date=appt.date,
-                    time=appt.time,
-                    status=Appointment.Status.ACCEPTED,
-                ).exclude(id=appt.id).values_list("room_number", flat=True)
-            )
-
-            chosen = None
-            for r in range(1, room_count + 1):
-                if r not in taken_rooms:
-                    chosen = r
-                    break
-
-            if chosen is None:
-                appt.status = Appointment.Status.DECLINED
-                appt.save(update_fields=["status"])
-                messages.warning(request, f"Request #{appt.id} auto-declined: no rooms available at {appt.location.name} for that timeslot.")
-                return redirect("physio/consultant_requests")
-
-            appt.room_number = chosen
-
-    # 3) Accept
-    appt.status = Appointment.Status.ACCEPTED
-    appt.save(update_fields=["status", "room_number"])
-    messages.success(request, f"Accepted appointment #{appt.id} (Room {appt.room_number or 'TBD'}).")
-    return redirect("physio/consultant_requests")
-
-@login_required
-@require_POST
-def consultant_decline(request, appointment_id):
-    if getattr(request.user, "role", None) != User.Role.CONSULTANT:
-        return redirect("physio/home")
-
-    appt = get_object_or_404(
-        Appointment,
-        id=appointment_id,
-        consultant=request.user,
-    )
-
-    if appt.status != Appointment.Status.PENDING:
-        return redirect("physio/consultant_requests")
-
-    appt.status = Appointment.Status.DECLINED
-    appt.save(update_fields=["status"])
-    messages.info(request, f"Declined appointment #{appt.id}.")
-    return redirect("physio/consultant_requests")
-
-
 @login_required
 def consultant_onboarding(request):
     if request.user.role != User.Role.CONSULTANT:
@@ -707,31 +828,79 @@ def consultant_onboarding(request):
     })
 
 
+def _decide_with_message(request, appt, accept: bool):
+    """Run one accept/decline and flash the outcome. Never raises on contention."""
+    try:
+        outcome, reason = accept_appointment(appt) if accept else decline_appointment(appt)
+    except DecisionConflict:
+        messages.error(request, f"Request #{appt.id}: that timeslot is busy right now, please try again.")
+        return
+
+    if outcome == decisions.ACCEPTED:
+        messages.success(request, f"Accepted appointment #{appt.id} (Room {appt.room_number or 'TBD'}).")
+    elif outcome == decisions.AUTO_DECLINED:
+        messages.warning(request, f"Request #{appt.id} auto-declined: {reason}.")
+    elif outcome == decisions.DECLINED:
+        messages.info(request, f"Declined appointment #{appt.id}.")
+    else:
+        messages.info(request, f"Request #{appt.id} was not changed ({reason or outcome}).")
+
+
 @login_required
 def consultant_accept(request, pk):
-    appt = get_object_or_404(Appointment, pk=pk, consultant=request.user)
+    appt = get_object_or_404(Appointment.objects.select_related("location"), pk=pk, consultant=request.user)
 
     if appt.status != Appointment.Status.PENDING:
         return redirect("physio:consultant_appointments")
 
-    appt.status = Appointment.Status.ACCEPTED
-    appt.save()
+    _decide_with_message(request, appt, accept=True)
 
     return redirect("physio:consultant_appointments")
 
 
 @login_required
 def consultant_decline(request, pk):
-    appt = get_object_or_404(Appointment, pk=pk, consultant=request.user)
+    appt = get_object_or_404(Appointment.objects.select_related("location"), pk=pk, consultant=request.user)
 
     if appt.status != Appointment.Status.PENDING:
         return redirect("physio:consultant_appointments")
 
-    appt.status = Appointment.Status.DECLINED
-    appt.save()
+    _decide_with_message(request, appt, accept=False)
 
     return redirect("physio:consultant_appointments")
 
+
+@login_required
+@require_POST
+def consultant_bulk_decide(request):
+    """
+    POST JSON:
+      { "accept": [12, 15], "decline": [13] }
+
+    Returns per-item outcomes, in request order:
+      { "ok": true, "results": [{"id": 12, "outcome": "accepted", "status": "ACCEPTED", "room_number": 1, "reason": null}, ...] }
+    """
+    if getattr(request.user, "role", None) != User.Role.CONSULTANT:
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+        accept_ids = [int(i) for i in payload.get("accept") or []]
+        decline_ids = [int(i) for i in payload.get("decline") or []]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"ok": False, "error": "Invalid JSON body."}, status=400)
+
+    if not (accept_ids or decline_ids):
+        return JsonResponse({"ok": False, "error": "Nothing to decide."}, status=400)
+    if set(accept_ids) & set(decline_ids):
+        return JsonResponse({"ok": False, "error": "An appointment cannot be both accepted and declined."}, status=400)
+
+    try:
+        results = decide_bulk(request.user, accept_ids=accept_ids, decline_ids=decline_ids)
+    except DecisionConflict:
+        return JsonResponse({"ok": False, "error": "Those timeslots are busy right now, please retry."}, status=409)
+    return JsonResponse({"ok": True, "results": results})
+
 @login_required
 @require_POST
 def consultant_request_join(request, location_id):
@@ -755,88 +924,55 @@ def owner_dashboard(request):
     if request.user.role != User.Role.LOCATION_OWNER:
         return render(request, "physio/not_allowed.html")
 
-    locations = request.user.owned_locations.all()
-    appointments = Appointment.objects.filter(
-        location__owner=request.user
-    ).select_related("consultant", "location")
+    locations = list(request.user.owned_locations.order_by("name"))
+    try:
+        page = _appointments_page(request, _owner_appointments_qs(locations))
+    except ValueError:
+        return redirect("physio:owner_dashboard")
 
     return render(request, "physio/owner_dashboard.html", {
         "locations": locations,
-        "appointments": appointments,
+        "appointments": page.items,
+        "page": page,
         "next_url": reverse("physio:home"),
     })
 
+
 @login_required
 @require_GET
-def location_owner_overview(request):
+def api_owner_appointments(request):
+    """JSON twin of owner_dashboard's appointment list."""
     if getattr(request.user, "role", None) != User.Role.LOCATION_OWNER:
-        return render(request, "central/location_owner_forbidden.html", status=403)
-
-    today = date_cls.today()
+        return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
 
-    locations = Location.objects.filter(owner_id=request.user.id).order_by("name")
+    locations = request.user.owned_locations.values_list("id", flat=True)
+    try:
+        page = _appointments_page(request, _owner_appointments_qs(locations))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid cursor"}, status=400)
+    return _appointments_page_json(page)
 
-    # ✅ Debug (temporary)
-    debug_user = {"id": request.user.id, "username": request.user.username, "role": getattr(request.user, "role", None)}
-    debug_owned = list(locations.values("id", "name", "owner_id"))
 
-    base_qs = (
-        Appointment.objects
-        .filter(location__in=locations)
-        .select_related("location", "consultant", "created_by")
-    )
+@login_required
+@require_GET
+def location_owner_overview(request):
+    """
+    Owner's appointments: status counts, the last PAST_DAYS days, and an
+    occupancy grid for the next ?days=N (default 14) days. Constant query count.
+    """
+    if getattr(request.user, "role", None) != User.Role.LOCATION_OWNER:
+        return render(request, "physio/not_allowed.html", status=403)
 
-    past_appts = base_qs.filter(date__lt=today).order_by("-date", "-time")
-    today_appts = base_qs.filter(date=today).order_by("time")
-    future_appts = base_qs.filter(date__gt=today).order_by("date", "time")
-
-    # Backward compatible: upcoming list for your current template
-    appts = base_qs.filter(date__gte=today).order_by("date", "time")
-
-    # Occupancy grid for today+future
-    occupancy = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
-    times_by_date_loc = defaultdict(lambda: defaultdict(set))
-
-    for a in appts:
-        if not a.time or not a.location_id:
-            continue
-        d = a.date.isoformat()
-        t = a.time.strftime("%H:%M")
-        times_by_date_loc[d][a.location_id].add(t)
-
-        if a.room_number:
-            occupancy[d][a.location_id][t][a.room_number] = a
-        else:
-            occupancy[d][a.location_id][t].setdefault(0, [])
-            occupancy[d][a.location_id][t][0].append(a)
-
-    dates_sorted = sorted(times_by_date_loc.keys())
-    times_sorted = {
-        d: {loc_id: sorted(times_by_date_loc[d][loc_id]) for loc_id in times_by_date_loc[d]}
-        for d in times_by_date_loc
-    }
-
-    return render(request, "central/appointments/location_owner_overview.html", {
-        "locations": locations,
-        "appts": appts,  # ✅ your current template uses this
-        "past_appts": past_appts,
-        "today_appts": today_appts,
-        "future_appts": future_appts,
-        "occupancy": occupancy,
-        "dates_sorted": dates_sorted,
-        "times_sorted": times_sorted,
-        "today": today,
+    try:
+        days = int(request.GET.get("days") or OVERVIEW_DAYS)
+    except ValueError:
+        days = OVERVIEW_DAYS
+    days = max(1, min(days, MAX_OVERVIEW_DAYS))
 
-        # ✅ Debug (remove later)
-        "debug_user": debug_user,
-        "debug_owned": debug_owned,
-        "debug_counts": {
-            "past": past_appts.count(),
-            "today": today_appts.count(),
-            "future": future_appts.count(),
-            "upcoming": appts.count(),
-        },
-    })
+    today = timezone.localdate()
+    context = owner_overview(request.user, today, days)
+    context.update({"today": today, "days": days})
+    return render(request, "core/location_owner_overview.html", context)
 
 @login_required
 @require_POST
@@ -956,7 +1092,7 @@ def _token_valid(appt: Appointment) -> bool:
 
 @login_required
 def consultant_token_accept(request, token):
-    appt = get_object_or_404(Appointment, action_token=token)
+    appt = get_object_or_404(Appointment.objects.select_related("location"), action_token=token)
 
     # Must be the correct consultant
     if getattr(request.user, "role", None) != "CONSULTANT" or appt.consultant_id != request.user.id:
@@ -979,17 +1115,14 @@ def consultant_token_accept(request, token):
             "message": f"This request is already {appt.status}.",
         }, status=200)
 
-    # Accept
-    appt.status = Appointment.Status.ACCEPTED
-    appt.save(update_fields=["status"])
-
-    messages.success(request, "Appointment request accepted.")
+    # Accept (or auto-decline when the consultant/rooms are already taken)
+    _decide_with_message(request, appt, accept=True)
     return redirect("physio:consultant_dashboard")
 
 
 @login_required
 def consultant_token_decline(request, token):
-    appt = get_object_or_404(Appointment, action_token=token)
+    appt = get_object_or_404(Appointment.objects.select_related("location"), action_token=token)
 
     if getattr(request.user, "role", None) != "CONSULTANT" or appt.consultant_id != request.user.id:
         return render(request, "core/token_result.html", {
@@ -1009,8 +1142,45 @@ def consultant_token_decline(request, token):
             "message": f"This request is already {appt.status}.",
         }, status=200)
 
-    appt.status = Appointment.Status.DECLINED
-    appt.save(update_fields=["status"])
+    _decide_with_message(request, appt, accept=False)
+    return redirect("physio:consultant_dashboard")
+
+
+def consultant_action_link(request, token):
+    """
+    Signed accept/decline link (physio.tokens). The token is checked before
+    anything touches the database; a good one costs one primary-key read.
+    """
+    try:
+        appt_id, consultant_id, action = tokens.read(token)
+    except tokens.ExpiredToken:
+        return render(request, "core/token_result.html", {
+            "title": "Link expired",
+            "message": "This link has expired.",
+        }, status=410)
+    except tokens.InvalidToken:
+        return render(request, "core/token_result.html", {
+            "title": "Invalid link",
+            "message": "This link is not valid.",
+        }, status=404)
+
+    if not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    if getattr(request.user, "role", None) != "CONSULTANT" or consultant_id != request.user.id:
+        return render(request, "core/token_result.html", {
+            "title": "Not allowed",
+            "message": "This link is not for your account.",
+        }, status=403)
+
+    # Reassigned since the link went out? The consultant filter turns that into a 404.
+    appt = get_object_or_404(Appointment.objects.select_related("location"), pk=appt_id, consultant_id=consultant_id)
+
+    if appt.status != Appointment.Status.PENDING:
+        return render(request, "core/token_result.html", {
+            "title": "Already decided",
+            "message": f"This request is already {appt.status}.",
+        }, status=200)
 
-    messages.info(request, "Appointment request declined.")
+    _decide_with_message(request, appt, accept=action == tokens.ACCEPT)
     return redirect("physio:consultant_dashboard")